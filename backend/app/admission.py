@@ -0,0 +1,135 @@
+"""
+Admission control for the ingest endpoints
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional
+
+from app.metrics import STAGE_LATENCY, INGEST_SHED, INGEST_DEFERRED
+
+
+class AdmissionController:
+    """
+    Bound how many requests wait for the ingest worker, and for how long
+
+    Scoring runs in a single worker thread (the scoring engine's
+    baselines and streaming detector are not thread-safe), so requests
+    take turns on one slot and the event loop stays free meanwhile. A
+    request that finds `max_waiting` others already queued, or does not
+    get the slot within `deadline` seconds, overflows and the caller sheds
+    or defers it. Admitted work therefore never queues longer than the
+    deadline, however large the upstream spike.
+    """
+
+    def __init__(self, max_waiting: int, deadline: float, fast_path_workers: int = 4):
+        """
+        Args:
+            max_waiting: Requests allowed to queue for the worker
+            deadline: Seconds a request may queue before it overflows
+            fast_path_workers: Threads for overflow (fast path) work, so
+                that it never blocks the event loop either
+        """
+        self.max_waiting = max_waiting
+        self.deadline = deadline
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.deferred = 0
+        self._slot: Optional[asyncio.Semaphore] = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+        self.fast_path_executor = ThreadPoolExecutor(max_workers=fast_path_workers, thread_name_prefix="ingest-fast")
+
+    @property
+    def busy(self) -> bool:
+        return self._slot is not None and self._slot.locked()
+
+    async def try_acquire(self) -> bool:
+        """Take the slot only if it is free and nobody is queued (for background work)"""
+        if self._slot is None:
+            self._slot = asyncio.Semaphore(1)
+        if self.waiting or self._slot.locked():
+            return False
+        # An unlocked semaphore is acquired without suspending
+        await self._slot.acquire()
+        return True
+
+    async def acquire(self):
+        """Wait for the slot without a deadline (for maintenance work such as a reset)"""
+        if self._slot is None:
+            self._slot = asyncio.Semaphore(1)
+        await self._slot.acquire()
+
+    def release(self):
+        self._slot.release()
+
+    def reset_counters(self):
+        self.admitted = 0
+        self.shed = 0
+        self.deferred = 0
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Wait for the worker slot
+
+        Yields None with the slot held, or the overflow reason
+        ("queue_full" or "deadline") without it.
+        """
+        if self._slot is None:
+            self._slot = asyncio.Semaphore(1)
+
+        if self.waiting >= self.max_waiting:
+            yield "queue_full"
+            return
+
+        self.waiting += 1
+        start = perf_counter()
+        try:
+            await asyncio.wait_for(self._slot.acquire(), self.deadline)
+            acquired = True
+        except asyncio.TimeoutError:
+            acquired = False
+        finally:
+            self.waiting -= 1
+            STAGE_LATENCY.observe(perf_counter() - start, "ingest_queue")
+
+        if not acquired:
+            yield "deadline"
+            return
+
+        self.admitted += 1
+        try:
+            yield None
+        finally:
+            self._slot.release()
+
+    async def run(self, function: Callable, *args) -> Any:
+        """Run blocking ingest work in the worker thread (call with the slot held)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def run_fast_path(self, function: Callable, *args) -> Any:
+        """Run stateless overflow work (no slot needed) in the fast-path threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.fast_path_executor, function, *args)
+
+    def record_shed(self, reason: str):
+        self.shed += 1
+        INGEST_SHED.inc(reason)
+
+    def record_deferred(self, reason: str):
+        self.deferred += 1
+        INGEST_DEFERRED.inc(reason)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "busy": self.busy,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "deferred": self.deferred,
+            "max_waiting": self.max_waiting,
+            "queue_deadline_ms": round(self.deadline * 1000, 1)
+        }
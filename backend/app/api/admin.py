@@ -0,0 +1,211 @@
+"""
+Operational admin endpoints
+"""
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+
+from app.api.transactions import scoring_engine, shadow_scorer
+from app.archive import archive_store, apply_retention
+from app.detection import model_registry
+from app.detection.runtime_config import scoring_config
+from app.profiling import SamplingProfiler
+from app.schemas import ScoringConfigUpdate
+from app.config import PROFILER_MAX_SECONDS, PROFILER_MIN_INTERVAL_MS, ARCHIVE_RETENTION_DAYS
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+# Only one profile may run at a time
+profile_lock = asyncio.Lock()
+
+@router.get("/models")
+async def list_models():
+    """List registry model versions and which one is serving"""
+    
+    ml_model = scoring_engine.ml_model
+    return {
+        "active": ml_model.version,
+        "loading": ml_model.loading_version,
+        "versions": model_registry.list_versions()
+    }
+
+@router.post("/models/{version}/activate", status_code=202)
+async def activate_model(version: str):
+    """
+    Activate a model version without downtime
+    
+    The version is loaded and warmed up in a background thread while the
+    current version keeps serving; it is swapped in once ready.
+    """
+    
+    ml_model = scoring_engine.ml_model
+    
+    if not model_registry.version_exists(version):
+        raise HTTPException(status_code=404, detail=f"Model version '{version}' not found")
+    
+    if ml_model.loading_version is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Model version '{ml_model.loading_version}' is already being activated"
+        )
+    
+    asyncio.create_task(_run_in_background(scoring_engine.ml_model.activate, version))
+    
+    return {
+        "success": True,
+        "active": ml_model.version,
+        "activating": version
+    }
+
+@router.get("/shadow")
+async def shadow_summary(version: Optional[str] = None):
+    """
+    Compare a challenger model with production on live traffic
+    
+    Defaults to the current challenger; pass version to summarize an
+    earlier challenger's score log.
+    """
+    
+    if version is not None and not model_registry.version_exists(version):
+        raise HTTPException(status_code=404, detail=f"Model version '{version}' not found")
+    
+    return await asyncio.to_thread(shadow_scorer.summary, version)
+
+@router.post("/shadow/{version}", status_code=202)
+async def start_shadow(version: str):
+    """Load a registry version in the background and shadow-score with it"""
+    
+    if not model_registry.version_exists(version):
+        raise HTTPException(status_code=404, detail=f"Model version '{version}' not found")
+    
+    if shadow_scorer.loading_version is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Challenger '{shadow_scorer.loading_version}' is already being loaded"
+        )
+    
+    asyncio.create_task(_run_in_background(shadow_scorer.set_challenger, version))
+    
+    return {
+        "success": True,
+        "challenger": shadow_scorer.version,
+        "loading": version
+    }
+
+@router.delete("/shadow")
+async def stop_shadow():
+    """Stop shadow scoring; the score log is kept"""
+    
+    version = shadow_scorer.version
+    shadow_scorer.clear_challenger()
+    return {"success": True, "stopped": version}
+
+@router.get("/scoring-config")
+async def get_scoring_config():
+    """Active scoring weights and alert thresholds"""
+    return scoring_config.current.as_dict()
+
+@router.put("/scoring-config")
+async def update_scoring_config(update: ScoringConfigUpdate):
+    """
+    Change scoring weights and/or alert thresholds without a restart
+    
+    Only the given fields change. The result becomes a new config
+    version, applies to transactions scored from now on, and is stamped
+    on their alerts.
+    """
+    
+    changes = update.model_dump(exclude_none=True)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    
+    try:
+        config = scoring_config.update(changes, source="api")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return config.as_dict()
+
+@router.get("/archive")
+async def list_archive():
+    """Archived month files and the retention period"""
+    return {
+        "retention_days": ARCHIVE_RETENTION_DAYS,
+        "files": archive_store.summary()
+    }
+
+@router.post("/archive")
+async def run_archive(retention_days: Optional[float] = None):
+    """
+    Archive the months older than the retention period now
+    
+    Defaults to the configured retention period.
+    """
+    
+    retention_days = retention_days if retention_days is not None else ARCHIVE_RETENTION_DAYS
+    if retention_days is None:
+        raise HTTPException(status_code=400, detail="Retention is disabled; pass retention_days")
+    
+    counts = await asyncio.to_thread(apply_retention, retention_days)
+    return {"success": True, "archived": counts}
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile(
+    request: Request,
+    seconds: float = 10,
+    interval_ms: float = 5,
+    path: Optional[str] = None
+):
+    """
+    Sample the running app's stacks for a few seconds
+    
+    Samples every thread (event loop, explanation and shadow workers) and
+    returns collapsed stacks for flamegraph.pl or speedscope. Pass path
+    (e.g. /api/transactions/ingest) to keep only samples taken inside that
+    route's handler.
+    """
+    
+    if not 0 < seconds <= PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILER_MAX_SECONDS}]")
+    
+    if interval_ms < PROFILER_MIN_INTERVAL_MS:
+        raise HTTPException(status_code=400, detail=f"interval_ms must be at least {PROFILER_MIN_INTERVAL_MS}")
+    
+    target_codes = None
+    if path is not None:
+        # Include the worker-thread functions a route hands its work to
+        target_codes = frozenset(
+            function.__code__
+            for route in request.app.routes
+            if getattr(route, "path", None) == path and hasattr(route, "endpoint")
+            for function in (route.endpoint, *getattr(route.endpoint, "worker_functions", ()))
+        )
+        if not target_codes:
+            raise HTTPException(status_code=404, detail=f"No route for path '{path}'")
+    
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    
+    async with profile_lock:
+        profiler = SamplingProfiler(interval=interval_ms / 1000, target_codes=target_codes)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(profiler.stop)
+    
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={
+            "Content-Disposition": "attachment; filename=profile.collapsed",
+            "X-Profile-Samples": str(profiler.sample_count)
+        }
+    )
+
+async def _run_in_background(load, version: str):
+    """Run a blocking model load + warm-up off the event loop"""
+    try:
+        await asyncio.to_thread(load, version)
+    except Exception as e:
+        print(f"⚠️ Error loading model version {version}: {e}")
@@ -1,39 +1,210 @@
 """
 Alert-related API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import func, select, update as update_statement
+from sqlalchemy.orm import Session, joinedload
+from datetime import datetime
+from typing import Callable, List, Optional
 import json
+import numpy as np
 
-from app.database import get_db
-from app.schemas import AlertResponse, AlertUpdate, StatsResponse
-from app.models import Alert, Transaction
+from app.database import get_db, stored_text
+from app.config import MAX_ALERT_BATCH_SIZE, MAX_ALERT_BULK_UPDATE_SIZE
+from app.schemas import AlertResponse, AlertUpdate, AlertBatchRequest, AlertBulkStatusUpdate, StatsResponse
+from app.models import Account, Alert, AlertRule, Transaction
+from app.explainability.explainer import Explainer
+from app.detection.rules import load_triggered_rules
+from app.explainability.templates import DEFAULT_LOCALE
+from app.api.pagination import keyset_page, stored_timestamp, NEXT_CURSOR_HEADER
+from app.stats import alert_stats
+from app.archive import archive_store
 
 router = APIRouter(prefix="/api/alerts", tags=["alerts"])
 
+def render_alert_explanation(
+    alert: Alert,
+    transaction: Optional[Transaction],
+    locale: str = DEFAULT_LOCALE
+) -> Optional[str]:
+    """
+    Explanation text of an alert
+    
+    Legacy alerts carry rendered text; newer ones store a structured
+    explanation that is rendered here from the cached templates.
+    
+    Raises:
+        ValueError: If the locale has no templates
+    """
+    
+    if alert.explanation_data is None or transaction is None:
+        return alert.explanation
+    
+    return Explainer.render_explanation(
+        json.loads(alert.explanation_data),
+        {"alert_level": alert.alert_level, "risk_score": alert.risk_score, "ml_score": alert.ml_score},
+        explanation_transaction(transaction),
+        locale
+    )
+
+def alert_transaction(alert: Alert, transaction: Optional[Transaction]) -> Optional[Transaction]:
+    """
+    An alert's transaction, from the archive if it is no longer in the
+    database (e.g. archived by retention before its alert)
+    """
+    if transaction is None:
+        transaction = archive_store.find("transactions", "txn_id", alert.txn_id)
+    return transaction
+
+def explanation_transaction(transaction: Transaction) -> dict:
+    """The transaction fields explanation templates read"""
+    return {
+        "txn_type": transaction.txn_type,
+        "amount": transaction.amount,
+        "account_id": transaction.account_id,
+        "country_code": transaction.country_code
+    }
+
+def describe_alert_rules(
+    alert: Alert,
+    transaction: Optional[Transaction],
+    locale: str = DEFAULT_LOCALE
+) -> List[dict]:
+    """
+    Triggered rules of an alert with their descriptions rendered
+    
+    Raises:
+        ValueError: If the locale has no templates
+    """
+    
+    return Explainer.describe_rules(
+        load_triggered_rules(alert.triggered_rules),
+        json.loads(alert.explanation_data) if alert.explanation_data else None,
+        explanation_transaction(transaction) if transaction is not None else None,
+        locale
+    )
+
+def alert_filters(
+    status: Optional[str] = None,
+    alert_level: Optional[str] = None,
+    rule: Optional[str] = None,
+    since: Optional[datetime] = None,
+    max_risk_score: Optional[float] = None,
+    account_id: Optional[str] = None
+) -> list:
+    """
+    WHERE criteria on Alert for the list and bulk update filters
+    
+    rule keeps alerts that triggered that rule, since those created at or
+    after that time and max_risk_score those scored at or below it.
+    """
+    
+    criteria = []
+    
+    if status:
+        criteria.append(Alert.status == status)
+    
+    if alert_level:
+        criteria.append(Alert.alert_level == alert_level)
+    
+    if account_id:
+        criteria.append(Alert.account_id == account_id)
+    
+    if rule:
+        # Index range scan on alert_rules instead of parsing triggered_rules
+        rule_alerts = select(AlertRule.alert_id).where(AlertRule.rule_name == rule)
+        if since:
+            rule_alerts = rule_alerts.where(stored_text(AlertRule.created_at) >= stored_timestamp(since))
+        criteria.append(Alert.id.in_(rule_alerts))
+    
+    if since:
+        criteria.append(stored_text(Alert.created_at) >= stored_timestamp(since))
+    
+    if max_risk_score is not None:
+        criteria.append(Alert.risk_score <= max_risk_score)
+    
+    return criteria
+
+def archived_alert_filter(
+    status: Optional[str] = None,
+    alert_level: Optional[str] = None,
+    rule: Optional[str] = None,
+    since: Optional[datetime] = None,
+    max_risk_score: Optional[float] = None,
+    account_id: Optional[str] = None
+) -> Callable[[dict, datetime], np.ndarray]:
+    """The alert_filters criteria as a mask over archived alert columns"""
+    
+    def where(columns: dict, month: datetime) -> np.ndarray:
+        mask = np.ones(len(columns["id"]), dtype=bool)
+        
+        if status:
+            mask &= columns["status"] == status
+        
+        if alert_level:
+            mask &= columns["alert_level"] == alert_level
+        
+        if account_id:
+            mask &= columns["account_id"] == account_id
+        
+        if rule:
+            # Rules are archived in the month of their alert
+            rules = archive_store.read("alert_rules", month)
+            rule_alerts = rules["alert_id"][rules["rule_name"] == rule] if rules else []
+            mask &= np.isin(columns["id"], rule_alerts)
+        
+        if since:
+            mask &= columns["created_at"] >= stored_timestamp(since)
+        
+        if max_risk_score is not None:
+            mask &= columns["risk_score"] <= max_risk_score
+        
+        return mask
+    
+    return where
+
 @router.get("/", response_model=List[dict])
 async def list_alerts(
+    response: Response,
     status: Optional[str] = None,
     alert_level: Optional[str] = None,
+    rule: Optional[str] = None,
+    since: Optional[datetime] = None,
+    max_risk_score: Optional[float] = None,
+    account_id: Optional[str] = None,
+    include_archived: bool = False,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 50,
     db: Session = Depends(get_db)
 ):
-    """List alerts with optional filtering"""
+    """
+    List alerts with optional filtering (see alert_filters), newest first
     
-    query = db.query(Alert)
+    Page with the opaque cursor returned in the X-Next-Cursor header
+    (absent on the last page); skip still works but costs O(skip).
+    include_archived also pages through alerts moved to the archive by
+    the retention policy. "explanation" and the triggered rules'
+    descriptions are only filled for legacy alerts; fetch the alert for
+    them rendered.
+    """
     
-    if status:
-        query = query.filter(Alert.status == status)
+    filters = (status, alert_level, rule, since, max_risk_score, account_id)
+    query = db.query(Alert).filter(*alert_filters(*filters))
     
-    if alert_level:
-        query = query.filter(Alert.alert_level == alert_level)
+    archived = None
+    if include_archived:
+        where = archived_alert_filter(*filters)
+        
+        def archived(position, count):
+            return archive_store.page(
+                "alerts", position, count, where,
+                since=stored_timestamp(since) if since else None
+            )
     
-    alerts = query.order_by(Alert.created_at.desc())\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
+    alerts, next_cursor = keyset_page(query, Alert.created_at, Alert.id, cursor, limit, skip, archived)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     # Format alerts with parsed JSON
     formatted_alerts = []
@@ -48,9 +219,14 @@ async def list_alerts(
             "rule_score": alert.rule_score,
             "anomaly_score": alert.anomaly_score,
             "ml_score": alert.ml_score,
-            "triggered_rules": json.loads(alert.triggered_rules) if alert.triggered_rules else [],
+            "triggered_rules": load_triggered_rules(alert.triggered_rules),
             "explanation": alert.explanation,
             "top_features": json.loads(alert.top_features) if alert.top_features else [],
+            "explanation_status": alert.explanation_status or "READY",
+            "model_version": alert.model_version,
+            "degraded": bool(alert.degraded),
+            "config_version": alert.config_version,
+            "txn_count": alert.txn_count or 1,
             "status": alert.status,
             "created_at": alert.created_at.isoformat()
         }
@@ -58,20 +234,19 @@ async def list_alerts(
     
     return formatted_alerts
 
-@router.get("/{alert_id}", response_model=dict)
-async def get_alert(
-    alert_id: str,
-    db: Session = Depends(get_db)
-):
-    """Get alert details with full explanation"""
+def format_alert_detail(
+    alert: Alert,
+    transaction: Optional[Transaction],
+    account: Optional[Account],
+    locale: str = DEFAULT_LOCALE
+) -> dict:
+    """
+    Detail view of an alert with its transaction and account profile
+    (loaded together by alert_detail_query)
     
-    alert = db.query(Alert).filter(Alert.alert_id == alert_id).first()
-    
-    if not alert:
-        raise HTTPException(status_code=404, detail="Alert not found")
-    
-    # Get associated transaction
-    transaction = db.query(Transaction).filter(Transaction.txn_id == alert.txn_id).first()
+    Raises:
+        ValueError: If the locale has no templates
+    """
     
     return {
         "alert": {
@@ -84,9 +259,15 @@ async def get_alert(
             "rule_score": alert.rule_score,
             "anomaly_score": alert.anomaly_score,
             "ml_score": alert.ml_score,
-            "triggered_rules": json.loads(alert.triggered_rules) if alert.triggered_rules else [],
-            "explanation": alert.explanation,
+            "triggered_rules": describe_alert_rules(alert, transaction, locale),
+            "explanation": render_alert_explanation(alert, transaction, locale),
             "top_features": json.loads(alert.top_features) if alert.top_features else [],
+            "explanation_status": alert.explanation_status or "READY",
+            "model_version": alert.model_version,
+            "degraded": bool(alert.degraded),
+            "config_version": alert.config_version,
+            "txn_count": alert.txn_count or 1,
+            "txn_ids": json.loads(alert.txn_ids) if alert.txn_ids else [alert.txn_id],
             "status": alert.status,
             "created_at": alert.created_at.isoformat()
         },
@@ -100,7 +281,94 @@ async def get_alert(
             "counterparty_id": transaction.counterparty_id,
             "country_code": transaction.country_code,
             "is_international": transaction.is_international
-        } if transaction else None
+        } if transaction else None,
+        "account": {
+            "account_id": account.account_id,
+            "customer_name": account.customer_name,
+            "account_type": account.account_type,
+            "monthly_income": account.monthly_income,
+            "risk_rating": account.risk_rating,
+            "country": account.country
+        } if account else None
+    }
+
+def alert_detail_query(db: Session):
+    """Alerts with their transaction and account profile joined into the same SELECT"""
+    return db.query(Alert).options(joinedload(Alert.transaction), joinedload(Alert.account))
+
+@router.get("/{alert_id}", response_model=dict)
+async def get_alert(
+    alert_id: str,
+    locale: str = DEFAULT_LOCALE,
+    include_archived: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Get alert details with its transaction, account profile and full explanation, rendered in the given locale
+    
+    include_archived looks up the alert in the archive when it is no
+    longer in the database; its transaction is looked up there either way.
+    """
+    
+    alert = alert_detail_query(db).filter(Alert.alert_id == alert_id).first()
+    
+    if alert:
+        transaction, account = alert.transaction, alert.account
+    elif include_archived:
+        alert = archive_store.find("alerts", "alert_id", alert_id)
+        if alert:
+            transaction = db.query(Transaction).filter(Transaction.txn_id == alert.txn_id).first()
+            account = db.query(Account).filter(Account.account_id == alert.account_id).first()
+    
+    if not alert:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    
+    try:
+        return format_alert_detail(alert, alert_transaction(alert, transaction), account, locale)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/batch", response_model=dict)
+async def get_alerts_batch(
+    request: AlertBatchRequest,
+    locale: str = DEFAULT_LOCALE,
+    db: Session = Depends(get_db)
+):
+    """
+    Get the details of many alerts in one query
+    
+    Returns the same shape as GET /{alert_id} for each alert, in request
+    order, plus the IDs that were not found.
+    """
+    
+    alert_ids = list(dict.fromkeys(request.alert_ids))
+    if len(alert_ids) > MAX_ALERT_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large ({len(alert_ids)} > {MAX_ALERT_BATCH_SIZE})"
+        )
+    
+    alerts = {
+        alert.alert_id: alert
+        for alert in alert_detail_query(db).filter(Alert.alert_id.in_(alert_ids))
+    }
+    
+    try:
+        details = [
+            format_alert_detail(
+                alerts[alert_id],
+                alert_transaction(alerts[alert_id], alerts[alert_id].transaction),
+                alerts[alert_id].account,
+                locale
+            )
+            for alert_id in alert_ids if alert_id in alerts
+        ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "alerts": details,
+        "not_found": [alert_id for alert_id in alert_ids if alert_id not in alerts]
     }
 
 @router.patch("/{alert_id}", response_model=dict)
@@ -128,42 +396,125 @@ async def update_alert(
         "new_status": alert.status
     }
 
+@router.post("/bulk-status", response_model=dict)
+async def bulk_update_alert_status(
+    update: AlertBulkStatusUpdate,
+    db: Session = Depends(get_db)
+):
+    """
+    Set the status of many alerts in one UPDATE
+    
+    Targets either the listed alert IDs or every alert matching the
+    filter (same fields as the list filters, at least one required).
+    Clients get a single "alert_bulk_update" WebSocket event: with the
+    updated IDs for an ID list, or with the filter and the count for a
+    filter (which may match any number of alerts, so no IDs are read).
+    """
+    
+    if (update.alert_ids is None) == (update.filter is None):
+        raise HTTPException(status_code=400, detail="Provide either alert_ids or filter")
+    
+    if update.alert_ids is not None:
+        alert_ids = list(dict.fromkeys(update.alert_ids))
+        if len(alert_ids) > MAX_ALERT_BULK_UPDATE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Too many alert IDs ({len(alert_ids)} > {MAX_ALERT_BULK_UPDATE_SIZE})"
+            )
+        statement = update_statement(Alert).where(Alert.alert_id.in_(alert_ids))
+    else:
+        criteria = alert_filters(**update.filter.model_dump())
+        if not criteria:
+            raise HTTPException(status_code=400, detail="filter needs at least one criterion")
+        statement = update_statement(Alert).where(*criteria)
+    
+    statement = statement.values(status=update.status)
+    execution_options = {"synchronize_session": False}
+    
+    try:
+        if update.alert_ids is not None:
+            # Bounded by MAX_ALERT_BULK_UPDATE_SIZE
+            updated_ids = db.execute(
+                statement.returning(Alert.alert_id),
+                execution_options=execution_options
+            ).scalars().all()
+            count = len(updated_ids)
+        else:
+            count = db.execute(statement, execution_options=execution_options).rowcount
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    result = {
+        "success": True,
+        "new_status": update.status,
+        "updated": count
+    }
+    event = {"new_status": update.status, "count": count}
+    if update.alert_ids is not None:
+        found = set(updated_ids)
+        result["not_found"] = [alert_id for alert_id in alert_ids if alert_id not in found]
+        event["alert_ids"] = updated_ids
+    else:
+        event["filter"] = update.filter.model_dump(mode="json", exclude_none=True)
+    
+    if count:
+        from app.api.websocket import manager
+        await manager.broadcast({"type": "alert_bulk_update", "data": event})
+    
+    return result
+
 @router.get("/stats/summary", response_model=StatsResponse)
 async def get_stats(db: Session = Depends(get_db)):
-    """Get system statistics"""
-    
-    total_transactions = db.query(Transaction).count()
-    total_alerts = db.query(Alert).count()
-    
-    # Alerts by level
-    alerts_by_level = {}
-    for level in ["LOW", "MEDIUM", "HIGH", "CRITICAL"]:
-        count = db.query(Alert).filter(Alert.alert_level == level).count()
-        alerts_by_level[level] = count
-    
-    # Detection rate
-    detection_rate = (total_alerts / max(total_transactions, 1)) * 100
-    
-    # Average risk score
-    avg_risk = db.query(Alert).with_entities(Alert.risk_score).all()
-    avg_risk_score = sum(r[0] for r in avg_risk) / len(avg_risk) if avg_risk else 0
-    
-    return StatsResponse(
-        total_transactions=total_transactions,
-        total_alerts=total_alerts,
-        alerts_by_level=alerts_by_level,
-        detection_rate=round(detection_rate, 2),
-        avg_risk_score=round(avg_risk_score, 2)
+    """
+    Get system statistics
+    
+    Served from the in-memory counters that ingest maintains; they are
+    loaded from the database on first use and reconciled periodically.
+    """
+    
+    if not alert_stats.is_loaded:
+        alert_stats.reconcile(db)
+    
+    return StatsResponse(**alert_stats.summary())
+
+@router.get("/stats/rules", response_model=List[dict])
+async def get_rule_stats(
+    since: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    """Alert count and latest alert time per triggered rule, most frequent first"""
+    
+    query = db.query(
+        AlertRule.rule_name,
+        func.count(AlertRule.id),
+        func.max(stored_text(AlertRule.created_at))
     )
+    
+    if since:
+        query = query.filter(stored_text(AlertRule.created_at) >= stored_timestamp(since))
+    
+    rows = query.group_by(AlertRule.rule_name).order_by(func.count(AlertRule.id).desc()).all()
+    
+    return [
+        {"rule_name": rule_name, "alert_count": alert_count, "last_alert_at": last_alert_at}
+        for rule_name, alert_count, last_alert_at in rows
+    ]
 
 @router.delete("/clear")
-async def delete_all_data(db: Session = Depends(get_db)):
-    """Delete all transactions and alerts (Reset System)"""
+async def delete_all_data():
+    """
+    Delete all transactions and alerts (Reset System)
+    
+    Drops and recreates the tables, deletes the archive and clears the
+    in-memory state derived from the data (baselines, statistics,
+    metrics).
+    """
+    from app.api.transactions import reset_data
+    
     try:
-        db.query(Alert).delete()
-        db.query(Transaction).delete()
-        db.commit()
-        return {"success": True, "message": "All data cleared successfully"}
+        reset = await reset_data()
+        return {"success": True, "message": "All data cleared successfully", **reset}
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
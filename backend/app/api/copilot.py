@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
 from pydantic import BaseModel
 from typing import List, Dict, Any
@@ -33,14 +33,17 @@ def get_system_context(db: Session, query: str) -> str:
     context_parts = []
     
     # 1. Recent High Risk Alerts
-    high_risk_alerts = db.query(Alert).filter(
+    high_risk_alerts = db.query(Alert).options(joinedload(Alert.transaction)).filter(
         Alert.alert_level.in_(['CRITICAL', 'HIGH'])
     ).order_by(Alert.created_at.desc()).limit(5).all()
     
     if high_risk_alerts:
+        from app.api.alerts import alert_transaction, render_alert_explanation
+        
         alerts_data = []
         for a in high_risk_alerts:
-            alerts_data.append(f"- Alert {a.alert_id} (Risk: {a.risk_score}, Level: {a.alert_level}) for Account {a.account_id}: {a.explanation[:100]}...")
+            explanation = render_alert_explanation(a, alert_transaction(a, a.transaction)) or ""
+            alerts_data.append(f"- Alert {a.alert_id} (Risk: {a.risk_score}, Level: {a.alert_level}) for Account {a.account_id}: {explanation[:100]}...")
         context_parts.append("Recent Critical Alerts:\n" + "\n".join(alerts_data))
 
     # 2. General Stats
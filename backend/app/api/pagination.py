@@ -0,0 +1,111 @@
+"""
+Keyset (cursor) pagination for newest-first list endpoints
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+from app.database import stored_text
+
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def stored_timestamp(value: datetime) -> str:
+    """
+    A bound for comparisons against stored_text()
+
+    Timestamps are written as 'YYYY-MM-DD HH:MM:SS[.ffffff]' (UTC), so a
+    bound in the same form orders correctly against either precision.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(sep=" ")
+
+
+def encode_cursor(sort_value: str, row_id: int) -> str:
+    """Opaque cursor for the position just after (sort_value, row_id)"""
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """
+    Raises:
+        HTTPException: 400 if the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        if not isinstance(sort_value, str) or not isinstance(row_id, int):
+            raise ValueError("Unexpected cursor contents")
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return sort_value, row_id
+
+
+def keyset_page(
+    query: Query,
+    sort_column,
+    id_column,
+    cursor: Optional[str],
+    limit: int,
+    offset: int = 0,
+    archived: Optional[Callable[[Optional[Tuple[str, int]], int], List[Tuple[Any, str, int]]]] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of `query`, newest first by (sort_column, id_column)
+    
+    With a cursor the page starts right after the previous one through a
+    range seek on a (..., sort_column, id) index, so every page costs the
+    same however deep it is. The sort value is compared and returned as
+    stored (type_coerce to String): SQLite keeps timestamps as text with
+    varying precision, and re-formatting them through DateTime would
+    break equality on ties.
+    
+    Args:
+        archived: Returns up to `count` archived (row, sort value, id)
+            tuples after a (sort value, id) position, newest first (see
+            ArchiveStore.page); they are merged into the page
+    
+    Returns:
+        (rows, cursor of the next page or None on the last page)
+    """
+    sort_key = stored_text(sort_column)
+    position = decode_cursor(cursor) if cursor else None
+    
+    if position is not None:
+        query = query.filter(tuple_(sort_key, id_column) < tuple_(*position))
+    
+    if archived is None:
+        rows = query.add_columns(sort_key)\
+            .order_by(sort_column.desc(), id_column.desc())\
+            .offset(offset)\
+            .limit(limit + 1)\
+            .all()
+        rows = [(row, sort_value, getattr(row, id_column.key)) for row, sort_value in rows]
+    else:
+        # Both sources are read up to the page end, then merged
+        rows = query.add_columns(sort_key)\
+            .order_by(sort_column.desc(), id_column.desc())\
+            .limit(offset + limit + 1)\
+            .all()
+        rows = [(row, sort_value, getattr(row, id_column.key)) for row, sort_value in rows]
+        rows += archived(position, offset + limit + 1)
+        rows.sort(key=lambda row: (row[1], row[2]), reverse=True)
+        rows = rows[offset:offset + limit + 1]
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        _, last_sort_value, last_id = rows[-1]
+        next_cursor = encode_cursor(str(last_sort_value), last_id)
+    
+    return [row for row, _, _ in rows], next_cursor
@@ -1,20 +1,38 @@
 """
 Transaction-related API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
+from time import perf_counter
+import asyncio
 import uuid
 import json
 import numpy as np
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
+from app.config import (
+    MAX_INGEST_BATCH_SIZE,
+    INGEST_MAX_WAITING, INGEST_QUEUE_DEADLINE_MS, INGEST_OVERFLOW_MODE, INGEST_FAST_PATH_WORKERS,
+    DEFERRED_RESCORE_BATCH_SIZE,
+    ALERT_COALESCING, ALERT_COALESCE_WINDOW, ALERT_COALESCE_MAX_TXNS
+)
 from app.schemas import TransactionCreate, TransactionResponse
-from app.models import Transaction, Alert, Account
+from app.models import Transaction, Alert, AlertRule, Account
 from app.features.engine import FeatureEngine
-from app.detection.scoring import ScoringEngine
+from app.detection.scoring import ScoringEngine, DEGRADED_ML_EXPLANATION
+from app.detection.rules import dump_triggered_rules, load_triggered_rules
 from app.explainability.explainer import Explainer
+from app.explainability.worker import ExplanationWorker
+from app.detection.shadow import ShadowScorer
+from app.admission import AdmissionController
+from app.archive import archive_store
+from app.coalescing import AlertCoalescer
+from app.api.pagination import keyset_page, NEXT_CURSOR_HEADER
+from app.api.websocket import broadcast_alert
+from app.metrics import stage_timer, TRANSACTIONS, ALERTS, ALERTS_COALESCED, INGEST_RESCORED
+from app.stats import alert_stats
 
 router = APIRouter(prefix="/api/transactions", tags=["transactions"])
 
@@ -22,6 +40,7 @@ router = APIRouter(prefix="/api/transactions", tags=["transactions"])
 feature_engine = FeatureEngine()
 scoring_engine = ScoringEngine()
 explainer = Explainer()
+shadow_scorer = ShadowScorer(scoring_engine)
 
 connected_clients = []  # For real-time updates
 
@@ -39,102 +58,615 @@ def convert_to_json_serializable(obj):
         return [convert_to_json_serializable(item) for item in obj]
     return obj
 
-@router.post("/ingest", response_model=dict)
-async def ingest_transaction(
-    txn: TransactionCreate,
-    db: Session = Depends(get_db)
-):
+def build_explanation_columns(scoring_result: dict, features: dict) -> dict:
     """
-    Ingest a transaction and perform real-time AML detection
+    Build the explanation columns of an alert from its scoring result
+    
+    Only the structured explanation is stored; the text is rendered when
+    the alert is read (see app.api.alerts.render_alert_explanation).
+    """
+    
+    explanation_data = explainer.build_explanation_data(scoring_result, features)
+    
+    # Format top features
+    top_features = explainer.format_top_features(
+        scoring_result.get("ml_explanation", {})
+    )
+    
+    # Convert numpy types to native Python types for JSON serialization
+    top_features_serializable = convert_to_json_serializable(top_features)
+    
+    return {
+        "explanation_data": json.dumps(convert_to_json_serializable(explanation_data), separators=(",", ":")),
+        "top_features": json.dumps(top_features_serializable)
+    }
+
+def build_alert(
+    transaction_data: dict,
+    scoring_result: dict
+) -> Alert:
+    """
+    Build an Alert row for a scored transaction
+    
+    The explanation is left PENDING and filled in by the explanation worker.
+    """
+    
+    # Rule names and scores only; descriptions are rendered on read
+    triggered_rules = scoring_result["triggered_rules"]
+    
+    return Alert(
+        alert_id=f"ALT{uuid.uuid4().hex[:12].upper()}",
+        txn_id=transaction_data["txn_id"],
+        account_id=transaction_data["account_id"],
+        risk_score=float(scoring_result["risk_score"]),  # Ensure native Python float
+        alert_level=scoring_result["alert_level"],
+        rule_score=float(scoring_result["rule_score"]),
+        anomaly_score=float(scoring_result["anomaly_score"]),
+        ml_score=float(scoring_result["ml_score"]) if scoring_result["ml_score"] is not None else None,
+        triggered_rules=dump_triggered_rules(triggered_rules),
+        rules=[
+            AlertRule(rule_name=rule["rule_name"], severity=rule["severity"])
+            for rule in triggered_rules
+        ],
+        top_features=json.dumps([]),
+        explanation_status="PENDING",
+        model_version=scoring_result.get("model_version"),
+        config_version=scoring_result.get("config_version"),
+        degraded=scoring_result.get("degraded", False),
+        status="NEW"
+    )
+
+explanation_worker = ExplanationWorker(scoring_engine, build_explanation_columns)
+alert_coalescer = AlertCoalescer(ALERT_COALESCE_WINDOW, ALERT_COALESCE_MAX_TXNS, ALERT_COALESCING)
+ingest_admission = AdmissionController(INGEST_MAX_WAITING, INGEST_QUEUE_DEADLINE_MS / 1000, INGEST_FAST_PATH_WORKERS)
+
+def _write_alerts(db: Session, candidates: List[tuple]) -> tuple:
+    """
+    Write the alerts of scored transactions with one commit
+    
+    With coalescing enabled, a transaction joins the open alert of its
+    account and pattern when there is one (see AlertCoalescer) instead of
+    creating an alert.
+    
+    Args:
+        candidates: (transaction_data, scoring_result, features, feature_vector)
+            of each alerting transaction, in ingest order
+    
+    Returns:
+        ((alert_id, coalesced) per candidate, new alert count, pending
+        explanations of new alerts and of alerts whose primary transaction
+        changed)
+    """
+    
+    if not candidates:
+        return [], 0, []
+    
+    open_alerts = alert_coalescer.open_alerts(db, [transaction_data for transaction_data, *_ in candidates])
+    outcomes = []
+    new_alerts = []
+    previous_scores = {}  # Stored alert -> (alert_level, risk_score) before this write
+    pending_explanations = {}  # alert_id -> explanation job for its primary transaction
+    
+    for transaction_data, scoring_result, features, feature_vector in candidates:
+        candidate = build_alert(transaction_data, scoring_result)
+        key = (transaction_data["account_id"], alert_coalescer.pattern(scoring_result))
+        alert = open_alerts.get(key)
+        
+        if alert_coalescer.accepts(alert, transaction_data["timestamp"]):
+            if alert.id is not None:
+                previous_scores.setdefault(alert, (alert.alert_level, alert.risk_score))
+            if alert_coalescer.merge(alert, candidate, transaction_data["timestamp"]):
+                pending_explanations[alert.alert_id] = (
+                    alert.alert_id, transaction_data, scoring_result, features, feature_vector
+                )
+            outcomes.append((alert.alert_id, True))
+            continue
+        
+        alert_coalescer.start(candidate, key[1], transaction_data["timestamp"])
+        open_alerts[key] = candidate
+        new_alerts.append(candidate)
+        pending_explanations[candidate.alert_id] = (
+            candidate.alert_id, transaction_data, scoring_result, features, feature_vector
+        )
+        outcomes.append((candidate.alert_id, False))
+    
+    updated_scores = [
+        (*previous, alert.alert_level, alert.risk_score)
+        for alert, previous in previous_scores.items()
+        if previous != (alert.alert_level, alert.risk_score)
+    ]
+    
+    with stage_timer("alert_insert"):
+        db.add_all(new_alerts)
+        db.commit()
+    for db_alert in new_alerts:
+        ALERTS.inc(db_alert.alert_level)
+    ALERTS_COALESCED.inc(amount=len(candidates) - len(new_alerts))
+    alert_stats.record_alerts(new_alerts)
+    alert_stats.record_alert_updates(updated_scores)
+    
+    return outcomes, len(new_alerts), list(pending_explanations.values())
+
+def _ingest_one(db: Session, transaction_data: dict) -> tuple:
+    """
+    Store, score and alert on one transaction (runs in the ingest worker)
+    
+    Returns:
+        (response, scoring_result, feature_vector, pending explanation or None)
     """
     
     # 1. Store transaction
-    db_transaction = Transaction(**txn.model_dump())
-    db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
+    with stage_timer("db_insert"):
+        db_transaction = Transaction(**transaction_data)
+        db.add(db_transaction)
+        db.commit()
+    TRANSACTIONS.inc()
+    alert_stats.record_transactions()
     
     # 2. Compute features
-    transaction_data = txn.model_dump()
     features = feature_engine.compute_features(db, transaction_data)
     feature_vector = feature_engine.get_feature_vector(features)
     
-    # 3. Compute risk score
+    # 3. Compute risk score (explanations are generated in the background)
     scoring_result = scoring_engine.compute_risk_score(
-        transaction_data, features, feature_vector
+        transaction_data, features, feature_vector, explain=False
     )
     
     # 4. Generate alert if needed
     alert_id = None
-    if scoring_engine.should_generate_alert(scoring_result["risk_score"]):
-        # Generate explanation
-        explanation_text = explainer.generate_explanation(
-            transaction_data, scoring_result, features
+    coalesced = False
+    pending_explanation = None
+    if scoring_engine.is_alert(scoring_result):
+        outcomes, _, pending_explanations = _write_alerts(
+            db, [(transaction_data, scoring_result, features, feature_vector)]
         )
+        alert_id, coalesced = outcomes[0]
+        pending_explanation = pending_explanations[0] if pending_explanations else None
+    
+    response = {
+        "success": True,
+        "txn_id": transaction_data["txn_id"],
+        "risk_score": scoring_result["risk_score"],
+        "alert_level": scoring_result["alert_level"],
+        "alert_id": alert_id,
+        "alert_generated": alert_id is not None and not coalesced,
+        "alert_coalesced": coalesced,
+        "degraded": scoring_result["degraded"]
+    }
+    return response, scoring_result, feature_vector, pending_explanation
+
+def _ingest_deferred(db: Session, transaction_data: dict) -> dict:
+    """
+    Overload fast path: store the transaction and run the rules only
+    
+    Runs in the fast-path threads; the rule engine is stateless.
+    The transaction is left DEFERRED; rescore_deferred() scores it fully
+    (anomaly, ML, alerting) once the ingest worker has spare capacity.
+    """
+    
+    # Commit after the feature query so no pooled connection stays checked
+    # out while the request waits to be sent
+    with stage_timer("db_insert"):
+        db.add(Transaction(**transaction_data, scoring_status="DEFERRED"))
+        db.flush()
+    features = feature_engine.compute_rule_features(db, transaction_data)
+    db.commit()
+    TRANSACTIONS.inc()
+    alert_stats.record_transactions()
+    
+    with stage_timer("rules"):
+        rule_score, triggered_rules = scoring_engine.rule_engine.evaluate_all_rules(transaction_data, features)
+    
+    return {
+        "success": True,
+        "txn_id": transaction_data["txn_id"],
+        "risk_score": None,
+        "alert_level": None,
+        "alert_id": None,
+        "alert_generated": False,
+        "deferred": True,
+        "rule_score": rule_score,
+        "triggered_rules": [rule["rule_name"] for rule in triggered_rules]
+    }
+
+def _score_batch(db: Session, transactions_data: List[dict]) -> tuple:
+    """
+    Score stored transactions together and write their alerts (runs in the ingest worker)
+    
+    Returns:
+        (per-transaction results, alert count, feature_matrix, scoring_results,
+        pending explanations)
+    """
+    
+    # 2. Compute features
+    features_list = [
+        feature_engine.compute_features(db, transaction_data)
+        for transaction_data in transactions_data
+    ]
+    feature_matrix = np.array(
+        [feature_engine.get_feature_vector(features) for features in features_list],
+        dtype=float
+    )
+    
+    # 3. Compute risk scores (explanations are generated in the background)
+    scoring_results = scoring_engine.compute_risk_scores_batch(
+        transactions_data, features_list, feature_matrix, explain=False
+    )
+    
+    # 4. Generate alerts
+    alerting = [i for i, scoring_result in enumerate(scoring_results) if scoring_engine.is_alert(scoring_result)]
+    outcomes, alerts_generated, pending_explanations = _write_alerts(db, [
+        (transactions_data[i], scoring_results[i], features_list[i], list(feature_matrix[i]))
+        for i in alerting
+    ])
+    alert_outcomes = dict(zip(alerting, outcomes))
+    
+    results = []
+    for i, (transaction_data, scoring_result) in enumerate(zip(transactions_data, scoring_results)):
+        alert_id, coalesced = alert_outcomes.get(i, (None, False))
+        results.append({
+            "txn_id": transaction_data["txn_id"],
+            "risk_score": scoring_result["risk_score"],
+            "alert_level": scoring_result["alert_level"],
+            "alert_id": alert_id,
+            "alert_generated": alert_id is not None and not coalesced,
+            "alert_coalesced": coalesced,
+            "degraded": scoring_result["degraded"]
+        })
+    
+    return results, alerts_generated, feature_matrix, scoring_results, pending_explanations
+
+def _ingest_batch(db: Session, transactions_data: List[dict]) -> tuple:
+    """Store a micro-batch with one commit, then score it (runs in the ingest worker)"""
+    
+    # 1. Store transactions
+    with stage_timer("db_insert"):
+        db.add_all([Transaction(**transaction_data) for transaction_data in transactions_data])
+        db.commit()
+    TRANSACTIONS.inc(amount=len(transactions_data))
+    alert_stats.record_transactions(len(transactions_data))
+    
+    return _score_batch(db, transactions_data)
+
+def _rescore_deferred_batch() -> tuple:
+    """Fully score the oldest DEFERRED transactions (runs in the ingest worker)"""
+    
+    db = SessionLocal()
+    try:
+        deferred = db.query(Transaction)\
+            .filter(Transaction.scoring_status == "DEFERRED")\
+            .order_by(Transaction.id)\
+            .limit(DEFERRED_RESCORE_BATCH_SIZE)\
+            .all()
+        if not deferred:
+            return [], None, [], []
         
-        # Format top features
-        top_features = explainer.format_top_features(
-            scoring_result.get("ml_explanation", {})
+        transactions_data = [
+            {field: getattr(transaction, field) for field in TransactionCreate.model_fields}
+            for transaction in deferred
+        ]
+        results, _, feature_matrix, scoring_results, pending_explanations = _score_batch(db, transactions_data)
+        
+        for transaction in deferred:
+            transaction.scoring_status = "SCORED"
+        db.commit()
+        INGEST_RESCORED.inc(amount=len(deferred))
+        
+        return results, feature_matrix, scoring_results, pending_explanations
+    
+    finally:
+        db.close()
+
+async def rescore_deferred() -> int:
+    """
+    Rescore a batch of deferred transactions if the ingest worker is idle
+    
+    Returns:
+        Number of transactions rescored
+    """
+    
+    if not await ingest_admission.try_acquire():
+        return 0
+    
+    try:
+        results, feature_matrix, scoring_results, pending_explanations = await ingest_admission.run(
+            _rescore_deferred_batch
         )
+    finally:
+        ingest_admission.release()
+    
+    if results:
+        shadow_scorer.submit(feature_matrix, scoring_results)
+        for pending in pending_explanations:
+            explanation_worker.submit(*pending)
         
-        # Convert numpy types to native Python types for JSON serialization
-        top_features_serializable = convert_to_json_serializable(top_features)
-        triggered_rules_serializable = convert_to_json_serializable(scoring_result["triggered_rules"])
+        # Alerts raised on rescoring reach the dashboard like live ones
+        for result in results:
+            if result["alert_generated"]:
+                await broadcast_alert({
+                    "alert_id": result["alert_id"],
+                    "txn_id": result["txn_id"],
+                    "risk_score": result["risk_score"],
+                    "alert_level": result["alert_level"]
+                })
+    
+    return len(results)
+
+def _pending_explanation_jobs(exclude: set, limit: int) -> List[tuple]:
+    """
+    Rebuild explanation jobs for PENDING alerts from their stored transactions
+    
+    Features are recomputed from the database and the scores are read
+    from the alert row; the anomaly findings are re-derived from the
+    features, since the account baseline at scoring time is gone.
+    
+    Args:
+        exclude: alert_ids with a job queued already
+        limit: Maximum jobs to rebuild
+    
+    Returns:
+        Arguments for explanation_worker.submit, oldest alert first
+    """
+    
+    db = SessionLocal()
+    try:
+        query = db.query(Alert, Transaction)\
+            .join(Transaction, Transaction.txn_id == Alert.txn_id)\
+            .filter(Alert.explanation_status == "PENDING")
+        if exclude:
+            query = query.filter(Alert.alert_id.notin_(exclude))
+        rows = query.order_by(Alert.id).limit(limit).all()
+        
+        jobs = []
+        for alert, transaction in rows:
+            transaction_data = {field: getattr(transaction, field) for field in TransactionCreate.model_fields}
+            features = feature_engine.compute_features(db, transaction_data)
+            scoring_result = {
+                "risk_score": alert.risk_score,
+                "alert_level": alert.alert_level,
+                "rule_score": alert.rule_score,
+                "anomaly_score": alert.anomaly_score,
+                "ml_score": alert.ml_score,
+                "triggered_rules": load_triggered_rules(alert.triggered_rules),
+                "anomaly_explanation": scoring_engine.anomaly_detector.get_anomaly_explanation(features),
+                "ml_explanation": dict(DEGRADED_ML_EXPLANATION) if alert.degraded else {},
+                "model_version": alert.model_version,
+                "config_version": alert.config_version,
+                "degraded": bool(alert.degraded)
+            }
+            jobs.append((
+                alert.alert_id, transaction_data, scoring_result, features,
+                feature_engine.get_feature_vector(features)
+            ))
+        return jobs
+    
+    finally:
+        db.close()
+
+async def recover_pending_explanations() -> int:
+    """
+    Queue PENDING alerts that have no explanation job
+    
+    Picks up alerts whose job was lost in a restart or skipped because
+    the queue was full, as much as the queue has room for.
+    
+    Returns:
+        Number of alerts queued
+    """
+    
+    limit = explanation_worker.free_slots()
+    if limit <= 0:
+        return 0
+    
+    exclude = {alert_id for alert_id, _ in explanation_worker.queued}
+    jobs = await asyncio.to_thread(_pending_explanation_jobs, exclude, limit)
+    for job in jobs:
+        explanation_worker.submit(*job)
+    
+    return len(jobs)
+
+def _seed_baselines():
+    """Rebuild the account baselines from history (runs in the ingest worker)"""
+    
+    db = SessionLocal()
+    try:
+        scoring_engine.anomaly_detector.seed_baselines(db)
+    finally:
+        db.close()
+
+async def seed_baselines():
+    """
+    Replay recent transactions into the account baselines
+    
+    Holds the ingest slot throughout, so no transaction is scored (and
+    observed) while the history is replayed and its update is not lost
+    when the replayed baselines replace the live ones. Requests arriving
+    meanwhile overflow as usual (deferred or 429).
+    """
+    
+    await ingest_admission.acquire()
+    try:
+        await ingest_admission.run(_seed_baselines)
+    finally:
+        ingest_admission.release()
+
+def _reset_data() -> dict:
+    """Empty the data tables and the state derived from them (runs in the ingest worker)"""
+    
+    from app.database import reset_tables
+    from app.detection.peer_groups import peer_baselines
+    from app.metrics import reset_metrics
+    
+    start = perf_counter()
+    reset_tables()
+    archived_files = archive_store.clear()
+    
+    scoring_engine.anomaly_detector.reset_learned_state()
+    peer_baselines.clear()
+    alert_stats.reset()
+    ingest_admission.reset_counters()
+    reset_metrics()
+    
+    return {"archive_files_deleted": archived_files, "seconds": round(perf_counter() - start, 3)}
+
+async def reset_data() -> dict:
+    """
+    Reset the system to no transactions or alerts
+    
+    Waits for the ingest worker so nothing is scored or written meanwhile.
+    The models are kept; accounts too.
+    """
+    
+    await ingest_admission.acquire()
+    try:
+        return await ingest_admission.run(_reset_data)
+    finally:
+        ingest_admission.release()
+
+@router.post("/ingest", response_model=dict)
+async def ingest_transaction(
+    txn: TransactionCreate,
+    db: Session = Depends(get_db)
+):
+    """
+    Ingest a transaction and perform real-time AML detection
+    
+    Scoring runs in the ingest worker under admission control. When the
+    request cannot start within the queue deadline it is either rejected
+    with 429 or, in "defer" mode, stored and scored by the rules only
+    ("deferred": true) and fully rescored later.
+    """
+    
+    transaction_data = txn.model_dump()
+    
+    async with ingest_admission.admit() as overflow:
+        if overflow is None:
+            response, scoring_result, feature_vector, pending_explanation = await ingest_admission.run(
+                _ingest_one, db, transaction_data
+            )
+    
+    if overflow is not None:
+        if INGEST_OVERFLOW_MODE != "defer":
+            ingest_admission.record_shed(overflow)
+            raise HTTPException(status_code=429, detail="Ingest overloaded", headers={"Retry-After": "1"})
         
-        # Create alert
-        alert_id = f"ALT{uuid.uuid4().hex[:12].upper()}"
-        db_alert = Alert(
-            alert_id=alert_id,
-            txn_id=txn.txn_id,
-            account_id=txn.account_id,
-            risk_score=float(scoring_result["risk_score"]),  # Ensure native Python float
-            alert_level=scoring_result["alert_level"],
-            rule_score=float(scoring_result["rule_score"]),
-            anomaly_score=float(scoring_result["anomaly_score"]),
-            ml_score=float(scoring_result["ml_score"]),
-            triggered_rules=json.dumps(triggered_rules_serializable),
-            explanation=explanation_text,
-            top_features=json.dumps(top_features_serializable),
-            status="NEW"
+        ingest_admission.record_deferred(overflow)
+        return await ingest_admission.run_fast_path(_ingest_deferred, db, transaction_data)
+    
+    shadow_scorer.submit([feature_vector], [scoring_result])
+    
+    # 5. Explain asynchronously
+    if pending_explanation is not None:
+        explanation_worker.submit(*pending_explanation)
+    
+    return response
+
+# Lets the profiler attribute samples from the ingest worker thread to the route
+ingest_transaction.worker_functions = (_ingest_one, _ingest_deferred)
+
+@router.post("/ingest/batch", response_model=dict)
+async def ingest_transactions_batch(
+    txns: List[TransactionCreate],
+    db: Session = Depends(get_db)
+):
+    """
+    Ingest a micro-batch of transactions and score them together
+    
+    Transactions and alerts are written with one commit each, and the ML
+    model is called once per batch instead of once per transaction.
+    Queued explanations are likewise explained in batches by the worker.
+    Batches share the single-ingest admission control; on overflow they
+    are always rejected with 429.
+    """
+    
+    if len(txns) > MAX_INGEST_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large ({len(txns)} > {MAX_INGEST_BATCH_SIZE})"
         )
-        db.add(db_alert)
-        db.commit()
-        db.refresh(db_alert)
+    
+    if not txns:
+        return {"success": True, "count": 0, "alerts_generated": 0, "results": []}
+    
+    transactions_data = [txn.model_dump() for txn in txns]
+    
+    async with ingest_admission.admit() as overflow:
+        if overflow is None:
+            results, alerts_generated, feature_matrix, scoring_results, pending_explanations = await ingest_admission.run(
+                _ingest_batch, db, transactions_data
+            )
+    
+    if overflow is not None:
+        ingest_admission.record_shed(overflow)
+        raise HTTPException(status_code=429, detail="Ingest overloaded", headers={"Retry-After": "1"})
+    
+    shadow_scorer.submit(feature_matrix, scoring_results)
+    
+    # 5. Explain asynchronously
+    for pending in pending_explanations:
+        explanation_worker.submit(*pending)
     
     return {
         "success": True,
-        "txn_id": txn.txn_id,
-        "risk_score": scoring_result["risk_score"],
-        "alert_level": scoring_result["alert_level"],
-        "alert_id": alert_id,
-        "alert_generated": alert_id is not None
+        "count": len(results),
+        "alerts_generated": alerts_generated,
+        "results": results
     }
 
+ingest_transactions_batch.worker_functions = (_ingest_batch,)
+
 @router.get("/", response_model=List[TransactionResponse])
 async def list_transactions(
+    response: Response,
+    account_id: Optional[str] = None,
+    include_archived: bool = False,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 50,
     db: Session = Depends(get_db)
 ):
-    """List recent transactions"""
+    """
+    List recent transactions, newest first
+    
+    Page with the opaque cursor returned in the X-Next-Cursor header
+    (absent on the last page); skip still works but costs O(skip).
+    include_archived also pages through transactions moved to the archive
+    by the retention policy.
+    """
+    
+    query = db.query(Transaction)
+    if account_id:
+        query = query.filter(Transaction.account_id == account_id)
     
-    transactions = db.query(Transaction)\
-        .order_by(Transaction.timestamp.desc())\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
+    archived = None
+    if include_archived:
+        def archived(position, count):
+            return archive_store.page(
+                "transactions", position, count,
+                where=(lambda columns, month: columns["account_id"] == account_id) if account_id else None
+            )
+    
+    transactions, next_cursor = keyset_page(
+        query, Transaction.timestamp, Transaction.id, cursor, limit, skip, archived
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     return transactions
 
 @router.get("/{txn_id}", response_model=TransactionResponse)
 async def get_transaction(
     txn_id: str,
+    include_archived: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Get transaction by ID"""
+    """Get transaction by ID, looking in the archive too if include_archived"""
     
     transaction = db.query(Transaction).filter(Transaction.txn_id == txn_id).first()
     
+    if not transaction and include_archived:
+        transaction = archive_store.find("transactions", "txn_id", txn_id)
+    
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
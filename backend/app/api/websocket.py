@@ -9,6 +9,7 @@ import json
 
 from app.database import get_db
 from app.models import Transaction, Alert
+from app.metrics import stage_timer, ERRORS
 
 router = APIRouter()
 
@@ -27,11 +28,12 @@ class ConnectionManager:
     
     async def broadcast(self, message: dict):
         """Broadcast message to all connected clients"""
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass  # Handle disconnected clients
+        with stage_timer("websocket_broadcast"):
+            for connection in self.active_connections:
+                try:
+                    await connection.send_json(message)
+                except:
+                    ERRORS.inc("websocket_broadcast")  # Handle disconnected clients
 
 manager = ConnectionManager()
 
@@ -0,0 +1,474 @@
+"""
+Monthly archival of old transactions and alerts to compressed columnar files
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Boolean, DateTime, Float, Integer, delete, func, select
+from sqlalchemy.orm import Session
+
+from app.config import ARCHIVE_DIR, ARCHIVE_CACHED_FILES, ARCHIVE_DELETE_BATCH, ARCHIVE_SCAN_CHUNK
+from app.database import stored_text
+from app.models import Alert, AlertRule, Transaction
+
+# Archived table -> (model, column that assigns rows to a month)
+PARTITIONED = {
+    "transactions": (Transaction, Transaction.timestamp),
+    "alerts": (Alert, Alert.created_at),
+}
+ARCHIVED_MODELS = {"transactions": Transaction, "alerts": Alert, "alert_rules": AlertRule}
+# Column each partitioned table's files are sorted by (with id), newest last
+SORT_COLUMNS = {table: month_column.key for table, (_, month_column) in PARTITIONED.items()}
+# Natural key of archived rows (ids of deleted rows may be reused by tables
+# created before they were AUTOINCREMENT)
+ROW_KEYS = {"transactions": ("txn_id",), "alerts": ("alert_id",), "alert_rules": ("alert_id", "rule_name")}
+
+FILE_PATTERN = re.compile(r"^(\w+)_(\d{4})_(\d{2})\.npz$")
+
+Columns = Dict[str, np.ndarray]
+# Column name -> (argsort order, sorted values) of one file
+Indexes = Dict[str, Tuple[np.ndarray, np.ndarray]]
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def to_columns(model, rows: List[tuple]) -> Columns:
+    """
+    Rows (in model column order) as one array per column plus a
+    "<name>__null" mask. DateTime columns keep their stored text so
+    archived rows sort exactly like the database. Text columns are
+    object arrays of str (offset-encoded in the files, see save_columns).
+    """
+    columns = {}
+    for position, column in enumerate(model.__table__.columns):
+        values = [row[position] for row in rows]
+        nulls = np.array([value is None for value in values], dtype=bool)
+        if isinstance(column.type, Boolean):
+            array = np.array([bool(value) for value in values], dtype=bool)
+        elif isinstance(column.type, Integer):
+            array = np.array([value or 0 for value in values], dtype=np.int64)
+        elif isinstance(column.type, Float):
+            array = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        else:
+            array = np.empty(len(values), dtype=object)
+            array[:] = ["" if value is None else str(value) for value in values]
+        columns[column.name] = array
+        columns[f"{column.name}__null"] = nulls
+    return columns
+
+
+def save_columns(file, columns: Columns):
+    """
+    Write columns to a compressed .npz
+
+    Text columns are stored as their UTF-8 bytes concatenated plus a
+    "<name>__lengths" array of each row's byte length (its offsets are the
+    running sum; lengths compress far better than the offsets), so a long
+    value costs its own length rather than widening the whole column.
+    """
+    arrays = {}
+    for name, array in columns.items():
+        if array.dtype == object:
+            encoded = [value.encode() for value in array]
+            arrays[name] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+            arrays[f"{name}__lengths"] = np.array([len(value) for value in encoded], dtype=np.uint32)
+        else:
+            arrays[name] = array
+    np.savez_compressed(file, **arrays)
+
+
+def load_columns(archive) -> Columns:
+    """
+    Columns of an opened .npz written by save_columns
+
+    Files written before offset encoding hold text as fixed-width str
+    arrays; those are converted to object arrays too.
+    """
+    columns = {}
+    for name in archive.files:
+        if name.endswith("__lengths"):
+            continue
+        array = archive[name]
+        if f"{name}__lengths" in archive.files:
+            data = array.tobytes()
+            offsets = [0] + np.cumsum(archive[f"{name}__lengths"], dtype=np.int64).tolist()
+            array = np.empty(len(offsets) - 1, dtype=object)
+            array[:] = [data[start:end].decode() for start, end in zip(offsets, offsets[1:])]
+        elif array.dtype.kind == "U":
+            array = array.astype(object)
+        columns[name] = array
+    return columns
+
+
+def sort_columns(table: str, columns: Columns) -> Columns:
+    """Rows of a partitioned table in (sort column, id) order"""
+    if table not in SORT_COLUMNS or not columns:
+        return columns
+    order = np.lexsort((columns["id"], columns[SORT_COLUMNS[table]]))
+    return {name: array[order] for name, array in columns.items()}
+
+
+def concat_columns(parts: List[Columns]) -> Columns:
+    parts = [part for part in parts if part]
+    if not parts:
+        return {}
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+class ArchiveStore:
+    """
+    Month partitions of old rows, one compressed .npz per table and month
+
+    archive() moves every month that ended more than the retention period
+    ago out of the hot tables: transactions by timestamp, alerts (with
+    their alert_rules rows) by created_at or together with their
+    transaction, whichever comes first. The files are columnar (one
+    array per column) and sorted by (SORT_COLUMNS, id), and read-only
+    queries can include them through page() and find(). Reads load only
+    the month files they reach, newest first, and keep the most recently
+    used ARCHIVE_CACHED_FILES of them in memory.
+    """
+
+    def __init__(self, directory: Path, cached_files: int = ARCHIVE_CACHED_FILES):
+        self.directory = Path(directory)
+        self.cached_files = cached_files
+        self._lock = threading.Lock()
+        # file name -> (mtime, columns, lookup indexes), least recently used first
+        self._cache: "OrderedDict[str, Tuple[int, Columns, Indexes]]" = OrderedDict()
+
+    def files(self, table: Optional[str] = None) -> List[Path]:
+        """Archive files, oldest month first"""
+        if not self.directory.exists():
+            return []
+        return sorted(
+            path for path in self.directory.iterdir()
+            if (match := FILE_PATTERN.match(path.name)) and (table is None or match.group(1) == table)
+        )
+
+    def months(self, table: str) -> List[Tuple[datetime, Path]]:
+        """(month, file) of a table, newest month first"""
+        months = []
+        for path in self.files(table):
+            match = FILE_PATTERN.match(path.name)
+            months.append((datetime(int(match.group(2)), int(match.group(3)), 1), path))
+        return months[::-1]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        return [
+            {"file": path.name, "table": FILE_PATTERN.match(path.name).group(1), "bytes": path.stat().st_size}
+            for path in self.files()
+        ]
+
+    def archive(self, db: Session, cutoff: datetime) -> Dict[str, int]:
+        """
+        Archive every month that ended at or before `cutoff`
+
+        Each month is written to its file (merged with rows archived
+        earlier, deduplicated by ROW_KEYS) before its rows are deleted, so
+        a crash in between leaves the rows in both places, never in neither.
+
+        The hot tables stay single tables (the ORM queries, indexes and
+        keyset pagination all assume one table per model), so a month is
+        retired by deleting its rows by primary key in batches of
+        ARCHIVE_DELETE_BATCH rather than by dropping a partition.
+
+        Returns:
+            Rows archived per table
+        """
+        counts = {table: 0 for table in ARCHIVED_MODELS}
+        last_month = month_start(cutoff)
+
+        for table, (model, month_column) in PARTITIONED.items():
+            # The oldest remaining row names the next month to archive
+            while True:
+                oldest = db.query(func.min(stored_text(month_column))).scalar()
+                if oldest is None or month_start(datetime.fromisoformat(oldest)) >= last_month:
+                    break
+
+                archived = self._archive_month(
+                    db, table, model, month_column, month_start(datetime.fromisoformat(oldest))
+                )
+                for archived_table, count in archived.items():
+                    counts[archived_table] += count
+
+        if any(counts.values()):
+            print(f"✅ Archived {counts['transactions']} transactions and {counts['alerts']} alerts before {last_month:%Y-%m}")
+        return counts
+
+    def _archive_month(self, db: Session, table: str, model, month_column, month: datetime) -> Dict[str, int]:
+        in_month = [
+            stored_text(month_column) >= f"{month:%Y-%m-%d}",
+            stored_text(month_column) < f"{next_month(month):%Y-%m-%d}"
+        ]
+
+        if model is Alert:
+            return self._archive_alerts(db, *in_month)
+
+        rows = db.execute(select(*self._select_columns(model)).where(*in_month)).all()
+        if not rows:
+            return {}
+
+        columns = to_columns(model, rows)
+        self._write(table, month, columns)
+        counts = {table: len(rows)}
+
+        # Only the rows just written are deleted (rows added to the month
+        # meanwhile stay for the next pass), in one short write transaction
+        # per batch so ingest is not blocked behind a whole month's delete
+        for start in range(0, len(rows), ARCHIVE_DELETE_BATCH):
+            # Alerts go with their transactions (into their own created_at
+            # months), so no hot alert is left without its transaction
+            archived = self._archive_alerts(
+                db, Alert.txn_id.in_(columns["txn_id"][start:start + ARCHIVE_DELETE_BATCH].tolist())
+            )
+            for archived_table, count in archived.items():
+                counts[archived_table] = counts.get(archived_table, 0) + count
+
+            batch = columns["id"][start:start + ARCHIVE_DELETE_BATCH].tolist()
+            db.execute(delete(model).where(model.id.in_(batch)))
+            db.commit()
+        return counts
+
+    def _archive_alerts(self, db: Session, *criteria) -> Dict[str, int]:
+        """Archive the alerts matching criteria with their alert_rules rows, by created_at month"""
+        rows = db.execute(select(*self._select_columns(Alert)).where(*criteria)).all()
+        if not rows:
+            return {}
+
+        columns = to_columns(Alert, rows)
+        batches = [
+            columns["id"][start:start + ARCHIVE_DELETE_BATCH].tolist()
+            for start in range(0, len(rows), ARCHIVE_DELETE_BATCH)
+        ]
+        rule_rows = []
+        for batch in batches:
+            rule_rows += db.execute(
+                select(*self._select_columns(AlertRule)).where(AlertRule.alert_id.in_(batch))
+            ).all()
+        rule_columns = to_columns(AlertRule, rule_rows)
+
+        # Stored created_at text starts with YYYY-MM
+        months = np.array([created_at[:7] for created_at in columns["created_at"]])
+        alert_months = dict(zip(columns["id"].tolist(), months))
+        rule_months = np.array([alert_months[alert_id] for alert_id in rule_columns["alert_id"].tolist()])
+
+        for key in np.unique(months):
+            month = datetime.strptime(key, "%Y-%m")
+            self._write("alerts", month, {name: array[months == key] for name, array in columns.items()})
+            if rule_rows and np.any(rule_months == key):
+                self._write(
+                    "alert_rules", month,
+                    {name: array[rule_months == key] for name, array in rule_columns.items()}
+                )
+
+        for batch in batches:
+            db.execute(delete(AlertRule).where(AlertRule.alert_id.in_(batch)))
+            db.execute(delete(Alert).where(Alert.id.in_(batch)))
+            db.commit()
+        return {"alerts": len(rows), "alert_rules": len(rule_rows)}
+
+    @staticmethod
+    def _select_columns(model) -> list:
+        return [
+            stored_text(column) if isinstance(column.type, DateTime) else column
+            for column in model.__table__.columns
+        ]
+
+    def _write(self, table: str, month: datetime, columns: Columns):
+        path = self.directory / f"{table}_{month:%Y_%m}.npz"
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            if path.exists():
+                with np.load(path) as existing:
+                    columns = concat_columns([load_columns(existing), columns])
+                # Keep the latest copy of rows archived twice
+                keys = zip(*(columns[name].tolist() for name in ROW_KEYS[table]))
+                last = {key: i for i, key in enumerate(keys)}
+                keep = np.sort(np.fromiter(last.values(), dtype=np.int64, count=len(last)))
+                columns = {name: array[keep] for name, array in columns.items()}
+
+            temporary = path.with_suffix(".tmp")
+            with open(temporary, "wb") as f:
+                save_columns(f, sort_columns(table, columns))
+            os.replace(temporary, path)
+            self._cache.pop(path.name, None)
+
+    def clear(self) -> int:
+        """
+        Delete every archive file
+
+        Returns:
+            Number of files deleted
+        """
+        with self._lock:
+            files = self.files()
+            for path in files:
+                path.unlink()
+            self._cache.clear()
+        return len(files)
+
+    def _load(self, path: Path) -> Tuple[Columns, Indexes]:
+        """A month file's columns and lookup indexes (cached until the file changes)"""
+        try:
+            signature = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}, {}
+
+        with self._lock:
+            cached = self._cache.get(path.name)
+            if cached is not None and cached[0] == signature:
+                self._cache.move_to_end(path.name)
+                return cached[1], cached[2]
+
+            with np.load(path) as archive:
+                columns = load_columns(archive)
+                # Files from before offset encoding were not kept sorted either
+                legacy = not any(name.endswith("__lengths") for name in archive.files)
+            if legacy:
+                columns = sort_columns(FILE_PATTERN.match(path.name).group(1), columns)
+
+            self._cache[path.name] = (signature, columns, {})
+            while len(self._cache) > self.cached_files:
+                self._cache.popitem(last=False)
+            return columns, self._cache[path.name][2]
+
+    def read(self, table: str, month: datetime) -> Columns:
+        """Archived rows of a table for one month (empty if none)"""
+        return self._load(self.directory / f"{table}_{month:%Y_%m}.npz")[0]
+
+    def rows(self, table: str, columns: Columns, indices) -> List[SimpleNamespace]:
+        """Archived rows as attribute objects shaped like the ORM model"""
+        model = ARCHIVED_MODELS[table]
+        rows = []
+        for i in indices:
+            values = {}
+            for column in model.__table__.columns:
+                if columns[f"{column.name}__null"][i]:
+                    values[column.name] = None
+                elif isinstance(column.type, DateTime):
+                    values[column.name] = datetime.fromisoformat(str(columns[column.name][i]))
+                else:
+                    value = columns[column.name][i]
+                    values[column.name] = value.item() if isinstance(value, np.generic) else value
+            rows.append(SimpleNamespace(**values))
+        return rows
+
+    def find(self, table: str, column: str, value: Any) -> Optional[SimpleNamespace]:
+        """
+        Archived row with column == value, searching the newest month first
+
+        Each file gets a sorted index of the column on its first lookup,
+        so a lookup is a binary search per month file.
+        """
+        for _, path in self.months(table):
+            columns, indexes = self._load(path)
+            if not columns:
+                continue
+
+            if column not in indexes:
+                order = np.argsort(columns[column], kind="stable")
+                indexes[column] = (order, columns[column][order])
+            order, sorted_values = indexes[column]
+
+            position = np.searchsorted(sorted_values, value)
+            if position < len(sorted_values) and sorted_values[position] == value:
+                return self.rows(table, columns, [order[position]])[0]
+
+        return None
+
+    def page(
+        self,
+        table: str,
+        position: Optional[Tuple[str, int]],
+        count: int,
+        where: Optional[Callable[[Columns, datetime], np.ndarray]] = None,
+        since: Optional[str] = None
+    ) -> List[Tuple[SimpleNamespace, str, int]]:
+        """
+        Up to `count` archived rows after a keyset position, newest first
+
+        Months are read newest first, skipping those after the position
+        and stopping at `since` or once the page is full. Within a month
+        the position is found by binary search and rows are filtered
+        backwards from it in ARCHIVE_SCAN_CHUNK slices.
+
+        Args:
+            position: (stored SORT_COLUMNS value, id) of the last row already returned
+            where: Boolean mask over a slice of one month's columns
+                selecting the rows to page
+            since: Stored timestamp; months that ended before it are skipped
+                (`where` must still filter the rows of the month it falls in)
+
+        Returns:
+            (row, stored sort value, id) tuples, for keyset_page(archived=...)
+        """
+        page = []
+
+        for month, path in self.months(table):
+            if position is not None and position[0] < f"{month:%Y-%m-%d}":
+                continue
+            if since is not None and since >= f"{next_month(month):%Y-%m-%d}":
+                break
+
+            columns, _ = self._load(path)
+            if not columns:
+                continue
+
+            sort_values = columns[SORT_COLUMNS[table]]
+            ids = columns["id"]
+            end = len(ids)
+            if position is not None:
+                sort_value, row_id = position
+                start = np.searchsorted(sort_values, sort_value, side="left")
+                stop = np.searchsorted(sort_values, sort_value, side="right")
+                end = start + np.searchsorted(ids[start:stop], row_id, side="left")
+
+            while end > 0 and len(page) < count:
+                begin = max(0, end - max(count - len(page), ARCHIVE_SCAN_CHUNK))
+                selected = np.arange(begin, end)
+                if where is not None:
+                    selected = selected[where({name: array[begin:end] for name, array in columns.items()}, month)]
+                selected = selected[::-1][:count - len(page)]
+                page += [
+                    (row, sort_values[i], int(ids[i]))
+                    for row, i in zip(self.rows(table, columns, selected), selected)
+                ]
+                end = begin
+
+            if len(page) >= count:
+                break
+
+        return page
+
+
+# Shared by the retention loop, the admin endpoints and the list/detail queries
+archive_store = ArchiveStore(ARCHIVE_DIR)
+
+
+def apply_retention(retention_days: float) -> Dict[str, int]:
+    """Archive the months older than the retention period, then re-read the alert statistics"""
+    from app.database import SessionLocal
+    from app.stats import alert_stats
+
+    db = SessionLocal()
+    try:
+        counts = archive_store.archive(db, datetime.now() - timedelta(days=retention_days))
+        if any(counts.values()):
+            alert_stats.reconcile(db)
+        return counts
+    finally:
+        db.close()
@@ -0,0 +1,130 @@
+"""
+Alert coalescing: one open case per account and pattern during a burst
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.models import Alert
+from app.stats import ALERT_LEVELS
+
+# Pattern of alerts raised by the anomaly detector or ML model alone
+MODEL_PATTERN = "MODEL"
+
+# Columns that follow the highest-scoring linked transaction
+PRIMARY_COLUMNS = (
+    "txn_id", "risk_score", "alert_level", "rule_score", "anomaly_score", "ml_score",
+    "triggered_rules", "model_version", "config_version", "degraded"
+)
+
+
+def event_time(timestamp: datetime) -> datetime:
+    """Transaction timestamp as stored (naive wall time)"""
+    return timestamp.replace(tzinfo=None)
+
+
+class AlertCoalescer:
+    """
+    Fold alerting transactions into an open alert of the same account and pattern
+
+    The pattern is the highest-severity triggered rule (MODEL_PATTERN when
+    no rule fired). While an alert is NEW, further alerting transactions
+    of that account and pattern whose timestamp is within `window` seconds
+    of its latest linked transaction are linked to it instead of creating
+    a new alert: the transaction count and txn_ids grow, and if the
+    transaction scores higher it becomes the alert's primary transaction
+    (scores, rules and explanation). An alert stops taking transactions
+    once it links `max_transactions`, so a long burst opens a new case.
+    """
+
+    def __init__(self, window: float, max_transactions: int, enabled: bool = True):
+        """
+        Args:
+            window: Seconds of event time between linked transactions
+            max_transactions: Transactions one alert may link
+            enabled: When False every alerting transaction opens its own alert
+        """
+        self.window = timedelta(seconds=window)
+        self.max_transactions = max_transactions
+        self.enabled = enabled
+
+    @staticmethod
+    def pattern(scoring_result: Dict[str, Any]) -> str:
+        rules = scoring_result["triggered_rules"]
+        if not rules:
+            return MODEL_PATTERN
+        return max(
+            rules,
+            key=lambda rule: ALERT_LEVELS.index(rule["severity"]) if rule["severity"] in ALERT_LEVELS else -1
+        )["rule_name"]
+
+    def open_alerts(self, db: Session, transactions_data: List[Dict[str, Any]]) -> Dict[Tuple[str, str], Alert]:
+        """
+        Open alerts that transactions of these accounts may join, by (account_id, pattern)
+
+        Returns an empty mapping when coalescing is disabled.
+        """
+        if not self.enabled or not transactions_data:
+            return {}
+
+        earliest = min(event_time(data["timestamp"]) for data in transactions_data) - self.window
+        alerts = db.query(Alert)\
+            .options(selectinload(Alert.rules))\
+            .filter(
+                Alert.account_id.in_({data["account_id"] for data in transactions_data}),
+                Alert.pattern.isnot(None),
+                Alert.status == "NEW",
+                Alert.last_txn_at >= earliest
+            )\
+            .order_by(Alert.id)\
+            .all()
+
+        # The newest alert wins when a key has several
+        return {(alert.account_id, alert.pattern): alert for alert in alerts}
+
+    def start(self, alert: Alert, pattern: str, timestamp: datetime):
+        """Set up a new alert as a case that later transactions can join"""
+        alert.pattern = pattern
+        alert.txn_count = 1
+        alert.txn_ids = json.dumps([alert.txn_id])
+        alert.last_txn_at = event_time(timestamp)
+
+    def accepts(self, alert: Optional[Alert], timestamp: datetime) -> bool:
+        """Whether a transaction at `timestamp` can join `alert`"""
+        return (
+            self.enabled
+            and alert is not None
+            and (alert.txn_count or 1) < self.max_transactions
+            and abs(event_time(timestamp) - alert.last_txn_at) <= self.window
+        )
+
+    def merge(self, alert: Alert, candidate: Alert, timestamp: datetime) -> bool:
+        """
+        Link the transaction of `candidate` (an unsaved alert from
+        build_alert) to `alert`
+
+        Returns:
+            True if the transaction became the primary one, so the alert
+            needs a new explanation
+        """
+        txn_ids = json.loads(alert.txn_ids) if alert.txn_ids else [alert.txn_id]
+        txn_ids.append(candidate.txn_id)
+        alert.txn_ids = json.dumps(txn_ids)
+        alert.txn_count = len(txn_ids)
+        alert.last_txn_at = max(alert.last_txn_at, event_time(timestamp))
+
+        # Rule search finds the case under every rule any of its transactions triggered
+        known_rules = {rule.rule_name for rule in alert.rules}
+        alert.rules.extend(rule for rule in candidate.rules if rule.rule_name not in known_rules)
+
+        if candidate.risk_score <= alert.risk_score:
+            return False
+
+        for column in PRIMARY_COLUMNS:
+            setattr(alert, column, getattr(candidate, column))
+        alert.explanation_data = None
+        alert.top_features = candidate.top_features
+        alert.explanation_status = "PENDING"
+        return True
@@ -13,7 +13,109 @@ DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{BASE_DIR}/aml_database.db"
 # Model paths
 MODEL_DIR = BASE_DIR / "ml" / "models"
 MODEL_PATH = MODEL_DIR / "aml_model.pkl"
-EXPLAINER_PATH = MODEL_DIR / "explainer.pkl"
+# Flat .npy arrays built from MODEL_PATH, memory-mapped at load time
+COMPILED_MODEL_DIR = MODEL_DIR / "aml_model_compiled"
+# Versioned models: registry/<version>/aml_model.pkl, ACTIVE names the served one
+MODEL_REGISTRY_DIR = MODEL_DIR / "registry"
+ANOMALY_MODEL_PATH = MODEL_DIR / "isolation_forest.pkl"
+
+# SHAP: use Saabas approximate contributions instead of exact TreeSHAP
+SHAP_APPROX_CONTRIBS = False
+
+# Serve predictions from the NumPy-compiled tree ensemble instead of XGBoost
+# (only if it reproduces predict_proba bit for bit at load time)
+USE_COMPILED_MODEL = True
+# Above this many rows XGBoost's multi-threaded predictor is faster
+COMPILED_MODEL_MAX_BATCH_ROWS = 16
+
+# Ingestion settings
+MAX_INGEST_BATCH_SIZE = 10000  # Max transactions per /ingest/batch request
+MAX_ALERT_BATCH_SIZE = 200  # Max alerts per /api/alerts/batch request
+MAX_ALERT_BULK_UPDATE_SIZE = 10000  # Max alert IDs per /api/alerts/bulk-status request
+
+# Deferred explanation generation
+EXPLANATION_WORKERS = 2  # Threads computing SHAP + explanation text
+EXPLANATION_BATCH_SIZE = 64  # Max alerts explained per worker batch
+EXPLANATION_QUEUE_SIZE = 10000  # Beyond this, alerts stay PENDING until the recovery sweep
+EXPLANATION_RECOVERY_INTERVAL = 60  # seconds between sweeps re-queueing PENDING alerts
+
+# Admission control on the ingest endpoints. Scoring runs in one worker
+# thread; a request that finds INGEST_MAX_WAITING requests already queued,
+# or cannot start within INGEST_QUEUE_DEADLINE_MS, overflows. "reject"
+# answers 429; "defer" stores the transaction, runs rules only and leaves
+# it for the deferred rescoring loop (batches always get 429).
+INGEST_MAX_WAITING = 64
+INGEST_QUEUE_DEADLINE_MS = 250
+INGEST_OVERFLOW_MODE = "defer"  # 'defer' or 'reject'
+INGEST_FAST_PATH_WORKERS = 4  # Threads running the rules-only fast path
+DEFERRED_RESCORE_INTERVAL = 2  # seconds between rescoring passes
+DEFERRED_RESCORE_BATCH_SIZE = 500
+
+# Alert coalescing: alerting transactions of an account with the same
+# pattern (highest-severity rule) within the window of the previous one
+# are linked to its open alert instead of creating new alerts
+ALERT_COALESCING = False
+ALERT_COALESCE_WINDOW = 3600  # seconds of transaction time
+ALERT_COALESCE_MAX_TXNS = 500  # Transactions per alert before a new one is opened
+
+# Retention: months that ended more than ARCHIVE_RETENTION_DAYS ago are
+# moved from the transactions/alerts tables to compressed columnar files
+# in ARCHIVE_DIR. None (the default) disables the periodic pass; set it
+# (e.g. 180) to enable, keeping it above the longest feature and baseline
+# window (WINDOW_30_DAYS). POST /api/admin/archive still archives on demand.
+ARCHIVE_DIR = BASE_DIR / "archive"
+ARCHIVE_RETENTION_DAYS = None
+ARCHIVE_INTERVAL = 24 * 3600  # seconds between retention passes
+ARCHIVE_DELETE_BATCH = 5000  # Archived rows deleted per write transaction
+ARCHIVE_CACHED_FILES = 24  # Month files kept loaded for archive reads
+ARCHIVE_SCAN_CHUNK = 4096  # Rows filtered at a time when paging an archive file
+
+# In-memory alert statistics are re-read from the database this often
+STATS_RECONCILE_INTERVAL = 300  # seconds
+
+# IsolationForest baseline fitting (background job)
+ANOMALY_BASELINE_SAMPLE_SIZE = 2000  # Recent non-alerted transactions to fit on
+ANOMALY_REFIT_INTERVAL = 6 * 3600  # seconds between scheduled refits
+ANOMALY_REFIT_RETRY = 300  # seconds between attempts while not yet fitted
+
+# Anomaly model used by AnomalyDetector.detect_anomaly:
+# "isolation_forest" (batch-fitted) or "half_space_trees" (online, learns per event)
+ANOMALY_METHOD = "isolation_forest"
+HST_TREES = 25
+HST_DEPTH = 10
+HST_WINDOW_SIZE = 250  # Events per mass window; scores start after two windows
+
+# Per-account EWMA behavioral baselines
+BASELINE_EWMA_ALPHA = 0.1  # Weight of the newest event (~ last 20 events dominate)
+BASELINE_MIN_EVENTS = 5  # Below this, z-score anomaly uses global cut-offs
+BASELINE_INITIAL_CAPACITY = 1024  # Accounts; the store doubles when full
+
+# Peer-group baselines (account_type, risk_rating, country, income band)
+PEER_INCOME_BANDS = [2000, 5000, 10000, 25000, 50000]  # Monthly income band edges
+PEER_GROUP_MIN_TXNS = 20  # Smaller groups use the all-accounts baseline
+PEER_BASELINE_REFRESH_INTERVAL = 3600  # seconds
+
+# On-demand sampling profiler (/api/admin/profile)
+PROFILER_MAX_SECONDS = 60
+PROFILER_MIN_INTERVAL_MS = 1
+
+# Latency budgets and circuit breakers for the ML and SHAP stages. A call
+# is abandoned at its budget (that transaction or explanation degrades)
+# and counts as a failure; at BREAKER_FAILURE_RATE over the last
+# BREAKER_WINDOW calls the stage is skipped (degraded) for BREAKER_COOLDOWN.
+ML_LATENCY_BUDGET_MS = 25
+ML_LATENCY_BUDGET_PER_ROW_MS = 0.05
+SHAP_LATENCY_BUDGET_MS = 100
+SHAP_LATENCY_BUDGET_PER_ROW_MS = 5
+BREAKER_WINDOW = 20
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_MIN_CALLS = 5
+BREAKER_COOLDOWN = 30  # seconds
+
+# Shadow (challenger) model scoring
+SHADOW_LOG_DIR = BASE_DIR / "shadow_logs"  # <version>.bin score-pair logs
+SHADOW_BATCH_SIZE = 256  # Max rows scored per challenger call
+SHADOW_QUEUE_SIZE = 1000  # Pending ingest chunks; beyond this, pairs are dropped
 
 # Feature computation settings
 FEATURE_CACHE_TTL = 300  # 5 minutes
@@ -24,11 +126,19 @@ ANOMALY_WEIGHT = 0.25
 ML_WEIGHT = 0.40
 
 # Alert thresholds
+# (weights and thresholds are defaults; tune them at runtime via
+# PUT /api/admin/scoring-config or by editing SCORING_CONFIG_PATH)
 ALERT_THRESHOLD_LOW = 40
 ALERT_THRESHOLD_MEDIUM = 60
 ALERT_THRESHOLD_HIGH = 80
 ALERT_THRESHOLD_CRITICAL = 90
 
+# Runtime scoring config file, watched for changes. It also holds the
+# config version stamped on alerts, which persists across restarts; hand
+# edits are given the next version when picked up
+SCORING_CONFIG_PATH = BASE_DIR / "scoring_config.json"
+SCORING_CONFIG_POLL_INTERVAL = 5  # seconds
+
 # Transaction simulation
 DEFAULT_TXN_PER_MINUTE = 5
 DEFAULT_SIMULATION_DURATION = 60  # seconds
@@ -1,7 +1,7 @@
 """
 Database connection and session management
 """
-from sqlalchemy import create_engine
+from sqlalchemy import String, create_engine, inspect, text, type_coerce
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import DATABASE_URL
@@ -19,6 +19,10 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base class for models
 Base = declarative_base()
 
+def stored_text(column):
+    """A timestamp column compared as the text SQLite stores"""
+    return type_coerce(column, String)
+
 def get_db():
     """
     Dependency for getting database session
@@ -33,6 +37,96 @@ def init_db():
     """
     Initialize database tables
     """
-    from app.models import Transaction, Alert, Account, FeatureCache
+    from app.models import Transaction, Alert, AlertRule, Account, FeatureCache
     Base.metadata.create_all(bind=engine)
+    migrate_schema()
+    backfill_alert_rules()
     print("✅ Database initialized successfully")
+
+def reset_tables():
+    """
+    Empty the transaction, alert and feature cache tables
+    
+    The tables are dropped and recreated (with their indexes): SQLite
+    frees the pages wholesale instead of deleting rows one by one through
+    every index. Accounts are kept.
+    """
+    from app.models import Transaction, Alert, AlertRule, FeatureCache
+    tables = [AlertRule.__table__, Alert.__table__, Transaction.__table__, FeatureCache.__table__]
+    
+    with engine.begin() as conn:
+        Base.metadata.drop_all(conn, tables=tables)
+        Base.metadata.create_all(conn, tables=tables)
+
+def migrate_schema():
+    """
+    Add columns and indexes that were introduced after a table was first created
+    
+    create_all() only creates missing tables, so existing databases get new
+    nullable columns via ALTER TABLE and any missing indexes. Existing rows
+    read back as NULL.
+    """
+    inspector = inspect(engine)
+    
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                print(f"✅ Added column {table.name}.{column.name}")
+            
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+                    print(f"✅ Added index {index.name}")
+
+def backfill_alert_rules(batch_size: int = 5000):
+    """
+    Fill alert_rules from the triggered_rules JSON of alerts stored before it existed
+    
+    Runs only while alert_rules is empty, so it is a one-off per database.
+    """
+    from app.detection.rules import load_triggered_rules
+    from app.models import Alert, AlertRule
+    
+    db = SessionLocal()
+    try:
+        if db.query(AlertRule.id).first() is not None or db.query(Alert.id).first() is None:
+            return
+        
+        backfilled = 0
+        last_id = 0
+        while True:
+            alerts = db.query(Alert.id, Alert.triggered_rules, Alert.created_at)\
+                .filter(Alert.id > last_id)\
+                .order_by(Alert.id)\
+                .limit(batch_size)\
+                .all()
+            if not alerts:
+                break
+            
+            db.bulk_insert_mappings(AlertRule, [
+                {
+                    "alert_id": alert_id,
+                    "rule_name": rule["rule_name"],
+                    "severity": rule.get("severity"),
+                    "created_at": created_at
+                }
+                for alert_id, triggered_rules, created_at in alerts
+                for rule in load_triggered_rules(triggered_rules)
+            ])
+            db.commit()
+            backfilled += len(alerts)
+            last_id = alerts[-1][0]
+        
+        print(f"✅ Backfilled alert_rules for {backfilled} alerts")
+    finally:
+        db.close()
@@ -1,77 +1,410 @@
 """
 Anomaly detection using IsolationForest and z-score methods
 """
-from typing import Dict, List, Any
+import os
+import pickle
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
 import numpy as np
-from sklearn.ensemble import IsolationForest
+from sqlalchemy import func, select, true, union
+from sqlalchemy.orm import Session
+from app.config import (
+    ANOMALY_MODEL_PATH, ANOMALY_BASELINE_SAMPLE_SIZE, WINDOW_30_DAYS,
+    COMPILED_MODEL_MAX_BATCH_ROWS, ANOMALY_METHOD, HST_TREES, HST_DEPTH, HST_WINDOW_SIZE
+)
+from app.detection.compiled_trees import CompiledIsolationForest
+from app.detection.streaming import HalfSpaceTrees
+from app.detection.baselines import AccountBaselines
+from app.detection.peer_groups import peer_baselines
+from app.detection.ml_model import FEATURE_NAMES
+from app.features.engine import FeatureEngine
+from app.models import Transaction, Alert
 
 class AnomalyDetector:
     """Detect anomalies using unsupervised methods"""
     
     def __init__(self):
-        # Initialize IsolationForest with default parameters
-        # In production, this would be trained on historical data
-        self.isolation_forest = IsolationForest(
-            n_estimators=100,
-            contamination=0.1,  # Expect 10% anomalies
-            random_state=42
-        )
+        # (IsolationForest, CompiledIsolationForest or None), swapped as one
+        # reference so scoring never sees a half-updated model
+        self._forest_state: Optional[Tuple["IsolationForest", Optional[CompiledIsolationForest]]] = None
         self.is_fitted = False
+        self.fitted_at: Optional[datetime] = None
+        self.load_seconds: Optional[float] = None
+        self._load_attempted = False
+        self._load_lock = threading.Lock()
+        
+        self.reset_learned_state()
+    
+    @property
+    def isolation_forest(self) -> Optional["IsolationForest"]:
+        return self._forest_state[0] if self._forest_state else None
+    
+    def ensure_loaded(self) -> bool:
+        """Load the persisted forest on first use; returns whether one is fitted"""
+        if not self._load_attempted:
+            self.load_model()
+        return self.is_fitted
+    
+    def load_model(self):
+        """Load the persisted IsolationForest, if one has been fitted"""
+        with self._load_lock:
+            if self._load_attempted:
+                return
+            start = time.perf_counter()
+            self._load_persisted_forest()
+            self._load_attempted = True
+            self.load_seconds = time.perf_counter() - start
+    
+    def _load_persisted_forest(self):
+        try:
+            if os.path.exists(ANOMALY_MODEL_PATH):
+                with open(ANOMALY_MODEL_PATH, 'rb') as f:
+                    forest = pickle.load(f)
+                self._activate(forest)
+                self.fitted_at = datetime.fromtimestamp(os.path.getmtime(ANOMALY_MODEL_PATH))
+                print(f"✅ IsolationForest loaded from {ANOMALY_MODEL_PATH}")
+            else:
+                print(f"⚠️ IsolationForest not found at {ANOMALY_MODEL_PATH}. Will fit on baseline data.")
+        
+        except Exception as e:
+            print(f"⚠️ Error loading IsolationForest: {e}")
+    
+    def save_model(self):
+        """Persist the fitted IsolationForest beside the ML model"""
+        forest = self.isolation_forest
+        if forest is None:
+            return
+        
+        # Write then rename so a crash never leaves a truncated file
+        tmp_path = f"{ANOMALY_MODEL_PATH}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(forest, f)
+        os.replace(tmp_path, ANOMALY_MODEL_PATH)
+        print(f"✅ IsolationForest saved to {ANOMALY_MODEL_PATH}")
     
-    def fit_on_baseline(self, feature_vectors: List[List[float]]):
+    def fit_on_baseline(self, feature_vectors: List[List[float]]) -> bool:
         """
         Fit the IsolationForest on baseline normal data
         
+        A new forest is fitted and then swapped in, so this is safe to run
+        in a background thread while transactions are being scored.
+        
         Args:
             feature_vectors: List of feature vectors from normal transactions
+        
+        Returns:
+            True if a new forest was fitted
         """
         if len(feature_vectors) > 10:
-            self.isolation_forest.fit(feature_vectors)
-            self.is_fitted = True
+            from sklearn.ensemble import IsolationForest  # Deferred: heavy import, fit runs off the hot path
+            
+            forest = IsolationForest(
+                n_estimators=100,
+                contamination=0.1,  # Expect 10% anomalies
+                random_state=42
+            )
+            forest.fit(np.asarray(feature_vectors, dtype=float))
+            self._activate(forest, feature_vectors)
+            self.fitted_at = datetime.now()
+            # A fresh fit supersedes whatever is on disk
+            self._load_attempted = True
+            return True
+        return False
+    
+    def refit_from_history(self, db: Session) -> bool:
+        """
+        Fit on recent low-risk transactions and persist the result
+        
+        Low-risk means the transaction never generated an alert. Features
+        are recomputed from the DB, so call this off the ingest path.
+        
+        Returns:
+            True if a new forest was fitted
+        """
+        feature_vectors = self.collect_baseline_vectors(db)
+        if not self.fit_on_baseline(feature_vectors):
+            print(f"⚠️ Not enough baseline transactions to fit IsolationForest ({len(feature_vectors)})")
+            return False
+        
+        self.save_model()
+        print(f"✅ IsolationForest refitted on {len(feature_vectors)} baseline transactions")
+        return True
+    
+    def collect_baseline_vectors(
+        self,
+        db: Session,
+        limit: int = ANOMALY_BASELINE_SAMPLE_SIZE
+    ) -> List[List[float]]:
+        """
+        Feature vectors for the most recent transactions without alerts
+        
+        Coalesced alerts link several transactions (Alert.txn_ids, a JSON
+        array); all of them are excluded, not only the alert's primary one.
+        """
+        
+        since = datetime.now() - timedelta(seconds=WINDOW_30_DAYS)
+        linked_txn_ids = func.json_each(Alert.txn_ids).table_valued("value")
+        alerted_txn_ids = union(
+            select(Alert.txn_id),
+            select(linked_txn_ids.c.value).select_from(Alert).join(linked_txn_ids, true())
+        )
+        
+        transactions = db.query(Transaction).filter(
+            Transaction.timestamp >= since,
+            ~Transaction.txn_id.in_(alerted_txn_ids)
+        ).order_by(Transaction.timestamp.desc()).limit(limit).all()
+        
+        feature_engine = FeatureEngine()
+        vectors = []
+        for txn in transactions:
+            transaction_data = {
+                "txn_id": txn.txn_id,
+                "account_id": txn.account_id,
+                "timestamp": txn.timestamp,
+                "amount": txn.amount,
+                "counterparty_id": txn.counterparty_id,
+                "country_code": txn.country_code,
+                "is_international": txn.is_international
+            }
+            features = feature_engine.compute_features(db, transaction_data)
+            vectors.append(feature_engine.get_feature_vector(features))
+        
+        return vectors
+    
+    def _activate(self, forest: "IsolationForest", sample: Optional[List[List[float]]] = None):
+        """Compile (and check) a fitted forest, then swap it in"""
+        compiled = None
+        try:
+            compiled = CompiledIsolationForest.from_sklearn(forest)
+            if sample is None:
+                sample = compiled.probe_matrix(forest.n_features_in_)
+            max_diff, _ = compiled.verify(forest, np.asarray(sample, dtype=float))
+            if max_diff > 1e-9:
+                print("⚠️ Compiled IsolationForest disagrees with scikit-learn, using score_samples")
+                compiled = None
+        except Exception as e:
+            print(f"⚠️ Could not compile IsolationForest: {e}")
+        
+        self._forest_state = (forest, compiled)
+        self.is_fitted = True
+    
+    def isolation_scores(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """
+        IsolationForest anomaly scores (0-100) for a matrix of feature vectors
+        
+        Batches go through score_samples in one call; single rows and
+        small batches use the compiled forest.
+        
+        Returns:
+            Array of scores, all 0 if the forest is not fitted yet
+        """
+        feature_matrix = np.asarray(feature_matrix, dtype=float)
+        self.ensure_loaded()
+        state = self._forest_state
+        if state is None or feature_matrix.shape[0] == 0:
+            return np.zeros(feature_matrix.shape[0])
+        
+        forest, compiled = state
+        if compiled is not None and feature_matrix.shape[0] <= COMPILED_MODEL_MAX_BATCH_ROWS:
+            raw_scores = np.array([compiled.score_one(row) for row in feature_matrix])
+        else:
+            raw_scores = forest.score_samples(feature_matrix)
+        
+        # score_samples is in [-1, 0] (lower = more anomalous); map to 0-100
+        return np.clip((1 - raw_scores) * 50, 0, 100)
+    
+    def streaming_scores(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """
+        Half-Space Trees anomaly scores (0-100), learning from each row
+        
+        Rows are scored and then counted one at a time, in order, so a
+        batch behaves exactly like the same events arriving one by one.
+        
+        Returns:
+            Array of scores, all 0 until the detector has a reference window
+        """
+        return np.array([
+            self.streaming_detector.score_and_learn(row) * 100
+            for row in np.asarray(feature_matrix, dtype=float)
+        ])
+    
+    def model_scores(self, feature_matrix: np.ndarray, method: Optional[str] = None) -> np.ndarray:
+        """
+        Model-based anomaly scores (0-100) from the selected method
+        
+        Args:
+            method: "isolation_forest" or "half_space_trees" (default ANOMALY_METHOD)
+        """
+        method = method or ANOMALY_METHOD
+        if method == "half_space_trees":
+            return self.streaming_scores(feature_matrix)
+        if method == "isolation_forest":
+            return self.isolation_scores(feature_matrix)
+        raise ValueError(f"Unknown anomaly method: {method}")
+    
+    def reset_learned_state(self):
+        """Start the state learned from scored transactions afresh (also after a data reset)"""
+        # Online detector; learns from every event it scores
+        self.streaming_detector = HalfSpaceTrees(
+            n_features=len(FEATURE_NAMES),
+            n_trees=HST_TREES,
+            depth=HST_DEPTH,
+            window_size=HST_WINDOW_SIZE
+        )
+        
+        # Per-account EWMA baselines, updated as transactions are scored
+        self.account_baselines = AccountBaselines()
+    
+    def seed_baselines(self, db: Session):
+        """
+        Rebuild account baselines from recent history (e.g. after a restart)
+        
+        Replaces the live baselines, so call it while no transaction is
+        being scored (see seed_baselines in app.api.transactions).
+        """
+        self.account_baselines = AccountBaselines.from_history(db)
+        print(f"✅ Account baselines seeded for {len(self.account_baselines)} accounts")
+    
+    def observe(
+        self,
+        transaction_data: Dict[str, Any],
+        features: Dict[str, float]
+    ) -> Optional[Dict[str, float]]:
+        """
+        Compare a transaction with its account's baseline, then update it
+        
+        Accounts with too little history are compared with their peer
+        group instead. Call once per transaction, in arrival order.
+        
+        Returns:
+            Baseline deviation, or None if no baseline is available yet
+        """
+        deviation = self.account_baselines.observe(transaction_data, features)
+        if deviation is not None:
+            return deviation
+        
+        peer_stats = peer_baselines.for_account_id(transaction_data["account_id"])
+        if peer_stats is None:
+            return None
+        return peer_baselines.deviation(
+            peer_stats, AccountBaselines.observation(transaction_data, features)
+        )
     
     def detect_anomaly(
         self,
         features: Dict[str, float],
-        feature_vector: List[float]
+        feature_vector: List[float],
+        method: Optional[str] = None,
+        deviation: Optional[Dict[str, float]] = None
     ) -> float:
         """
         Detect anomalies and return anomaly score (0-100)
         
-        Combines IsolationForest score and z-score analysis
+        Combines the model score (IsolationForest or Half-Space Trees) and
+        z-score analysis
+        
+        Args:
+            method: "isolation_forest" or "half_space_trees" (default ANOMALY_METHOD)
+            deviation: Account baseline deviation from observe()
         
         Returns:
             Anomaly score (0-100, higher = more anomalous)
         """
         
-        # 1. IsolationForest score (if fitted)
-        if self.is_fitted:
-            # Predict anomaly score (-1 to 1, negative = anomaly)
-            isolation_score = self.isolation_forest.score_samples([feature_vector])[0]
-            # Convert to 0-100 (lower isolation_score = higher anomaly)
-            iso_anomaly_score = max(0, min(100, (1 - isolation_score) * 50))
-        else:
-            iso_anomaly_score = 0
+        # 1. Model score (0 until fitted / warmed up)
+        model_anomaly_score = float(self.model_scores([feature_vector], method)[0])
         
         # 2. Z-score based anomaly detection
-        zscore_anomaly_score = self._zscore_anomaly(features)
+        zscore_anomaly_score = self._zscore_anomaly(features, deviation)
         
         # 3. Combine scores
-        combined_score = (iso_anomaly_score + zscore_anomaly_score) / 2
+        combined_score = (model_anomaly_score + zscore_anomaly_score) / 2
         
         return combined_score
     
-    def _zscore_anomaly(self, features: Dict[str, float]) -> float:
+    def detect_anomaly_batch(
+        self,
+        features_list: List[Dict[str, float]],
+        feature_matrix: np.ndarray,
+        method: Optional[str] = None,
+        deviations: Optional[List[Optional[Dict[str, float]]]] = None
+    ) -> np.ndarray:
+        """
+        Anomaly scores (0-100) for a micro-batch
+        
+        The IsolationForest is evaluated once for the whole matrix.
+        """
+        model_anomaly_scores = self.model_scores(feature_matrix, method)
+        deviations = deviations or [None] * len(features_list)
+        zscore_anomaly_scores = np.array([
+            self._zscore_anomaly(features, deviation)
+            for features, deviation in zip(features_list, deviations)
+        ])
+        return (model_anomaly_scores + zscore_anomaly_scores) / 2
+    
+    def _zscore_anomaly(
+        self,
+        features: Dict[str, float],
+        deviation: Optional[Dict[str, float]] = None
+    ) -> float:
         """
         Calculate anomaly score based on z-scores
         
-        High absolute z-scores indicate anomalies
+        High absolute z-scores indicate anomalies. With an account
+        baseline deviation the amount, frequency, night-time and
+        counterparty checks are relative to the account's own history;
+        otherwise they use global cut-offs on the window features.
         """
         
-        # Key features to check for z-score anomalies
-        z_score_features = [
-            "TxnAmountZScore",
-            "TxnFrequencyAnomaly",
-        ]
+        if deviation is not None:
+            anomaly_score = self._baseline_anomaly(deviation)
+        else:
+            anomaly_score = self._global_anomaly(features)
+        
+        # Check income ratio
+        income_ratio = features.get("TxnAmountToIncomeRatio", 0)
+        if income_ratio > 0.7:
+            anomaly_score += 20
+        elif income_ratio > 0.5:
+            anomaly_score += 10
+        
+        return min(anomaly_score, 100)
+    
+    def _baseline_anomaly(self, deviation: Dict[str, float]) -> float:
+        """Points for deviating from the account's own EWMA baseline"""
+        
+        anomaly_score = 0
+        
+        # Amount vs the account's usual (log) amount
+        amount_z = deviation["amount_z"]
+        if amount_z > 3:
+            anomaly_score += 40
+        elif amount_z > 2:
+            anomaly_score += 25
+        elif amount_z > 1.5:
+            anomaly_score += 10
+        
+        # Hourly activity vs the account's usual rate
+        frequency_z = deviation["frequency_z"]
+        if frequency_z > 3:
+            anomaly_score += 30
+        elif frequency_z > 2:
+            anomaly_score += 15
+        
+        # Night-time activity for an account that rarely transacts at night
+        if deviation["is_night"]:
+            anomaly_score += 15 * (1 - deviation["night_ratio"])
+        
+        # New counterparty for an account that usually reuses them
+        if deviation["is_new_counterparty"]:
+            anomaly_score += 15 * (1 - deviation["novelty_rate"])
+        
+        return anomaly_score
+    
+    def _global_anomaly(self, features: Dict[str, float]) -> float:
+        """Points from global cut-offs, for accounts without a baseline yet"""
         
         anomaly_score = 0
         
@@ -97,18 +430,12 @@ class AnomalyDetector:
         if is_night and hourly_count > 2:
             anomaly_score += 15
         
-        # Check income ratio
-        income_ratio = features.get("TxnAmountToIncomeRatio", 0)
-        if income_ratio > 0.7:
-            anomaly_score += 20
-        elif income_ratio > 0.5:
-            anomaly_score += 10
-        
-        return min(anomaly_score, 100)
+        return anomaly_score
     
     def get_anomaly_explanation(
         self,
-        features: Dict[str, float]
+        features: Dict[str, float],
+        deviation: Optional[Dict[str, float]] = None
     ) -> Dict[str, Any]:
         """
         Generate explanation for anomaly detection
@@ -122,6 +449,9 @@ class AnomalyDetector:
             "unusual_patterns": []
         }
         
+        if deviation is not None:
+            return self._baseline_explanation(deviation, explanation)
+        
         # Z-score analysis
         txn_amount_zscore = features.get("TxnAmountZScore", 0)
         if abs(txn_amount_zscore) > 2:
@@ -129,7 +459,9 @@ class AnomalyDetector:
                 "feature": "TxnAmountZScore",
                 "value": round(txn_amount_zscore, 2),
                 "threshold": 2.0,
-                "interpretation": "Transaction amount significantly deviates from historical average"
+                "interpretation": "Transaction amount significantly deviates from historical average",
+                "code": "AMOUNT_ZSCORE",
+                "args": {}
             })
         
         # Frequency anomaly
@@ -137,14 +469,66 @@ class AnomalyDetector:
         if freq_anomaly > 3:
             explanation["unusual_patterns"].append({
                 "pattern": "High transaction frequency",
-                "detail": f"{features.get('HourlyTxnCount', 0)} transactions in 1 hour (normal: <5)"
+                "detail": f"{features.get('HourlyTxnCount', 0)} transactions in 1 hour (normal: <5)",
+                "code": "HIGH_FREQUENCY",
+                "args": {"HourlyTxnCount": features.get("HourlyTxnCount", 0)}
             })
         
         # Night transactions
         if features.get("IsNightTime", 0) and features.get("HourlyTxnCount", 0) > 2:
             explanation["unusual_patterns"].append({
                 "pattern": "Night-time activity",
-                "detail": f"Multiple transactions during night hours ({features.get('HourOfDay', 0)}:00)"
+                "detail": f"Multiple transactions during night hours ({features.get('HourOfDay', 0)}:00)",
+                "code": "NIGHT_ACTIVITY",
+                "args": {"HourOfDay": features.get("HourOfDay", 0)}
+            })
+        
+        return explanation
+    
+    def _baseline_explanation(
+        self,
+        deviation: Dict[str, float],
+        explanation: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Explanation relative to the account's own or its peer group's baseline"""
+        
+        baseline = deviation.get("baseline", "account")
+        whose = "peer accounts'" if baseline == "peer" else "this account's"
+        
+        if deviation["amount_z"] > 2:
+            explanation["z_score_features"].append({
+                "feature": "AccountAmountZScore",
+                "value": round(deviation["amount_z"], 2),
+                "threshold": 2.0,
+                "interpretation": f"Amount is far above {whose} typical ${deviation['amount_baseline']:.2f}",
+                "code": "AMOUNT_ABOVE_BASELINE",
+                "args": {"baseline": baseline, "amount_baseline": deviation["amount_baseline"]}
+            })
+        
+        if deviation["frequency_z"] > 2:
+            explanation["z_score_features"].append({
+                "feature": "AccountFrequencyZScore",
+                "value": round(deviation["frequency_z"], 2),
+                "threshold": 2.0,
+                "interpretation": f"Hourly activity is far above {whose} typical {deviation['frequency_baseline']:.1f} transactions",
+                "code": "FREQUENCY_ABOVE_BASELINE",
+                "args": {"baseline": baseline, "frequency_baseline": deviation["frequency_baseline"]}
+            })
+        
+        if deviation["is_night"] and deviation["night_ratio"] < 0.2:
+            explanation["unusual_patterns"].append({
+                "pattern": "Unusual night-time activity",
+                "detail": f"Only {deviation['night_ratio']:.0%} of {whose} recent activity is at night",
+                "code": "UNUSUAL_NIGHT",
+                "args": {"baseline": baseline, "night_ratio": deviation["night_ratio"]}
+            })
+        
+        if deviation["is_new_counterparty"] and deviation["novelty_rate"] < 0.2:
+            explanation["unusual_patterns"].append({
+                "pattern": "New counterparty",
+                "detail": f"{whose.capitalize()} usually reuse counterparties ({deviation['novelty_rate']:.0%} new)",
+                "code": "NEW_COUNTERPARTY",
+                "args": {"baseline": baseline, "novelty_rate": deviation["novelty_rate"]}
             })
         
         return explanation
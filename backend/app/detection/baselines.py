@@ -0,0 +1,175 @@
+"""
+Per-account behavioral baselines as exponentially weighted moving averages
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.config import (
+    BASELINE_EWMA_ALPHA, BASELINE_MIN_EVENTS, BASELINE_INITIAL_CAPACITY,
+    WINDOW_1_HOUR, WINDOW_30_DAYS, NIGHT_START_HOUR, NIGHT_END_HOUR
+)
+from app.models import Transaction
+
+
+class AccountBaselines:
+    """
+    EWMA mean/variance of each account's own behavior
+
+    Tracks log amount, hourly transaction count, night-time ratio and the
+    rate of new counterparties. State lives in parallel NumPy columns
+    indexed by a per-account row id, so each update is O(1) and costs a
+    few bytes per account; the columns double in size when full.
+    """
+
+    COLUMNS = (
+        "events",
+        "amount_mean", "amount_var",
+        "frequency_mean", "frequency_var",
+        "night_ratio", "novelty_rate"
+    )
+
+    def __init__(self, alpha: float = BASELINE_EWMA_ALPHA, capacity: int = BASELINE_INITIAL_CAPACITY):
+        self.alpha = alpha
+        self._rows: Dict[str, int] = {}
+        self._data = np.zeros((len(self.COLUMNS), capacity))
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @staticmethod
+    def observation(transaction_data: Dict[str, Any], features: Dict[str, float]) -> np.ndarray:
+        """(log amount, hourly count, is night, is new counterparty) for one event"""
+        return np.array([
+            np.log1p(abs(float(transaction_data["amount"]))),
+            float(features.get("HourlyTxnCount", 0)),
+            float(features.get("IsNightTime", 0)),
+            # CounterpartyVelocity includes the current transaction
+            1.0 if features.get("CounterpartyVelocity", 0) <= 1 else 0.0
+        ])
+
+    def _row(self, account_id: str) -> int:
+        row = self._rows.get(account_id)
+        if row is None:
+            row = len(self._rows)
+            if row == self._data.shape[1]:
+                self._data = np.concatenate([self._data, np.zeros_like(self._data)], axis=1)
+            self._rows[account_id] = row
+        return row
+
+    def deviation(self, account_id: str, observation: np.ndarray) -> Optional[Dict[str, float]]:
+        """
+        How one event compares with the account's baseline
+
+        Returns:
+            None while the account has fewer than BASELINE_MIN_EVENTS events
+        """
+        row = self._rows.get(account_id)
+        if row is None:
+            return None
+
+        events, amount_mean, amount_var, frequency_mean, frequency_var, night_ratio, novelty_rate = self._data[:, row]
+        if events < BASELINE_MIN_EVENTS:
+            return None
+
+        log_amount, hourly_count, is_night, is_new_counterparty = observation
+
+        # Floors keep near-constant histories from turning noise into huge z-scores
+        amount_std = max(np.sqrt(amount_var), 0.1)
+        frequency_std = max(np.sqrt(frequency_var), 1.0)
+
+        return {
+            "events": int(events),
+            "amount_z": float((log_amount - amount_mean) / amount_std),
+            "amount_baseline": float(np.expm1(amount_mean)),
+            "frequency_z": float((hourly_count - frequency_mean) / frequency_std),
+            "frequency_baseline": float(frequency_mean),
+            "is_night": bool(is_night),
+            "night_ratio": float(night_ratio),
+            "is_new_counterparty": bool(is_new_counterparty),
+            "novelty_rate": float(novelty_rate)
+        }
+
+    def update(self, account_id: str, observation: np.ndarray):
+        """Fold one event into the account's baseline"""
+        log_amount, hourly_count, is_night, is_new_counterparty = observation
+
+        with self._lock:
+            row = self._row(account_id)
+            column = self._data[:, row]
+
+            if column[0] == 0:
+                column[:] = (1, log_amount, 0, hourly_count, 0, is_night, is_new_counterparty)
+                return
+
+            alpha = self.alpha
+            column[0] += 1
+
+            # Incremental EWMA mean/variance (mean, var) pairs
+            for mean_index, value in ((1, log_amount), (3, hourly_count)):
+                diff = value - column[mean_index]
+                increment = alpha * diff
+                column[mean_index] += increment
+                column[mean_index + 1] = (1 - alpha) * (column[mean_index + 1] + diff * increment)
+
+            column[5] += alpha * (is_night - column[5])
+            column[6] += alpha * (is_new_counterparty - column[6])
+
+    def observe(self, transaction_data: Dict[str, Any], features: Dict[str, float]) -> Optional[Dict[str, float]]:
+        """Deviation from the baseline before this event, then update it"""
+        account_id = transaction_data["account_id"]
+        observation = self.observation(transaction_data, features)
+        deviation = self.deviation(account_id, observation)
+        self.update(account_id, observation)
+        return deviation
+
+    @classmethod
+    def from_history(cls, db: Session, days: int = WINDOW_30_DAYS // 86400) -> "AccountBaselines":
+        """
+        Build baselines by replaying recent transactions in time order
+
+        Hourly counts and counterparty novelty are reconstructed from the
+        same rows (novelty = first appearance within the replayed window),
+        so this needs one query rather than one per transaction. DEFERRED
+        transactions are skipped: they are observed when rescored.
+        """
+        baselines = cls()
+        since = datetime.now() - timedelta(days=days)
+
+        rows = db.query(
+            Transaction.account_id, Transaction.timestamp,
+            Transaction.amount, Transaction.counterparty_id
+        ).filter(
+            Transaction.timestamp >= since,
+            or_(Transaction.scoring_status.is_(None), Transaction.scoring_status != "DEFERRED")
+        ).order_by(
+            Transaction.account_id, Transaction.timestamp
+        ).all()
+
+        hour = timedelta(seconds=WINDOW_1_HOUR)
+        current_account = None
+        window_start = 0
+        seen_counterparties = set()
+
+        for i, (account_id, timestamp, amount, counterparty_id) in enumerate(rows):
+            if account_id != current_account:
+                current_account, window_start = account_id, i
+                seen_counterparties = set()
+
+            while rows[window_start][1] < timestamp - hour:
+                window_start += 1
+
+            is_night = timestamp.hour >= NIGHT_START_HOUR or timestamp.hour < NIGHT_END_HOUR
+            baselines.update(account_id, np.array([
+                np.log1p(abs(amount)),
+                float(i - window_start + 1),
+                1.0 if is_night else 0.0,
+                0.0 if counterparty_id in seen_counterparties else 1.0
+            ]))
+            seen_counterparties.add(counterparty_id)
+
+        return baselines
@@ -0,0 +1,165 @@
+"""
+Circuit breaker with a latency budget for optional scoring stages
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+
+class BudgetExceeded(Exception):
+    """A call did not finish within its latency budget"""
+
+
+class CircuitBreaker:
+    """
+    Trip a stage off when it is failing or too slow
+
+    call() runs the stage in the breaker's own threads and waits at most
+    the latency budget for it: a call that overruns raises BudgetExceeded,
+    so the caller degrades at once instead of waiting for the slow call
+    (which finishes in the background, its result discarded).
+
+    Each call is recorded as a failure if it raised/returned an error or
+    exceeded the budget. When the failure rate over the last `window`
+    calls reaches `failure_rate` the breaker opens and allow() returns
+    False, so callers skip the stage. After `cooldown` seconds it lets
+    calls through again (half-open): the first recorded success closes
+    it, a failure re-opens it.
+    """
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(
+        self,
+        name: str,
+        latency_budget: float,
+        window: int = 20,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        cooldown: float = 30.0,
+        workers: int = 1
+    ):
+        """
+        Args:
+            name: Stage name (for logs and health output)
+            latency_budget: Seconds a call may take before it is abandoned
+                and counted as failed
+            workers: Threads running calls; a call stuck in all of them
+                makes the next ones overrun too, so the breaker opens
+        """
+        self.name = name
+        self.latency_budget = latency_budget
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.trips = 0
+        self.timeouts = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name.lower()}-stage")
+        self._outcomes = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether the stage should run now"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            with self._lock:
+                if self.state == self.OPEN:
+                    self.state = self.HALF_OPEN
+                    print(f"⚠️ {self.name} circuit half-open, trying again")
+        return True
+
+    def call(
+        self,
+        function: Callable,
+        *args,
+        budget: Optional[float] = None,
+        is_error: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        Run one call within the latency budget and record it
+
+        Args:
+            budget: Latency budget for this call (default latency_budget)
+            is_error: Whether a returned result counts as a failure
+
+        Raises:
+            BudgetExceeded: If the call did not finish within the budget
+            Exception: Whatever the call raised (recorded as a failure)
+        """
+        budget = budget if budget is not None else self.latency_budget
+        start = time.perf_counter()
+        future = self._executor.submit(function, *args)
+
+        try:
+            result = future.result(timeout=budget)
+        except FutureTimeoutError:
+            # Not started yet (queued behind a slow call): never run it
+            future.cancel()
+            self.timeouts += 1
+            self.record(time.perf_counter() - start, error=True, budget=budget)
+            raise BudgetExceeded(f"{self.name} call exceeded {budget * 1000:.0f} ms")
+        except Exception:
+            self.record(time.perf_counter() - start, error=True, budget=budget)
+            raise
+
+        self.record(
+            time.perf_counter() - start,
+            error=bool(is_error and is_error(result)),
+            budget=budget
+        )
+        return result
+
+    def record(self, elapsed: float, error: bool = False, budget: Optional[float] = None) -> bool:
+        """
+        Record one call
+
+        Args:
+            budget: Latency budget for this call (default latency_budget),
+                e.g. scaled by batch size
+
+        Returns:
+            True if the call counted as a failure (error or over budget)
+        """
+        failed = error or elapsed > (budget if budget is not None else self.latency_budget)
+
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if failed:
+                    self._open()
+                else:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                    print(f"✅ {self.name} circuit closed")
+                return failed
+
+            self._outcomes.append(failed)
+            if (
+                self.state == self.CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate
+            ):
+                self._open()
+
+        return failed
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.trips += 1
+        self._outcomes.clear()
+        print(f"⚠️ {self.name} circuit open for {self.cooldown:.0f}s (slow or failing)")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "trips": self.trips,
+            "timeouts": self.timeouts,
+            "latency_budget_ms": round(self.latency_budget * 1000, 1)
+        }
@@ -0,0 +1,453 @@
+"""
+Pure-NumPy inference for trained tree ensembles (XGBoost, IsolationForest)
+"""
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+class CompiledTreeEnsemble:
+    """
+    XGBoost binary classifier flattened into NumPy arrays
+
+    Every tree is padded to the same number of nodes and all trees are
+    laid out back to back, so the ensemble is five flat arrays indexed by
+    global node id (tree * max_nodes + node). Children are interleaved so
+    that children[2 * node + go_right] is the next node, and leaves point
+    back at themselves so traversal runs a fixed number of steps. Prediction
+    walks all trees at once and mirrors XGBoost's float32 arithmetic so
+    results can be checked bit-for-bit against predict_proba.
+
+    The arrays can be saved as .npy files and loaded memory-mapped, which
+    makes loading near-instant and lets worker processes share one copy.
+    """
+
+    ARRAYS = ("features", "conditions", "default_right", "children", "roots")
+
+    def __init__(
+        self,
+        features: np.ndarray,
+        conditions: np.ndarray,
+        default_right: np.ndarray,
+        children: np.ndarray,
+        roots: np.ndarray,
+        base_margin: float,
+        max_depth: int
+    ):
+        self.features = features
+        self.conditions = conditions
+        self.default_right = default_right
+        self.children = children
+        self.roots = roots
+        self.base_margin = np.float32(base_margin)
+        self.max_depth = max_depth
+        self.n_trees = roots.shape[0]
+
+    @classmethod
+    def from_xgb_classifier(cls, model) -> "CompiledTreeEnsemble":
+        """Build the flat arrays from a fitted binary XGBClassifier"""
+
+        booster = model.get_booster()
+        learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+
+        objective = learner["objective"]["name"]
+        if objective != "binary:logistic":
+            raise ValueError(f"Unsupported objective: {objective}")
+
+        trees = learner["gradient_booster"]["model"]["trees"]
+        if any(any(tree["split_type"]) for tree in trees):
+            raise ValueError("Categorical splits are not supported")
+
+        n_trees = len(trees)
+        max_nodes = max(len(tree["left_children"]) for tree in trees)
+
+        # Padding nodes are leaves (children == -1) that are never reached
+        split_indices = np.zeros((n_trees, max_nodes), dtype=np.int32)
+        split_conditions = np.zeros((n_trees, max_nodes), dtype=np.float32)
+        left_children = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+        right_children = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+        default_left = np.zeros((n_trees, max_nodes), dtype=bool)
+
+        for t, tree in enumerate(trees):
+            n_nodes = len(tree["left_children"])
+            split_indices[t, :n_nodes] = tree["split_indices"]
+            # For leaves, split_conditions holds the leaf value
+            split_conditions[t, :n_nodes] = np.array(tree["split_conditions"], dtype=np.float32)
+            left_children[t, :n_nodes] = tree["left_children"]
+            right_children[t, :n_nodes] = tree["right_children"]
+            default_left[t, :n_nodes] = np.array(tree["default_left"], dtype=bool)
+
+        # Logistic objective: base_score is a probability, margin is its logit
+        base_score = np.float32(float(learner["learner_model_param"]["base_score"]))
+        base_margin = -np.log(np.float32(1) / base_score - np.float32(1))
+
+        global_ids = np.arange(n_trees * max_nodes, dtype=np.int32).reshape(n_trees, max_nodes)
+        offsets = global_ids[:, :1]
+        is_leaf = left_children == -1
+
+        return cls(
+            features=split_indices.ravel(),
+            conditions=split_conditions.ravel(),
+            default_right=~default_left.ravel(),
+            children=np.stack([
+                np.where(is_leaf, global_ids, left_children + offsets),
+                np.where(is_leaf, global_ids, right_children + offsets)
+            ], axis=-1).ravel(),
+            roots=offsets.ravel(),
+            base_margin=base_margin,
+            max_depth=cls._tree_depth(left_children, right_children)
+        )
+
+    @staticmethod
+    def _tree_depth(left_children: np.ndarray, right_children: np.ndarray) -> int:
+        """Deepest root-to-leaf path across all trees"""
+
+        depth = 0
+        frontier = [(t, 0) for t in range(left_children.shape[0])]
+        while frontier:
+            next_frontier = []
+            for t, node in frontier:
+                if left_children[t, node] != -1:
+                    next_frontier.append((t, left_children[t, node]))
+                    next_frontier.append((t, right_children[t, node]))
+            if next_frontier:
+                depth += 1
+            frontier = next_frontier
+        return depth
+
+    # Name of the version subdirectory readers should load
+    CURRENT_FILE = "CURRENT"
+
+    def save(self, directory: Path, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Write the arrays as .npy files plus a meta.json
+
+        Each save goes to a new version subdirectory; the CURRENT pointer
+        file is then replaced atomically, so readers see either the old or
+        the new artifact, never a partial or missing one. The replaced
+        version is kept (a reader may be about to open it), older ones are
+        removed.
+        """
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        previous = self._current_version(directory)
+
+        version = f"v{time.time_ns()}-{os.getpid()}"
+        tmp_directory = directory / f"{version}.tmp"
+        tmp_directory.mkdir()
+
+        for name in self.ARRAYS:
+            np.save(tmp_directory / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+
+        meta = {
+            "base_margin": float(self.base_margin),
+            "max_depth": self.max_depth,
+            **(metadata or {})
+        }
+        (tmp_directory / "meta.json").write_text(json.dumps(meta, indent=2))
+        os.replace(tmp_directory, directory / version)
+
+        tmp_pointer = directory / f"{self.CURRENT_FILE}.tmp{os.getpid()}"
+        tmp_pointer.write_text(version)
+        os.replace(tmp_pointer, directory / self.CURRENT_FILE)
+
+        for entry in directory.iterdir():
+            if entry.name in (version, previous, self.CURRENT_FILE):
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry, ignore_errors=True)
+            elif entry.suffix in (".npy", ".json"):
+                # Flat layout written before versioned saves
+                entry.unlink(missing_ok=True)
+
+    @classmethod
+    def _current_version(cls, directory: Path) -> Optional[str]:
+        try:
+            return (directory / cls.CURRENT_FILE).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def exists(cls, directory: Path) -> bool:
+        """Whether a saved ensemble can be loaded from the directory"""
+        directory = Path(directory)
+        return cls._current_version(directory) is not None or (directory / "meta.json").exists()
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> Tuple["CompiledTreeEnsemble", Dict[str, Any]]:
+        """
+        Load the current saved ensemble, memory-mapped read-only by default
+
+        Returns:
+            (ensemble, metadata)
+        """
+
+        directory = Path(directory)
+        while True:
+            version = cls._current_version(directory)
+            path = directory / version if version is not None else directory
+            try:
+                meta = json.loads((path / "meta.json").read_text())
+                arrays = {
+                    name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None)
+                    for name in cls.ARRAYS
+                }
+                break
+            except FileNotFoundError:
+                # Removed by later saves while loading: follow the new pointer
+                if cls._current_version(directory) == version:
+                    raise
+
+        ensemble = cls(**arrays, base_margin=meta["base_margin"], max_depth=meta["max_depth"])
+        return ensemble, meta
+
+    def predict_margin(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """Raw (log-odds) scores for a 2D feature matrix"""
+
+        X = np.asarray(feature_matrix, dtype=np.float32)
+        n_rows, n_features = X.shape
+
+        nodes = np.tile(self.roots, n_rows)
+        row_offsets = np.repeat(np.arange(n_rows, dtype=np.int64) * n_features, self.n_trees)
+        values_flat = X.ravel()
+        has_missing = bool(np.isnan(values_flat).any())
+
+        for _ in range(self.max_depth):
+            values = values_flat.take(row_offsets + self.features.take(nodes))
+            nodes = self._step(nodes, values, has_missing)
+
+        # Accumulate trees in order, in float32, as XGBoost does
+        leaf_values = self.conditions.take(nodes).reshape(n_rows, self.n_trees)
+        margin = np.full(n_rows, self.base_margin, dtype=np.float32)
+        for t in range(self.n_trees):
+            margin += leaf_values[:, t]
+        return margin
+
+    def _step(self, nodes: np.ndarray, values: np.ndarray, has_missing: bool) -> np.ndarray:
+        """Advance every node one level (leaves loop back to themselves)"""
+
+        go_right = values >= self.conditions.take(nodes)
+        if has_missing:
+            go_right = np.where(np.isnan(values), self.default_right.take(nodes), go_right)
+        return self.children.take(2 * nodes + go_right)
+
+    def predict_proba(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """Probability of the positive class for each row"""
+
+        return self._sigmoid(self.predict_margin(feature_matrix))
+
+    def predict_one(self, feature_vector: List[float]) -> float:
+        """
+        Probability of the positive class for a single row
+
+        Walks all trees in lockstep on 1D arrays, which avoids building a
+        DMatrix and is much cheaper than predict_proba on a one-row array.
+        """
+
+        x = np.asarray(feature_vector, dtype=np.float32)
+        nodes = self.roots
+        has_missing = bool(np.isnan(x).any())
+
+        for _ in range(self.max_depth):
+            nodes = self._step(nodes, x.take(self.features.take(nodes)), has_missing)
+
+        leaf_values = self.conditions.take(nodes)
+        margin = np.cumsum(
+            np.concatenate(([self.base_margin], leaf_values)), dtype=np.float32
+        )[-1]
+        return float(self._sigmoid(margin))
+
+    @staticmethod
+    def _sigmoid(margin):
+        """
+        XGBoost's float32 sigmoid: 1 / (expf(min(-x, 88.7)) + 1 + 1e-16)
+
+        exp is evaluated in float64 and rounded, which matches a correctly
+        rounded expf far more often than NumPy's float32 exp does.
+        """
+        one = np.float32(1)
+        exponent = np.minimum(-np.asarray(margin, dtype=np.float32), np.float32(88.7))
+        denom = np.exp(exponent.astype(np.float64)).astype(np.float32) + one + np.float32(1e-16)
+        return one / denom
+
+    def probe_matrix(self, n_rows: int = 512, n_features: Optional[int] = None, seed: int = 42) -> np.ndarray:
+        """
+        Synthetic rows that exercise every split boundary
+
+        Each value is drawn from the ensemble's own thresholds for that
+        feature, nudged one float32 step either way, plus some missing
+        values to cover default directions.
+        """
+
+        rng = np.random.default_rng(seed)
+        internal = self.children[0::2] != np.arange(self.features.shape[0])
+        n_features = n_features or int(self.features[internal].max()) + 1
+
+        X = np.zeros((n_rows, n_features), dtype=np.float32)
+        for feature in range(n_features):
+            thresholds = self.conditions[internal & (self.features == feature)]
+            if thresholds.size == 0:
+                continue
+            picks = rng.choice(thresholds, size=n_rows)
+            nudge = rng.integers(-1, 2, size=n_rows)
+            X[:, feature] = np.where(
+                nudge < 0, np.nextafter(picks, np.float32(-np.inf)),
+                np.where(nudge > 0, np.nextafter(picks, np.float32(np.inf)), picks)
+            )
+
+        X[rng.random(X.shape) < 0.02] = np.nan
+        return X
+
+    def verify(self, model, feature_matrix: np.ndarray) -> Tuple[float, float]:
+        """
+        Compare against model.predict_proba on the given rows
+
+        Returns:
+            (max absolute difference, fraction of rows that match bit-for-bit)
+        """
+
+        expected = model.predict_proba(feature_matrix)[:, 1].astype(np.float32)
+        batch = self.predict_proba(feature_matrix)
+        single = np.array([self.predict_one(row) for row in feature_matrix[:32]], dtype=np.float32)
+
+        max_diff = max(
+            np.max(np.abs(batch - expected)),
+            np.max(np.abs(single - expected[:32]))
+        )
+        exact_fraction = np.mean(np.concatenate([batch == expected, single == expected[:32]]))
+
+        return float(max_diff), float(exact_fraction)
+
+
+def average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """
+    Expected path length of an unsuccessful BST search, c(n)
+
+    Same definition as scikit-learn's IsolationForest uses to normalise
+    path lengths.
+    """
+
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n_samples)
+    lengths[n_samples == 2] = 1.0
+    mask = n_samples > 2
+    n = n_samples[mask]
+    lengths[mask] = 2.0 * (np.log(n - 1.0) + np.euler_gamma) - 2.0 * (n - 1.0) / n
+    return lengths
+
+
+class CompiledIsolationForest:
+    """
+    scikit-learn IsolationForest flattened into NumPy arrays
+
+    Each leaf stores its depth plus c(n_node_samples), so a row's score is
+    just the mean leaf value across trees. Used for single rows, where
+    score_samples() has ~2 ms of fixed overhead.
+    """
+
+    def __init__(
+        self,
+        split_features: np.ndarray,
+        thresholds: np.ndarray,
+        children: np.ndarray,
+        leaf_values: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        max_samples: int
+    ):
+        self.split_features = split_features
+        self.thresholds = thresholds
+        self.children = children
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_trees = roots.shape[0]
+        self.denominator = self.n_trees * float(average_path_length([max_samples])[0])
+
+    @classmethod
+    def from_sklearn(cls, forest) -> "CompiledIsolationForest":
+        """Build the flat arrays from a fitted IsolationForest"""
+
+        split_features, thresholds, children, leaf_values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for tree, tree_features in zip(forest.estimators_, forest.estimators_features_):
+            t = tree.tree_
+            n_nodes = t.node_count
+            global_ids = np.arange(offset, offset + n_nodes)
+            is_leaf = t.children_left == -1
+
+            # Depth of every node (parents always precede children)
+            depths = np.zeros(n_nodes, dtype=np.int64)
+            for node in range(n_nodes):
+                if not is_leaf[node]:
+                    depths[t.children_left[node]] = depths[node] + 1
+                    depths[t.children_right[node]] = depths[node] + 1
+            max_depth = max(max_depth, int(depths.max()))
+
+            # Tree features index into this estimator's feature subset
+            split_features.append(np.where(is_leaf, 0, np.asarray(tree_features)[np.maximum(t.feature, 0)]))
+            thresholds.append(t.threshold)
+            children.append(np.stack([
+                np.where(is_leaf, global_ids, t.children_left + offset),
+                np.where(is_leaf, global_ids, t.children_right + offset)
+            ], axis=-1).ravel())
+            leaf_values.append(depths + average_path_length(t.n_node_samples))
+            roots.append(offset)
+            offset += n_nodes
+
+        return cls(
+            split_features=np.concatenate(split_features).astype(np.int64),
+            thresholds=np.concatenate(thresholds),
+            children=np.concatenate(children).astype(np.int64),
+            leaf_values=np.concatenate(leaf_values),
+            roots=np.array(roots, dtype=np.int64),
+            max_depth=max_depth,
+            max_samples=forest.max_samples_
+        )
+
+    def score_one(self, feature_vector: List[float]) -> float:
+        """Same value as forest.score_samples([feature_vector])[0]"""
+
+        # scikit-learn compares float32 inputs against float64 thresholds
+        x = np.asarray(feature_vector, dtype=np.float32).astype(np.float64)
+        nodes = self.roots
+
+        for _ in range(self.max_depth):
+            go_right = x.take(self.split_features.take(nodes)) > self.thresholds.take(nodes)
+            nodes = self.children.take(2 * nodes + go_right)
+
+        mean_depth = self.leaf_values.take(nodes).sum()
+        return float(-(2.0 ** (-mean_depth / self.denominator)))
+
+    def probe_matrix(self, n_features: int, n_rows: int = 64, seed: int = 42) -> np.ndarray:
+        """Synthetic rows drawn from the forest's own split thresholds"""
+
+        rng = np.random.default_rng(seed)
+        internal = self.children[0::2] != np.arange(self.split_features.shape[0])
+
+        X = np.zeros((n_rows, n_features))
+        for feature in range(n_features):
+            thresholds = self.thresholds[internal & (self.split_features == feature)]
+            if thresholds.size:
+                X[:, feature] = rng.choice(thresholds, size=n_rows) + rng.normal(scale=1e-3, size=n_rows)
+        return X
+
+    def verify(self, forest, feature_matrix: np.ndarray) -> Tuple[float, float]:
+        """
+        Compare against forest.score_samples on the given rows
+
+        Returns:
+            (max absolute difference, fraction of rows that match bit-for-bit)
+        """
+
+        rows = np.asarray(feature_matrix)[:64]
+        expected = forest.score_samples(rows)
+        compiled = np.array([self.score_one(row) for row in rows])
+        return float(np.max(np.abs(compiled - expected))), float(np.mean(compiled == expected))
@@ -1,154 +1,519 @@
 """
 ML model loading and inference with SHAP explainability
+
+SHAP values come from XGBoost's native TreeSHAP (pred_contribs), so no
+separate explainer object is needed.
 """
 import os
 import pickle
+import threading
+import time
 import numpy as np
-from typing import Dict, Any, List, Tuple
-from app.config import MODEL_PATH, EXPLAINER_PATH
+# Imported here, before any scoring or explanation thread exists: importing
+# xgboost (directly or by unpickling a model) from several threads at once
+# can see the package partially initialized
+import xgboost as xgb
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from app.config import (
+    SHAP_APPROX_CONTRIBS,
+    USE_COMPILED_MODEL, COMPILED_MODEL_MAX_BATCH_ROWS
+)
+from app.detection.compiled_trees import CompiledTreeEnsemble
+from app.detection import model_registry
+from app.metrics import stage_timer, ERRORS
 
-class MLModel:
-    """ML model for AML risk prediction"""
+FEATURE_NAMES = [
+    "HourlyTxnCount", "DailyTxnCount", "WeeklyTxnCount",
+    "HourlyCreditSum", "DailyCreditSum", "HourlyDebitSum", "DailyDebitSum",
+    "UniqueCounterparties7d", "UniqueCounterparties30d",
+    "InflowOutflowRatio", "AvgTxnAmount7d", "StdTxnAmount7d",
+    "TxnAmountZScore", "TxnAmountToIncomeRatio",
+    "HourOfDay", "DayOfWeek", "IsWeekend", "IsNightTime",
+    "TimeSinceLastTxn", "TxnFrequencyAnomaly",
+    "IsInternational", "CountryRiskScore", "UniqueCountries7d",
+    "CounterpartyVelocity", "SharedCounterparties"
+]
+
+class ModelVersion:
+    """
+    One trained model artifact: the XGBoost pickle plus its compiled arrays
     
-    def __init__(self):
-        self.model = None
-        self.explainer = None
-        self.feature_names = [
-            "HourlyTxnCount", "DailyTxnCount", "WeeklyTxnCount",
-            "HourlyCreditSum", "DailyCreditSum", "HourlyDebitSum", "DailyDebitSum",
-            "UniqueCounterparties7d", "UniqueCounterparties30d",
-            "InflowOutflowRatio", "AvgTxnAmount7d", "StdTxnAmount7d",
-            "TxnAmountZScore", "TxnAmountToIncomeRatio",
-            "HourOfDay", "DayOfWeek", "IsWeekend", "IsNightTime",
-            "TimeSinceLastTxn", "TxnFrequencyAnomaly",
-            "IsInternational", "CountryRiskScore", "UniqueCountries7d",
-            "CounterpartyVelocity", "SharedCounterparties"
-        ]
+    load() memory-maps the compiled arrays, which is all that scoring
+    needs; the XGBoost model itself is only unpickled when explanations or
+    large batches need it.
+    """
+    
+    def __init__(self, version: str, model_path: Path, compiled_dir: Path):
+        self.version = version
+        self.model_path = Path(model_path)
+        self.compiled_dir = Path(compiled_dir)
+        self._model = None
+        self.compiled_model = None
         self.is_loaded = False
-        self.load_model()
+        self.is_warm = False
+        self.load_seconds = None
+        self._lock = threading.RLock()
     
-    def load_model(self):
-        """Load trained model and explainer"""
-        try:
-            if os.path.exists(MODEL_PATH):
-                with open(MODEL_PATH, 'rb') as f:
-                    self.model = pickle.load(f)
-                print(f"✅ ML model loaded from {MODEL_PATH}")
+    @classmethod
+    def from_registry(cls, version: str) -> "ModelVersion":
+        model_path, compiled_dir = model_registry.version_paths(version)
+        return cls(version, model_path, compiled_dir)
+    
+    @property
+    def model(self):
+        """The XGBoost model, unpickled on first access"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    with open(self.model_path, 'rb') as f:
+                        self._model = pickle.load(f)
+                    print(f"✅ ML model {self.version} loaded from {self.model_path}")
+        return self._model
+    
+    def load(self) -> bool:
+        """
+        Load the model for scoring
+        
+        Uses the memory-mapped compiled arrays if they were built from the
+        current model pickle; otherwise unpickles the model, compiles and
+        verifies it, and saves the arrays for the next process.
+        
+        Returns:
+            Whether the model is available
+        """
+        with self._lock:
+            start = time.perf_counter()
+            source = "XGBoost"
+            try:
+                if not self.model_path.exists():
+                    print(f"⚠️ ML model not found at {self.model_path}. Will skip ML scoring until model is trained.")
+                    self.is_loaded = False
+                    return False
+                
+                if USE_COMPILED_MODEL:
+                    self.compiled_model = self._load_compiled_model()
+                    if self.compiled_model is not None:
+                        source = f"memory-mapped {self.compiled_dir.name}"
+                    else:
+                        self.compiled_model = self._compile_model()
+                        if self.compiled_model is not None:
+                            source = "compiled"
+                            self._save_compiled_model()
+                else:
+                    self.model
+                
                 self.is_loaded = True
-            else:
-                print(f"⚠️ ML model not found at {MODEL_PATH}. Will skip ML scoring until model is trained.")
+            
+            except Exception as e:
+                print(f"⚠️ Error loading model {self.version}: {e}")
                 self.is_loaded = False
             
-            # Load SHAP explainer if available
-            if os.path.exists(EXPLAINER_PATH):
-                with open(EXPLAINER_PATH, 'rb') as f:
-                    self.explainer = pickle.load(f)
-                print(f"✅ SHAP explainer loaded from {EXPLAINER_PATH}")
+            finally:
+                self.load_seconds = time.perf_counter() - start
+            
+            if self.is_loaded:
+                print(f"✅ ML model {self.version} ready in {self.load_seconds * 1000:.1f} ms ({source})")
+            return self.is_loaded
+    
+    def warm_up(self):
+        """
+        Touch every code path once so the first real request pays no
+        one-off costs (page faults, XGBoost unpickle for explanations)
+        """
+        try:
+            probe = np.zeros((1, len(FEATURE_NAMES)))
+            self.predict_proba(probe)
+            self.predict_proba(np.zeros((COMPILED_MODEL_MAX_BATCH_ROWS + 1, len(FEATURE_NAMES))))
+            self.feature_contributions(probe)
+        finally:
+            # Not retried: later failures count against the circuit breakers
+            self.is_warm = True
+    
+    def _signature(self) -> Dict[str, int]:
+        """Identifies the pickle the compiled arrays were built from"""
+        stat = os.stat(self.model_path)
+        return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+    
+    def _load_compiled_model(self) -> Optional[CompiledTreeEnsemble]:
+        """Memory-map the saved compiled arrays, or None if missing or stale"""
+        try:
+            if not CompiledTreeEnsemble.exists(self.compiled_dir):
+                return None
+            
+            compiled, meta = CompiledTreeEnsemble.load(self.compiled_dir, mmap=True)
+            if any(meta.get(key) != value for key, value in self._signature().items()):
+                print(f"⚠️ {self.compiled_dir} is stale, recompiling")
+                return None
+            return compiled
+        
+        except Exception as e:
+            print(f"⚠️ Could not load compiled model: {e}")
+            return None
+    
+    def _save_compiled_model(self):
+        """Persist the compiled arrays next to the model for fast loading"""
+        try:
+            self.compiled_model.save(self.compiled_dir, metadata=self._signature())
+        except Exception as e:
+            print(f"⚠️ Could not save compiled model: {e}")
+    
+    def _compile_model(self) -> Optional[CompiledTreeEnsemble]:
+        """
+        Flatten the XGBoost model into NumPy arrays and verify it
+        
+        Returns the compiled ensemble, or None (serve from XGBoost) if it
+        cannot be built or any probe row differs from predict_proba.
+        """
+        
+        try:
+            compiled = CompiledTreeEnsemble.from_xgb_classifier(self.model)
+            probe = compiled.probe_matrix(n_features=len(FEATURE_NAMES))
+            max_diff, exact_fraction = compiled.verify(self.model, probe)
         
         except Exception as e:
-            print(f"⚠️ Error loading model: {e}")
-            self.is_loaded = False
+            print(f"⚠️ Could not compile ML model, using XGBoost: {e}")
+            return None
+        
+        # Served only if it reproduces predict_proba bit for bit
+        if max_diff != 0:
+            print(
+                f"⚠️ Compiled model is not bit-exact with XGBoost ({exact_fraction:.1%} exact, "
+                f"max diff {max_diff:.2e}), using XGBoost"
+            )
+            return None
+        
+        print(f"✅ Compiled ML model {self.version}: {compiled.n_trees} trees, depth {compiled.max_depth}, bit-exact")
+        return compiled
+    
+    def predict_one(self, feature_vector: List[float]) -> float:
+        """Positive-class probability for a single row"""
+        if self.compiled_model is not None:
+            return self.compiled_model.predict_one(feature_vector)
+        return float(self.model.predict_proba(np.array([feature_vector]))[0][1])
+    
+    def predict_proba(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """Positive-class probabilities from the compiled model or XGBoost"""
+        if self.compiled_model is not None and len(feature_matrix) <= COMPILED_MODEL_MAX_BATCH_ROWS:
+            return self.compiled_model.predict_proba(feature_matrix)
+        return self.model.predict_proba(feature_matrix)[:, 1]
+    
+    def feature_contributions(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """
+        Per-feature SHAP values (log-odds) from the booster
+        
+        Returns:
+            (n_rows, n_features) array; the bias column is dropped
+        """
+        
+        booster = self.model.get_booster()
+        dmatrix = xgb.DMatrix(feature_matrix, feature_names=booster.feature_names)
+        contributions = booster.predict(
+            dmatrix,
+            pred_contribs=True,
+            approx_contribs=SHAP_APPROX_CONTRIBS
+        )
+        return contributions[:, :-1]
+
+class MLModel:
+    """
+    ML model for AML risk prediction
+    
+    Serves the active ModelVersion from the model registry. Nothing is
+    loaded at construction time: warm_up() (at startup) or the first
+    prediction loads the active version. activate() loads and warms
+    another version in the calling thread and then swaps it in with a
+    single reference assignment, so in-flight scoring keeps using the
+    version it started with.
+    """
+    
+    def __init__(self):
+        self.feature_names = FEATURE_NAMES
+        self._active: Optional[ModelVersion] = None
+        self._load_attempted = False
+        self._load_lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        self._activate_lock = threading.Lock()
+        self.loading_version: Optional[str] = None
+    
+    @property
+    def is_loaded(self) -> bool:
+        active = self._active
+        return active is not None and active.is_loaded
+    
+    @property
+    def load_seconds(self) -> Optional[float]:
+        active = self._active
+        return active.load_seconds if active is not None else None
+    
+    @property
+    def version(self) -> Optional[str]:
+        active = self._active
+        return active.version if active is not None else None
+    
+    @property
+    def model(self):
+        """The active XGBoost model (unpickled on first access)"""
+        active = self._active
+        return active.model if active is not None else None
+    
+    @property
+    def is_warm(self) -> bool:
+        """Whether calls no longer pay one-off load costs (also True with no model to load)"""
+        active = self._active
+        return self._load_attempted and (active is None or not active.is_loaded or active.is_warm)
+    
+    @property
+    def is_warming(self) -> bool:
+        """Whether another thread is loading or warming the model now"""
+        return self._warm_lock.locked()
+    
+    def warm_up(self) -> bool:
+        """
+        Load the active version and run every code path once (including
+        the XGBoost unpickle), so the first scored calls are not slowed
+        by one-off costs
+        
+        Returns:
+            Whether the model is available
+        """
+        with self._warm_lock:
+            if self.ensure_loaded() and not self._active.is_warm:
+                try:
+                    self._active.warm_up()
+                except Exception as e:
+                    print(f"⚠️ Error warming up model {self._active.version}: {e}")
+        return self.is_loaded
+    
+    def ensure_loaded(self) -> bool:
+        """Load the active version on first use; returns whether it is available"""
+        if not self._load_attempted:
+            self.load_model()
+        return self.is_loaded
+    
+    def load_model(self):
+        """Load the registry's active version"""
+        with self._load_lock:
+            if self._load_attempted:
+                return
+            
+            version = model_registry.get_active_version()
+            if version is None:
+                print("⚠️ No ML model found. Will skip ML scoring until model is trained.")
+            else:
+                model_version = ModelVersion.from_registry(version)
+                model_version.load()
+                self._active = model_version
+            self._load_attempted = True
+    
+    def activate(self, version: str) -> ModelVersion:
+        """
+        Load, warm and atomically swap in a registry version
+        
+        Blocking; run it in a background thread. Also persists the version
+        as the registry's ACTIVE pointer.
+        
+        Raises:
+            ValueError: If the version is unknown or fails to load
+            RuntimeError: If another activation is in progress
+        """
+        if not model_registry.version_exists(version):
+            raise ValueError(f"Unknown model version: {version}")
+        
+        if not self._activate_lock.acquire(blocking=False):
+            raise RuntimeError(f"Model version {self.loading_version} is already being activated")
+        
+        try:
+            self.loading_version = version
+            model_version = ModelVersion.from_registry(version)
+            if not model_version.load():
+                raise ValueError(f"Model version {version} failed to load")
+            model_version.warm_up()
+            
+            model_registry.set_active_version(version)
+            self._active = model_version
+            self._load_attempted = True
+            print(f"✅ Activated ML model version {version}")
+            return model_version
+        
+        finally:
+            self.loading_version = None
+            self._activate_lock.release()
     
     def predict_risk(
         self,
-        feature_vector: List[float]
+        feature_vector: List[float],
+        explain: bool = True
     ) -> Tuple[float, Dict[str, Any]]:
         """
         Predict risk score using ML model
         
         Args:
             feature_vector: Ordered feature vector
+            explain: Compute SHAP contributions. Pass False on the scoring
+                hot path and call explain_batch() for alert-bound rows only.
         
         Returns:
-            (ml_score, ml_explanation)
+            (ml_score, ml_explanation); ml_explanation["model_version"] is
+            the version that produced the score
         """
         
-        if not self.is_loaded or self.model is None:
+        if not self.ensure_loaded():
             # Return neutral score if model not loaded
-            return 50.0, {"error": "Model not loaded", "top_features": []}
+            return 50.0, {"error": "Model not loaded", "top_features": [], "model_version": None}
         
+        active = self._active
         try:
-            # Predict probability
-            feature_array = np.array([feature_vector])
-            probability = self.model.predict_proba(feature_array)[0][1]  # Probability of class 1 (suspicious)
+            # Predict probability of class 1 (suspicious)
+            probability = active.predict_one(feature_vector)
             ml_score = probability * 100
             
-            # Get feature importances
-            ml_explanation = self._explain_prediction(feature_vector, probability)
+            if not explain:
+                return ml_score, {
+                    "prediction": round(float(probability), 3),
+                    "top_features": [],
+                    "model_version": active.version
+                }
+            
+            # Get feature contributions
+            ml_explanation = self.explain_batch(np.array([feature_vector]), [ml_score])[0]
+            ml_explanation["model_version"] = active.version
             
             return ml_score, ml_explanation
         
         except Exception as e:
+            ERRORS.inc("ml")
             print(f"⚠️ Error in ML prediction: {e}")
-            return 50.0, {"error": str(e), "top_features": []}
+            return 50.0, {"error": str(e), "top_features": [], "model_version": None}
     
-    def _explain_prediction(
+    def predict_risk_batch(
         self,
-        feature_vector: List[float],
-        probability: float
-    ) -> Dict[str, Any]:
+        feature_matrix: np.ndarray
+    ) -> Tuple[np.ndarray, Optional[str]]:
         """
-        Generate explanation for ML prediction
+        Predict risk scores for a micro-batch in a single model call
         
-        Uses SHAP if available, otherwise falls back to feature importance
+        Args:
+            feature_matrix: 2D array, one ordered feature vector per row
+        
+        Returns:
+            (array of ml_scores (0-100) one per row, model version used)
         """
         
-        explanation = {
-            "prediction": round(probability, 3),
-            "top_features": []
-        }
+        feature_matrix = np.asarray(feature_matrix, dtype=float)
+        n_rows = feature_matrix.shape[0]
+        
+        if n_rows == 0 or not self.ensure_loaded():
+            return np.full(n_rows, 50.0), None
         
+        active = self._active
         try:
-            # Try SHAP explanation
-            if self.explainer is not None:
-                shap_values = self.explainer.shap_values(np.array([feature_vector]))
-                
-                # Get SHAP values for positive class
-                if isinstance(shap_values, list):
-                    shap_vals = shap_values[1][0]  # For binary classification
-                else:
-                    shap_vals = shap_values[0]
-                
-                # Get top contributing features
-                feature_contributions = [
-                    {
-                        "feature": self.feature_names[i],
-                        "value": round(feature_vector[i], 2),
-                        "importance": round(abs(shap_vals[i]), 3),
-                        "direction": "increases" if shap_vals[i] > 0 else "decreases"
-                    }
-                    for i in range(len(self.feature_names))
-                ]
-                
-                # Sort by absolute importance
-                feature_contributions.sort(key=lambda x: x["importance"], reverse=True)
-                explanation["top_features"] = feature_contributions[:10]
-            
-            # Fallback to feature importance from model
-            elif hasattr(self.model, 'feature_importances_'):
-                importances = self.model.feature_importances_
-                
-                feature_contributions = [
-                    {
-                        "feature": self.feature_names[i],
-                        "value": round(feature_vector[i], 2),
-                        "importance": round(importances[i], 3)
-                    }
-                    for i in range(len(self.feature_names))
-                ]
-                
-                feature_contributions.sort(key=lambda x: x["importance"], reverse=True)
-                explanation["top_features"] = feature_contributions[:10]
-            
+            probabilities = active.predict_proba(feature_matrix)
+            return probabilities.astype(float) * 100, active.version
+        
+        except Exception as e:
+            ERRORS.inc("ml")
+            print(f"⚠️ Error in batch ML prediction: {e}")
+            return np.full(n_rows, 50.0), None
+    
+    def explain_batch(
+        self,
+        feature_matrix: np.ndarray,
+        ml_scores: np.ndarray,
+        use_shap: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate explanations for a batch of rows with one TreeSHAP call
+        
+        Callers should only pass the rows that will become alerts.
+        Contributions come from the booster's pred_contribs output; set
+        SHAP_APPROX_CONTRIBS to use the faster Saabas approximation.
+        
+        Args:
+            use_shap: False skips TreeSHAP and ranks by global importances
+        
+        Returns:
+            List of ml_explanation dicts, one per row. "approximate" is
+            True when global importances were used instead of SHAP.
+        """
+        
+        feature_matrix = np.asarray(feature_matrix, dtype=float)
+        probabilities = np.asarray(ml_scores, dtype=float) / 100
+        
+        if feature_matrix.shape[0] == 0:
+            return []
+        
+        if not self.ensure_loaded():
+            return [{"error": "Model not loaded", "top_features": []} for _ in range(feature_matrix.shape[0])]
+        
+        active = self._active
+        approximate = not use_shap
+        try:
+            if approximate:
+                top_features = [self._fallback_importance(active, list(row)) for row in feature_matrix]
             else:
-                # Fallback: simple heuristic based on feature values
-                explanation["top_features"] = self._heuristic_importance(feature_vector)
+                with stage_timer("shap"):
+                    contributions = active.feature_contributions(feature_matrix)
+                top_features = [
+                    self._rank_contributions(row, contribution_row)
+                    for row, contribution_row in zip(feature_matrix, contributions)
+                ]
         
         except Exception as e:
+            ERRORS.inc("shap")
             print(f"⚠️ Error in explanation: {e}")
-            explanation["top_features"] = self._heuristic_importance(feature_vector)
+            approximate = True
+            top_features = [self._fallback_importance(active, list(row)) for row in feature_matrix]
+        
+        return [
+            {
+                "prediction": round(float(probability), 3),
+                "top_features": row_top_features,
+                "approximate": approximate
+            }
+            for probability, row_top_features in zip(probabilities, top_features)
+        ]
+    
+    def _fallback_importance(self, active: ModelVersion, feature_vector: List[float]) -> List[Dict[str, Any]]:
+        """Global feature importances, or a heuristic, when contributions fail"""
+        
+        try:
+            importances = active.model.feature_importances_
+        except Exception:
+            return self._heuristic_importance(feature_vector)
+        
+        feature_contributions = [
+            {
+                "feature": self.feature_names[i],
+                "value": round(float(feature_vector[i]), 2),
+                "importance": round(float(importances[i]), 3)
+            }
+            for i in range(len(self.feature_names))
+        ]
+        
+        feature_contributions.sort(key=lambda x: x["importance"], reverse=True)
+        return feature_contributions[:10]
+    
+    def _rank_contributions(
+        self,
+        feature_vector: List[float],
+        shap_vals: List[float]
+    ) -> List[Dict[str, Any]]:
+        """Turn one row of SHAP values into the top contributing features"""
+        
+        feature_contributions = [
+            {
+                "feature": self.feature_names[i],
+                "value": round(float(feature_vector[i]), 2),
+                "importance": round(abs(float(shap_vals[i])), 3),
+                "direction": "increases" if shap_vals[i] > 0 else "decreases"
+            }
+            for i in range(len(self.feature_names))
+        ]
         
-        return explanation
+        # Sort by absolute importance
+        feature_contributions.sort(key=lambda x: x["importance"], reverse=True)
+        return feature_contributions[:10]
     
     def _heuristic_importance(self, feature_vector: List[float]) -> List[Dict[str, Any]]:
         """Simple heuristic for feature importance when SHAP is not available"""
@@ -0,0 +1,80 @@
+"""
+Versioned model registry on disk
+
+Layout:
+    ml/models/registry/<version>/aml_model.pkl
+    ml/models/registry/<version>/aml_model_compiled/   (built on first load)
+    ml/models/registry/ACTIVE                          (name of the active version)
+
+When the registry is empty, the legacy ml/models/aml_model.pkl is served
+as version "baseline".
+"""
+import os
+import re
+from pathlib import Path
+from typing import List, Optional, Tuple
+from app.config import MODEL_PATH, COMPILED_MODEL_DIR, MODEL_REGISTRY_DIR
+
+BASELINE_VERSION = "baseline"
+ACTIVE_FILE = MODEL_REGISTRY_DIR / "ACTIVE"
+VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+def version_paths(version: str) -> Tuple[Path, Path]:
+    """
+    (model pickle, compiled arrays directory) for a version
+
+    Raises:
+        ValueError: If the version name is not a plain directory name
+    """
+    if version == BASELINE_VERSION:
+        return MODEL_PATH, COMPILED_MODEL_DIR
+
+    if not VERSION_PATTERN.match(version):
+        raise ValueError(f"Invalid model version: {version!r}")
+
+    version_dir = MODEL_REGISTRY_DIR / version
+    return version_dir / "aml_model.pkl", version_dir / "aml_model_compiled"
+
+def list_versions() -> List[str]:
+    """All versions with a model artifact, oldest first (by name)"""
+    versions = []
+    if MODEL_REGISTRY_DIR.is_dir():
+        versions = sorted(
+            entry.name for entry in MODEL_REGISTRY_DIR.iterdir()
+            if entry.is_dir() and VERSION_PATTERN.match(entry.name)
+            and (entry / "aml_model.pkl").exists()
+        )
+
+    if os.path.exists(MODEL_PATH):
+        versions.insert(0, BASELINE_VERSION)
+    return versions
+
+def version_exists(version: str) -> bool:
+    try:
+        model_path, _ = version_paths(version)
+    except ValueError:
+        return False
+    return model_path.exists()
+
+def get_active_version() -> Optional[str]:
+    """
+    The version to serve: the ACTIVE pointer if it is valid, otherwise
+    the baseline model, otherwise the newest registry version
+    """
+    if ACTIVE_FILE.exists():
+        version = ACTIVE_FILE.read_text().strip()
+        if version_exists(version):
+            return version
+
+    if version_exists(BASELINE_VERSION):
+        return BASELINE_VERSION
+
+    versions = list_versions()
+    return versions[-1] if versions else None
+
+def set_active_version(version: str):
+    """Persist the active version pointer (atomically) for future restarts"""
+    MODEL_REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = ACTIVE_FILE.with_name(f"ACTIVE.tmp{os.getpid()}")
+    tmp_path.write_text(version)
+    os.replace(tmp_path, ACTIVE_FILE)
@@ -0,0 +1,191 @@
+"""
+Peer-group baselines for accounts with little or no history
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import (
+    PEER_INCOME_BANDS, PEER_GROUP_MIN_TXNS, WINDOW_30_DAYS,
+    NIGHT_START_HOUR, NIGHT_END_HOUR
+)
+from app.models import Transaction, Account
+
+GLOBAL_GROUP = ("*", "*", "*", -1)
+
+
+class PeerGroupBaselines:
+    """
+    Transaction statistics per (account_type, risk_rating, country, income band)
+
+    refresh() recomputes every group from the last 30 days with one joined
+    query and pandas group-bys, then swaps the result in as one reference.
+    Lookups are dictionary hits: an account maps to its group row, and
+    groups with fewer than PEER_GROUP_MIN_TXNS transactions (or unknown
+    accounts) use the all-accounts row.
+    """
+
+    STATS = (
+        "txns", "amount_mean", "amount_std", "log_amount_mean", "log_amount_std",
+        "hourly_count_mean", "hourly_count_std", "night_ratio", "novelty_rate",
+        "median_gap_minutes"
+    )
+
+    def __init__(self):
+        # (group key -> row, stats matrix, account_id -> row)
+        self._state: Tuple[Dict[tuple, int], np.ndarray, Dict[str, int]] = ({}, np.empty((0, len(self.STATS))), {})
+        self.refreshed_at: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._state[0])
+
+    @staticmethod
+    def income_band(monthly_income) -> int:
+        return int(np.searchsorted(PEER_INCOME_BANDS, monthly_income or 0, side="right"))
+
+    @classmethod
+    def group_key(cls, account) -> tuple:
+        return (account.account_type, account.risk_rating, account.country, cls.income_band(account.monthly_income))
+
+    def _row_stats(self, row: Optional[int]) -> Optional[Dict[str, float]]:
+        stats = self._state[1]
+        if row is None or row >= len(stats):
+            return None
+        return dict(zip(self.STATS, stats[row].tolist()))
+
+    def for_account(self, account) -> Optional[Dict[str, float]]:
+        """Peer statistics for an Account row (remembered for for_account_id)"""
+        groups, _, account_groups = self._state
+        if not groups:
+            return None
+
+        row = groups.get(self.group_key(account), groups[GLOBAL_GROUP])
+        account_groups[account.account_id] = row
+        return self._row_stats(row)
+
+    def for_account_id(self, account_id: str) -> Optional[Dict[str, float]]:
+        """Peer statistics for an account id, or the all-accounts baseline"""
+        groups, _, account_groups = self._state
+        if not groups:
+            return None
+        return self._row_stats(account_groups.get(account_id, groups[GLOBAL_GROUP]))
+
+    @staticmethod
+    def deviation(stats: Dict[str, float], observation: np.ndarray) -> Dict[str, float]:
+        """
+        Deviation of one event from peer statistics
+
+        Same keys as AccountBaselines.deviation, for the same observation.
+        """
+        log_amount, hourly_count, is_night, is_new_counterparty = observation
+
+        return {
+            "baseline": "peer",
+            "events": int(stats["txns"]),
+            "amount_z": float((log_amount - stats["log_amount_mean"]) / max(stats["log_amount_std"], 0.1)),
+            "amount_baseline": float(stats["amount_mean"]),
+            "frequency_z": float((hourly_count - stats["hourly_count_mean"]) / max(stats["hourly_count_std"], 1.0)),
+            "frequency_baseline": float(stats["hourly_count_mean"]),
+            "is_night": bool(is_night),
+            "night_ratio": float(stats["night_ratio"]),
+            "is_new_counterparty": bool(is_new_counterparty),
+            "novelty_rate": float(stats["novelty_rate"])
+        }
+
+    def clear(self):
+        """Drop all groups (until the next refresh)"""
+        self._state = ({}, np.empty((0, len(self.STATS))), {})
+        self.refreshed_at = None
+
+    def refresh(self, db: Session, days: int = WINDOW_30_DAYS // 86400) -> int:
+        """
+        Recompute all peer groups from recent transactions
+
+        Returns:
+            Number of groups with their own statistics
+        """
+        import pandas as pd  # Deferred: only the periodic refresh needs it
+
+        since = datetime.now() - timedelta(days=days)
+        rows = db.query(
+            Transaction.account_id, Transaction.timestamp, Transaction.amount, Transaction.counterparty_id,
+            Account.account_type, Account.risk_rating, Account.country, Account.monthly_income
+        ).outerjoin(Account, Account.account_id == Transaction.account_id).filter(
+            Transaction.timestamp >= since
+        ).all()
+
+        columns = [
+            "account_id", "timestamp", "amount", "counterparty_id",
+            "account_type", "risk_rating", "country", "monthly_income"
+        ]
+        df = pd.DataFrame(rows, columns=columns).sort_values(["account_id", "timestamp"], kind="stable")
+        if df.empty:
+            return 0
+
+        # Per-transaction signals, vectorized
+        df["log_amount"] = np.log1p(df["amount"].abs())
+        hours = df["timestamp"].dt.hour
+        df["is_night"] = ((hours >= NIGHT_START_HOUR) | (hours < NIGHT_END_HOUR)).astype(float)
+        df["is_new"] = (~df.duplicated(["account_id", "counterparty_id"])).astype(float)
+        df["gap_minutes"] = df.groupby("account_id")["timestamp"].diff().dt.total_seconds() / 60
+        df["hourly_count"] = (
+            df.set_index("timestamp").groupby("account_id")["amount"]
+            .rolling("1h").count().to_numpy()
+        )
+
+        df["income_band"] = np.searchsorted(PEER_INCOME_BANDS, df["monthly_income"].fillna(0), side="right")
+        known = df["account_type"].notna()
+        key_columns = ["account_type", "risk_rating", "country", "income_band"]
+
+        aggregations = dict(
+            txns=("amount", "size"),
+            amount_mean=("amount", "mean"),
+            amount_std=("amount", "std"),
+            log_amount_mean=("log_amount", "mean"),
+            log_amount_std=("log_amount", "std"),
+            hourly_count_mean=("hourly_count", "mean"),
+            hourly_count_std=("hourly_count", "std"),
+            night_ratio=("is_night", "mean"),
+            novelty_rate=("is_new", "mean"),
+            median_gap_minutes=("gap_minutes", "median")
+        )
+        grouped = df[known].groupby(key_columns, dropna=False).agg(**aggregations)
+        grouped = grouped[grouped["txns"] >= PEER_GROUP_MIN_TXNS]
+        overall = df.assign(_all=0).groupby("_all").agg(**aggregations)
+
+        stats = np.vstack([overall[list(self.STATS)].to_numpy(), grouped[list(self.STATS)].to_numpy()])
+        stats = np.nan_to_num(stats.astype(float), nan=0.0)
+        groups = {GLOBAL_GROUP: 0}
+        groups.update({
+            (account_type, risk_rating, country, int(band)): row
+            for row, (account_type, risk_rating, country, band) in enumerate(grouped.index, start=1)
+        })
+
+        # Map every known account (with or without recent activity) to its group
+        accounts = pd.DataFrame(
+            db.query(
+                Account.account_id, Account.account_type, Account.risk_rating,
+                Account.country, Account.monthly_income
+            ).all(),
+            columns=["account_id", "account_type", "risk_rating", "country", "monthly_income"]
+        )
+        account_groups = {}
+        if not accounts.empty:
+            accounts["income_band"] = np.searchsorted(
+                PEER_INCOME_BANDS, accounts["monthly_income"].fillna(0), side="right"
+            )
+            account_groups = {
+                account_id: groups.get((account_type, risk_rating, country, int(band)), 0)
+                for account_id, account_type, risk_rating, country, band in accounts[
+                    ["account_id"] + key_columns
+                ].itertuples(index=False)
+            }
+
+        self._state = (groups, stats, account_groups)
+        self.refreshed_at = datetime.now()
+        return len(groups) - 1
+
+
+# Shared by feature computation and anomaly scoring
+peer_baselines = PeerGroupBaselines()
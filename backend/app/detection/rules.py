@@ -1,12 +1,82 @@
 """
 Rules-based detection engine
 """
-from typing import Dict, List, Any, Tuple
+import json
+from typing import Dict, List, Any, NamedTuple, Optional, Tuple
 from app.config import (
     STRUCTURING_JUST_BELOW_MIN, STRUCTURING_JUST_BELOW_MAX,
     STRUCTURING_THRESHOLD, HIGH_VALUE_THRESHOLD
 )
 
+class RuleDefinition(NamedTuple):
+    severity: str
+    contribution: int
+    # English description template; its fields are transaction fields
+    # (amount, country_code) and feature names
+    description: str
+
+RULES = {
+    "STRUCTURING_SUSPECTED": RuleDefinition(
+        "HIGH", 30,
+        "Multiple transactions (${amount:.2f}) just below $10K threshold. Daily total: ${DailyCreditSum:.2f}"
+    ),
+    "MULE_ACCOUNT_SUSPECTED": RuleDefinition(
+        "CRITICAL", 40,
+        "Extremely rapid funds movement: Large debit (${amount:.2f}) within 2 hours of credit. Typical of mule activity."
+    ),
+    "HIGH_RISK_CORRIDOR": RuleDefinition(
+        "HIGH", 30,
+        "Transaction to high-risk country ({country_code}, risk={CountryRiskScore}) for ${amount:.2f}"
+    ),
+    "HIGH_VELOCITY_CRITICAL": RuleDefinition(
+        "CRITICAL", 40,
+        "Extreme transaction frequency: {HourlyTxnCount} transactions in 1 hour"
+    ),
+    "HIGH_VELOCITY": RuleDefinition(
+        "HIGH", 30,
+        "High frequency activity with significant amounts: {HourlyTxnCount} txns/hr"
+    ),
+    "ROUND_AMOUNT": RuleDefinition(
+        "LOW", 10,
+        "Suspiciously round amount: ${amount:.2f}"
+    ),
+    "INCOME_ANOMALY": RuleDefinition(
+        "MEDIUM", 20,
+        "Transaction amount (${amount:.2f}) is {TxnAmountToIncomeRatio:.1%} of monthly income"
+    ),
+    "HIGH_VALUE_THRESHOLD_BREACH": RuleDefinition(
+        "CRITICAL", 40,
+        "Transaction amount (${amount:.2f}) exceeds the standard $10,000 reporting threshold."
+    ),
+}
+
+# Default-locale rule descriptions (see app.explainability.templates)
+RULE_DESCRIPTIONS = {rule_name: rule.description for rule_name, rule in RULES.items()}
+
+def triggered(rule_name: str) -> Dict[str, Any]:
+    """Result of a rule that fired; the description is rendered when the alert is read"""
+    rule = RULES[rule_name]
+    return {"rule_name": rule_name, "severity": rule.severity, "contribution": rule.contribution}
+
+def dump_triggered_rules(triggered_rules: List[Dict[str, Any]]) -> str:
+    """Alert.triggered_rules value: [rule_name, severity, contribution] per rule"""
+    return json.dumps(
+        [[rule["rule_name"], rule["severity"], rule["contribution"]] for rule in triggered_rules],
+        separators=(",", ":")
+    )
+
+def load_triggered_rules(value: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Parse Alert.triggered_rules
+
+    Alerts stored before the compact form hold full rule dicts (with
+    their rendered description); both read back as dicts.
+    """
+    return [
+        rule if isinstance(rule, dict) else {"rule_name": rule[0], "severity": rule[1], "contribution": rule[2]}
+        for rule in json.loads(value or "[]")
+    ]
+
 class RuleEngine:
     """Detect suspicious patterns using rule-based logic"""
     
@@ -76,12 +146,7 @@ class RuleEngine:
         high_daily_total = daily_credit_sum >= STRUCTURING_THRESHOLD * 1.5
         
         if is_just_below and multiple_txns and high_daily_total:
-            return {
-                "rule_name": "STRUCTURING_SUSPECTED",
-                "severity": "HIGH",
-                "description": f"Multiple transactions (${amount:.2f}) just below $10K threshold. Daily total: ${daily_credit_sum:.2f}",
-                "contribution": 30
-            }
+            return triggered("STRUCTURING_SUSPECTED")
         
         return None
     
@@ -104,12 +169,7 @@ class RuleEngine:
         # Debit shortly after credit
         if txn_type == "debit" and time_since_last < 120:  # 2 hours
             if hourly_credit > 5000 and amount > hourly_credit * 0.8:
-                return {
-                    "rule_name": "MULE_ACCOUNT_SUSPECTED",
-                    "severity": "CRITICAL",
-                    "description": f"Extremely rapid funds movement: Large debit (${amount:.2f}) within 2 hours of credit. Typical of mule activity.",
-                    "contribution": 40
-                }
+                return triggered("MULE_ACCOUNT_SUSPECTED")
         
         return None
     
@@ -128,13 +188,7 @@ class RuleEngine:
         amount = transaction_data["amount"]
         
         if is_international and country_risk >= 8 and amount > 2500:
-            country_code = transaction_data.get("country_code", "UNKNOWN")
-            return {
-                "rule_name": "HIGH_RISK_CORRIDOR",
-                "severity": "HIGH",
-                "description": f"Transaction to high-risk country ({country_code}, risk={country_risk}) for ${amount:.2f}",
-                "contribution": 30
-            }
+            return triggered("HIGH_RISK_CORRIDOR")
         
         return None
     
@@ -153,19 +207,9 @@ class RuleEngine:
         
         # Only flag if frequency is very high or combined with moderate amounts
         if hourly_count > 100:
-            return {
-                "rule_name": "HIGH_VELOCITY_CRITICAL",
-                "severity": "CRITICAL",
-                "description": f"Extreme transaction frequency: {hourly_count} transactions in 1 hour",
-                "contribution": 40
-            }
+            return triggered("HIGH_VELOCITY_CRITICAL")
         elif hourly_count > 50 and amount > 500:
-            return {
-                "rule_name": "HIGH_VELOCITY",
-                "severity": "HIGH",
-                "description": f"High frequency activity with significant amounts: {hourly_count} txns/hr",
-                "contribution": 30
-            }
+            return triggered("HIGH_VELOCITY")
         
         return None
     
@@ -182,12 +226,7 @@ class RuleEngine:
         amount = transaction_data["amount"]
         
         if amount >= 5000 and amount % 1000 == 0:
-            return {
-                "rule_name": "ROUND_AMOUNT",
-                "severity": "LOW",
-                "description": f"Suspiciously round amount: ${amount:.2f}",
-                "contribution": 10
-            }
+            return triggered("ROUND_AMOUNT")
         
         return None
     
@@ -205,12 +244,7 @@ class RuleEngine:
         amount = transaction_data["amount"]
         
         if income_ratio > 0.5 and amount > 1000:
-            return {
-                "rule_name": "INCOME_ANOMALY",
-                "severity": "MEDIUM",
-                "description": f"Transaction amount (${amount:.2f}) is {income_ratio*100:.1f}% of monthly income",
-                "contribution": 20
-            }
+            return triggered("INCOME_ANOMALY")
         
         return None
 
@@ -225,10 +259,5 @@ class RuleEngine:
         """
         amount = transaction_data["amount"]
         if amount > 10000:
-            return {
-                "rule_name": "HIGH_VALUE_THRESHOLD_BREACH",
-                "severity": "CRITICAL",
-                "description": f"Transaction amount (${amount:.2f}) exceeds the standard $10,000 reporting threshold.",
-                "contribution": 40
-            }
+            return triggered("HIGH_VALUE_THRESHOLD_BREACH")
         return None
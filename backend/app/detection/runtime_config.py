@@ -0,0 +1,181 @@
+"""
+Hot-reloadable scoring weights and alert thresholds
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional
+
+from app.config import (
+    RULE_WEIGHT, ANOMALY_WEIGHT, ML_WEIGHT,
+    ALERT_THRESHOLD_LOW, ALERT_THRESHOLD_MEDIUM, ALERT_THRESHOLD_HIGH, ALERT_THRESHOLD_CRITICAL,
+    SCORING_CONFIG_PATH
+)
+
+TUNABLE_FIELDS = (
+    "rule_weight", "anomaly_weight", "ml_weight",
+    "threshold_low", "threshold_medium", "threshold_high", "threshold_critical"
+)
+
+
+class ScoringConfig(NamedTuple):
+    """One immutable version of the scoring configuration"""
+    version: int
+    rule_weight: float
+    anomaly_weight: float
+    ml_weight: float
+    threshold_low: float
+    threshold_medium: float
+    threshold_high: float
+    threshold_critical: float
+    source: str
+    updated_at: str
+
+    def validate(self):
+        """
+        Raises:
+            ValueError: If a weight is outside [0, 1], the weights sum to
+                zero, or the thresholds are not ascending within [0, 100]
+        """
+        weights = (self.rule_weight, self.anomaly_weight, self.ml_weight)
+        if any(not 0 <= weight <= 1 for weight in weights) or sum(weights) <= 0:
+            raise ValueError("Weights must be in [0, 1] and not all zero")
+
+        thresholds = (self.threshold_low, self.threshold_medium, self.threshold_high, self.threshold_critical)
+        if not 0 <= thresholds[0] <= thresholds[1] <= thresholds[2] <= thresholds[3] <= 100:
+            raise ValueError("Thresholds must satisfy 0 <= low <= medium <= high <= critical <= 100")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+class RuntimeConfigStore:
+    """
+    Versioned scoring configuration, swapped atomically
+
+    Readers take `store.current` once per scoring call and use that
+    snapshot throughout; it is a plain attribute read, so the hot path
+    takes no lock. Writers (the admin endpoint or a change to the watched
+    JSON file) build a new ScoringConfig with the next version number and
+    replace the reference.
+
+    The version is saved in the file with the values and loaded at
+    startup, so it keeps increasing across restarts and the
+    config_version stamped on an alert names the same weights and
+    thresholds for good.
+    """
+
+    def __init__(self, path=SCORING_CONFIG_PATH):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._file_mtime_ns: Optional[int] = None
+        self.current = ScoringConfig(
+            version=1,
+            rule_weight=RULE_WEIGHT,
+            anomaly_weight=ANOMALY_WEIGHT,
+            ml_weight=ML_WEIGHT,
+            threshold_low=ALERT_THRESHOLD_LOW,
+            threshold_medium=ALERT_THRESHOLD_MEDIUM,
+            threshold_high=ALERT_THRESHOLD_HIGH,
+            threshold_critical=ALERT_THRESHOLD_CRITICAL,
+            source="defaults",
+            updated_at=datetime.now().isoformat()
+        )
+        self.reload_if_changed()
+
+    def update(
+        self,
+        changes: Dict[str, float],
+        source: str = "api",
+        persist: bool = True,
+        version: Optional[int] = None
+    ) -> ScoringConfig:
+        """
+        Apply a partial update as a new version
+
+        Args:
+            changes: Any of TUNABLE_FIELDS
+            source: Recorded on the new version ("api", "file", ...)
+            persist: Also write the watched file so restarts keep it
+            version: Version to use if above the current one (e.g. read
+                from the file); by default the next one
+
+        Raises:
+            ValueError: On unknown fields or an invalid result
+        """
+        unknown = set(changes) - set(TUNABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown scoring config fields: {sorted(unknown)}")
+
+        with self._write_lock:
+            candidate = self.current._replace(
+                **{field: float(value) for field, value in changes.items()},
+                version=max(self.current.version + 1, version or 0),
+                source=source,
+                updated_at=datetime.now().isoformat()
+            )
+            candidate.validate()
+
+            if persist:
+                self._write_file(candidate)
+            self.current = candidate
+
+        print(f"✅ Scoring config v{candidate.version} active ({source}: {changes})")
+        return candidate
+
+    def _write_file(self, config: ScoringConfig):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({field: getattr(config, field) for field in ("version",) + TUNABLE_FIELDS}, f, indent=2)
+        os.replace(tmp_path, self.path)
+        # Our own write is not an external change
+        self._file_mtime_ns = os.stat(self.path).st_mtime_ns
+
+    def reload_if_changed(self) -> bool:
+        """
+        Apply the watched file if it changed since the last check
+
+        A file version above the current one is kept; otherwise (a hand
+        edit, or a file from before versions were saved) the change gets
+        the next version, which is written back to the file.
+
+        Returns:
+            True if a new version was activated
+        """
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+
+        if mtime_ns == self._file_mtime_ns:
+            return False
+        self._file_mtime_ns = mtime_ns
+
+        try:
+            with open(self.path) as f:
+                values = json.load(f)
+            version = int(values["version"]) if values.get("version") is not None else None
+            changes = {
+                field: value for field, value in values.items()
+                if field in TUNABLE_FIELDS and float(value) != getattr(self.current, field)
+            }
+            if not changes:
+                # Values we already run with, saved under a later version
+                # (e.g. by the previous process)
+                if version is not None and version > self.current.version:
+                    with self._write_lock:
+                        self.current = self.current._replace(version=version, source="file")
+                return False
+
+            saved_version = version is not None and version > self.current.version
+            self.update(changes, source="file", persist=not saved_version, version=version)
+            return True
+
+        except (ValueError, TypeError) as e:
+            print(f"⚠️ Ignoring invalid scoring config file {self.path}: {e}")
+            return False
+
+
+# Shared by scoring, shadow scoring and the admin API
+scoring_config = RuntimeConfigStore()
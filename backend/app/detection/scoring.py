@@ -1,11 +1,35 @@
 """
 Hybrid scoring engine combining rules, anomaly, and ML
 """
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
 from app.detection.rules import RuleEngine
 from app.detection.anomaly import AnomalyDetector
 from app.detection.ml_model import MLModel
-from app.config import RULE_WEIGHT, ANOMALY_WEIGHT, ML_WEIGHT
+from app.detection.peer_groups import peer_baselines
+from app.detection.circuit_breaker import CircuitBreaker, BudgetExceeded
+from app.metrics import stage_timer, DEGRADED
+from app.detection.runtime_config import ScoringConfig, scoring_config
+from app.config import (
+    ANOMALY_METHOD, EXPLANATION_WORKERS,
+    ML_LATENCY_BUDGET_MS, ML_LATENCY_BUDGET_PER_ROW_MS,
+    SHAP_LATENCY_BUDGET_MS, SHAP_LATENCY_BUDGET_PER_ROW_MS,
+    BREAKER_WINDOW, BREAKER_FAILURE_RATE, BREAKER_MIN_CALLS, BREAKER_COOLDOWN
+)
+
+DEGRADED_ML_EXPLANATION = {"error": "ML stage degraded", "top_features": []}
+
+
+def _breaker(name: str, budget_ms: float, workers: int = 1) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        latency_budget=budget_ms / 1000,
+        window=BREAKER_WINDOW,
+        failure_rate=BREAKER_FAILURE_RATE,
+        min_calls=BREAKER_MIN_CALLS,
+        cooldown=BREAKER_COOLDOWN,
+        workers=workers
+    )
 
 class ScoringEngine:
     """Hybrid scoring engine"""
@@ -14,68 +38,340 @@ class ScoringEngine:
         self.rule_engine = RuleEngine()
         self.anomaly_detector = AnomalyDetector()
         self.ml_model = MLModel()
+        # ML/SHAP calls run under these: a call over its latency budget is
+        # abandoned (that result degrades), and slow or failing calls trip
+        # the breaker so scoring degrades to rules + anomaly until a
+        # half-open call succeeds. SHAP runs in every explanation thread.
+        self.ml_breaker = _breaker("ML", ML_LATENCY_BUDGET_MS)
+        self.shap_breaker = _breaker("SHAP", SHAP_LATENCY_BUDGET_MS, workers=EXPLANATION_WORKERS)
+    
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        Load model artifacts ahead of the first transaction
+        
+        Returns:
+            Load report (see load_report)
+        """
+        self.ml_model.warm_up()
+        self.anomaly_detector.ensure_loaded()
+        return self.load_report()
+    
+    def _ml_ready(self) -> bool:
+        """
+        Whether the ML stage can run within its latency budget now
+        
+        Loading and warming the model takes seconds and is not timed
+        against the budget: while the startup warm-up is doing it the
+        stage is skipped (degraded, not recorded by the breakers); if no
+        warm-up is under way the caller does it first.
+        """
+        if self.ml_model.is_warm:
+            return True
+        if self.ml_model.is_warming:
+            return False
+        self.ml_model.warm_up()
+        return True
+    
+    def load_report(self) -> Dict[str, Any]:
+        """Whether each model is loaded and how long loading took"""
+        
+        def load_ms(seconds):
+            return round(seconds * 1000, 1) if seconds is not None else None
+        
+        return {
+            "ml_model_loaded": self.ml_model.is_loaded,
+            "ml_model_load_ms": load_ms(self.ml_model.load_seconds),
+            "ml_model_version": self.ml_model.version,
+            "anomaly_model_fitted": self.anomaly_detector.is_fitted,
+            "anomaly_model_load_ms": load_ms(self.anomaly_detector.load_seconds),
+            "anomaly_method": ANOMALY_METHOD,
+            "streaming_anomaly_ready": self.anomaly_detector.streaming_detector.is_ready,
+            "streaming_anomaly_events": self.anomaly_detector.streaming_detector.events_seen,
+            "account_baselines": len(self.anomaly_detector.account_baselines),
+            "peer_groups": len(peer_baselines),
+            "scoring_config_version": scoring_config.current.version,
+            "ml_circuit": self.ml_breaker.snapshot(),
+            "shap_circuit": self.shap_breaker.snapshot()
+        }
+    
+    def _predict_ml(self, feature_vector: List[float]) -> Tuple[Optional[float], Dict[str, Any]]:
+        """
+        Single-row ML score under the ML circuit breaker
+        
+        Returns:
+            (ml_score, ml_explanation); ml_score is None when the stage was
+            skipped or failed, and the result is then degraded
+        """
+        if not self._ml_ready() or not self.ml_breaker.allow():
+            DEGRADED.inc("ml")
+            return None, dict(DEGRADED_ML_EXPLANATION)
+        
+        # A missing version means the loaded model raised (not "no model yet")
+        def is_error(result):
+            return result[1].get("model_version") is None and self.ml_model.is_loaded
+        
+        try:
+            with stage_timer("ml"):
+                ml_score, ml_explanation = self.ml_breaker.call(
+                    self.ml_model.predict_risk, feature_vector, False, is_error=is_error
+                )
+        except BudgetExceeded:
+            DEGRADED.inc("ml")
+            return None, dict(DEGRADED_ML_EXPLANATION)
+        
+        if is_error((ml_score, ml_explanation)):
+            DEGRADED.inc("ml")
+            return None, ml_explanation
+        return ml_score, ml_explanation
+    
+    def _predict_ml_batch(self, feature_matrix: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[str]]:
+        """
+        Batch ML scores under the ML circuit breaker
+        
+        The latency budget grows with the number of rows.
+        
+        Returns:
+            (ml_scores, model_version); ml_scores is None when degraded
+        """
+        if not self._ml_ready() or not self.ml_breaker.allow():
+            DEGRADED.inc("ml", amount=len(feature_matrix))
+            return None, None
+        
+        def is_error(result):
+            return result[1] is None and self.ml_model.is_loaded
+        
+        budget = (ML_LATENCY_BUDGET_MS + ML_LATENCY_BUDGET_PER_ROW_MS * len(feature_matrix)) / 1000
+        try:
+            with stage_timer("ml"):
+                ml_scores, model_version = self.ml_breaker.call(
+                    self.ml_model.predict_risk_batch, feature_matrix, budget=budget, is_error=is_error
+                )
+        except BudgetExceeded:
+            DEGRADED.inc("ml", amount=len(feature_matrix))
+            return None, None
+        
+        if is_error((ml_scores, model_version)):
+            DEGRADED.inc("ml", amount=len(feature_matrix))
+            return None, None
+        return ml_scores, model_version
+    
+    def explain_batch(self, feature_matrix: np.ndarray, ml_scores) -> List[Dict[str, Any]]:
+        """
+        ML explanations for alert-bound rows under the SHAP circuit breaker
+        
+        While the model is still warming up or the SHAP circuit is open,
+        or when the call overruns its latency budget, contributions fall back to the model's global
+        feature importances (marked "approximate").
+        """
+        if not self._ml_ready() or not self.shap_breaker.allow():
+            DEGRADED.inc("shap", amount=len(feature_matrix))
+            return self.ml_model.explain_batch(feature_matrix, ml_scores, use_shap=False)
+        
+        budget = (SHAP_LATENCY_BUDGET_MS + SHAP_LATENCY_BUDGET_PER_ROW_MS * len(feature_matrix)) / 1000
+        try:
+            return self.shap_breaker.call(
+                self.ml_model.explain_batch, feature_matrix, ml_scores,
+                budget=budget,
+                is_error=lambda ml_explanations: any(
+                    ml_explanation["approximate"] for ml_explanation in ml_explanations
+                )
+            )
+        except BudgetExceeded:
+            DEGRADED.inc("shap", amount=len(feature_matrix))
+            return self.ml_model.explain_batch(feature_matrix, ml_scores, use_shap=False)
     
     def compute_risk_score(
         self,
         transaction_data: Dict[str, Any],
         features: Dict[str, float],
-        feature_vector: List[float]
+        feature_vector: List[float],
+        explain: bool = True
     ) -> Dict[str, Any]:
         """
         Compute hybrid risk score
         
+        Args:
+            explain: Compute ML contributions for alert-bound transactions.
+                Pass False when explanations are generated later.
+        
         Returns:
             Complete scoring result with all components
         """
         
+        # One config snapshot for the whole transaction
+        config = scoring_config.current
+        
         # 1. Rules Engine
-        rule_score, triggered_rules = self.rule_engine.evaluate_all_rules(
-            transaction_data, features
-        )
+        with stage_timer("rules"):
+            rule_score, triggered_rules = self.rule_engine.evaluate_all_rules(
+                transaction_data, features
+            )
         
-        # 2. Anomaly Detection
-        anomaly_score = self.anomaly_detector.detect_anomaly(features, feature_vector)
-        anomaly_explanation = self.anomaly_detector.get_anomaly_explanation(features)
+        # 2. Anomaly Detection (relative to the account's baseline once it has one)
+        with stage_timer("anomaly"):
+            deviation = self.anomaly_detector.observe(transaction_data, features)
+            anomaly_score = self.anomaly_detector.detect_anomaly(features, feature_vector, deviation=deviation)
+            anomaly_explanation = self.anomaly_detector.get_anomaly_explanation(features, deviation)
         
-        # 3. ML Model
-        ml_score, ml_explanation = self.ml_model.predict_risk(feature_vector)
+        # 3. ML Model (contributions are only computed for alerts, below)
+        ml_score, ml_explanation = self._predict_ml(feature_vector)
         
-        # 4. Hybrid Score (weighted ensemble)
-        final_score = (
-            RULE_WEIGHT * rule_score +
-            ANOMALY_WEIGHT * anomaly_score +
-            ML_WEIGHT * ml_score
+        # 4-5. Hybrid score and alert level
+        result = self._build_result(
+            rule_score, triggered_rules,
+            anomaly_score, anomaly_explanation,
+            ml_score, ml_explanation,
+            ml_explanation.get("model_version"), config
         )
         
-        # 5. Determine alert level
-        alert_level = self._determine_alert_level(final_score)
+        # 6. Explain the ML score only if this becomes an alert
+        if explain and self.is_alert(result) and not result["degraded"]:
+            result["ml_explanation"] = self.explain_batch(
+                np.array([feature_vector], dtype=float), [ml_score]
+            )[0]
+        
+        return result
+    
+    def compute_risk_scores_batch(
+        self,
+        transactions_data: List[Dict[str, Any]],
+        features_list: List[Dict[str, float]],
+        feature_matrix: np.ndarray,
+        explain: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Compute hybrid risk scores for a micro-batch
+        
+        The ML model is called once for the whole matrix, and SHAP
+        contributions are computed in one call for alert-bound rows only.
+        
+        Returns:
+            One scoring result per transaction, in input order
+        """
+        
+        # One config snapshot for the whole batch
+        config = scoring_config.current
+        
+        # 1-2. Rules (per row) and anomaly detection (one IsolationForest call)
+        with stage_timer("rules"):
+            rule_results = [
+                self.rule_engine.evaluate_all_rules(transaction_data, features)
+                for transaction_data, features in zip(transactions_data, features_list)
+            ]
+        with stage_timer("anomaly"):
+            deviations = [
+                self.anomaly_detector.observe(transaction_data, features)
+                for transaction_data, features in zip(transactions_data, features_list)
+            ]
+            anomaly_scores = self.anomaly_detector.detect_anomaly_batch(
+                features_list, feature_matrix, deviations=deviations
+            )
+        
+        # 3. ML Model (single call for the whole batch)
+        ml_scores, model_version = self._predict_ml_batch(feature_matrix)
+        
+        results = []
+        for i, ((rule_score, triggered_rules), anomaly_score, features, deviation) in enumerate(zip(
+            rule_results, anomaly_scores, features_list, deviations
+        )):
+            if ml_scores is None:
+                ml_score, ml_explanation = None, dict(DEGRADED_ML_EXPLANATION)
+            else:
+                ml_score = float(ml_scores[i])
+                ml_explanation = {"prediction": round(ml_score / 100, 3), "top_features": []}
+            results.append(self._build_result(
+                rule_score, triggered_rules,
+                float(anomaly_score), self.anomaly_detector.get_anomaly_explanation(features, deviation),
+                ml_score, ml_explanation,
+                model_version, config
+            ))
+        
+        # 6. Explain only the rows that will become alerts
+        alert_rows = [
+            i for i, result in enumerate(results)
+            if explain and self.is_alert(result) and not result["degraded"]
+        ]
+        if alert_rows:
+            ml_explanations = self.explain_batch(
+                feature_matrix[alert_rows], ml_scores[alert_rows]
+            )
+            for i, ml_explanation in zip(alert_rows, ml_explanations):
+                results[i]["ml_explanation"] = ml_explanation
+        
+        return results
+    
+    def _build_result(
+        self,
+        rule_score: float,
+        triggered_rules: List[Dict[str, Any]],
+        anomaly_score: float,
+        anomaly_explanation: Dict[str, Any],
+        ml_score: Optional[float],
+        ml_explanation: Dict[str, Any],
+        model_version: Optional[str],
+        config: ScoringConfig
+    ) -> Dict[str, Any]:
+        """
+        Combine component scores into the hybrid scoring result
+        
+        With no ML score (degraded), rules and anomaly are re-weighted to
+        keep the 0-100 scale and the result is flagged "degraded".
+        """
+        
+        degraded = ml_score is None
+        
+        # Hybrid Score (weighted ensemble)
+        if degraded:
+            partial_weight = config.rule_weight + config.anomaly_weight
+            final_score = (
+                config.rule_weight * rule_score +
+                config.anomaly_weight * anomaly_score
+            ) / partial_weight if partial_weight > 0 else 0.0
+        else:
+            final_score = (
+                config.rule_weight * rule_score +
+                config.anomaly_weight * anomaly_score +
+                config.ml_weight * ml_score
+            )
+        
+        # Determine alert level
+        alert_level = self._determine_alert_level(final_score, config)
         
         return {
             "risk_score": round(final_score, 2),
             "alert_level": alert_level,
             "rule_score": round(rule_score, 2),
             "anomaly_score": round(anomaly_score, 2),
-            "ml_score": round(ml_score, 2),
+            "ml_score": round(ml_score, 2) if not degraded else None,
             "triggered_rules": triggered_rules,
             "anomaly_explanation": anomaly_explanation,
-            "ml_explanation": ml_explanation
+            "ml_explanation": ml_explanation,
+            "model_version": model_version,
+            "config_version": config.version,
+            "degraded": degraded
         }
     
-    def _determine_alert_level(self, risk_score: float) -> str:
+    def _determine_alert_level(self, risk_score: float, config: Optional[ScoringConfig] = None) -> str:
         """Determine alert level based on risk score"""
         
-        if risk_score >= 90:
+        config = config or scoring_config.current
+        
+        if risk_score >= config.threshold_critical:
             return "CRITICAL"
-        elif risk_score >= 80:
+        elif risk_score >= config.threshold_high:
             return "HIGH"
-        elif risk_score >= 60:
+        elif risk_score >= config.threshold_medium:
             return "MEDIUM"
-        elif risk_score >= 40:
+        elif risk_score >= config.threshold_low:
             return "LOW"
         else:
             return "NONE"
     
-    def should_generate_alert(self, risk_score: float) -> bool:
+    def should_generate_alert(self, risk_score: float, config: Optional[ScoringConfig] = None) -> bool:
         """Determine if alert should be generated"""
-        # Generate alert for scores >= 40 (LOW and above)
-        return risk_score >= 40
+        # Generate alert for LOW and above
+        return risk_score >= (config or scoring_config.current).threshold_low
+    
+    def is_alert(self, scoring_result: Dict[str, Any]) -> bool:
+        """Whether a scoring result becomes an alert, under the config it was scored with"""
+        return scoring_result["alert_level"] != "NONE"
@@ -0,0 +1,254 @@
+"""
+Shadow (challenger) model scoring off the ingest path
+
+A challenger ModelVersion scores the same feature vectors as the
+production model in a single background thread. Ingest only enqueues the
+feature matrix; score pairs are appended to a fixed-width binary log
+(one file per challenger version) that summary() aggregates.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+from app.config import SHADOW_LOG_DIR, SHADOW_BATCH_SIZE, SHADOW_QUEUE_SIZE
+from app.detection import model_registry
+from app.detection.ml_model import ModelVersion
+from app.detection.runtime_config import scoring_config
+from app.metrics import ERRORS
+
+# 24 bytes per scored transaction
+SCORE_PAIR_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("production_ml", "<f4"),
+    ("shadow_ml", "<f4"),
+    ("production_risk", "<f4"),
+    ("shadow_risk", "<f4")
+])
+
+class ShadowScorer:
+    """Score ingested transactions with a challenger model in the background"""
+
+    def __init__(self, scoring_engine):
+        """
+        Args:
+            scoring_engine: Production ScoringEngine; its alert thresholds
+                are applied to the challenger's hybrid scores
+        """
+        self.scoring_engine = scoring_engine
+        self.challenger: Optional[ModelVersion] = None
+        self.loading_version: Optional[str] = None
+        self.dropped = 0
+        self.queue: Optional[asyncio.Queue] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.task: Optional[asyncio.Task] = None
+        self._load_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker task on the running event loop"""
+        if self.queue is not None:
+            return
+
+        self.queue = asyncio.Queue(maxsize=SHADOW_QUEUE_SIZE)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self.task = asyncio.create_task(self._run())
+
+    @property
+    def version(self) -> Optional[str]:
+        challenger = self.challenger
+        return challenger.version if challenger is not None else None
+
+    def set_challenger(self, version: str) -> ModelVersion:
+        """
+        Load a registry version and start shadow-scoring with it
+
+        Blocking; run it in a background thread.
+
+        Raises:
+            ValueError: If the version is unknown or fails to load
+            RuntimeError: If another challenger is being loaded
+        """
+        if not model_registry.version_exists(version):
+            raise ValueError(f"Unknown model version: {version}")
+
+        if not self._load_lock.acquire(blocking=False):
+            raise RuntimeError(f"Challenger {self.loading_version} is already being loaded")
+
+        try:
+            self.loading_version = version
+            challenger = ModelVersion.from_registry(version)
+            if not challenger.load():
+                raise ValueError(f"Model version {version} failed to load")
+
+            self.challenger = challenger
+            print(f"✅ Shadow scoring with challenger model {version}")
+            return challenger
+
+        finally:
+            self.loading_version = None
+            self._load_lock.release()
+
+    def clear_challenger(self):
+        """Stop shadow scoring (the score log is kept)"""
+        self.challenger = None
+
+    def submit(self, feature_matrix: np.ndarray, scoring_results: List[Dict[str, Any]]):
+        """
+        Queue scored rows for the challenger
+
+        Never blocks: with no challenger this is a no-op, and when the
+        queue is full the rows are dropped and counted. Degraded rows (no
+        production ML score to compare against) are skipped.
+        """
+        if self.challenger is None:
+            return
+
+        scored = [index for index, result in enumerate(scoring_results) if result["ml_score"] is not None]
+        if not scored:
+            return
+
+        self.start()
+
+        chunk = (
+            np.asarray(feature_matrix, dtype=float)[scored],
+            np.array([scoring_results[index]["ml_score"] for index in scored], dtype=float),
+            np.array([scoring_results[index]["risk_score"] for index in scored], dtype=float)
+        )
+
+        try:
+            self.queue.put_nowait(chunk)
+        except asyncio.QueueFull:
+            self.dropped += len(scored)
+
+    async def _run(self):
+        """Drain the queue in batches and score them in the worker thread"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            chunks = [await self.queue.get()]
+            rows = len(chunks[0][0])
+            while rows < SHADOW_BATCH_SIZE and not self.queue.empty():
+                chunk = self.queue.get_nowait()
+                chunks.append(chunk)
+                rows += len(chunk[0])
+
+            try:
+                await loop.run_in_executor(self.executor, self.process_batch, chunks)
+
+            except Exception as e:
+                ERRORS.inc("shadow")
+                print(f"⚠️ Error in shadow scoring: {e}")
+
+            finally:
+                for _ in chunks:
+                    self.queue.task_done()
+
+    def process_batch(self, chunks: List[tuple]) -> int:
+        """
+        Score queued rows with the challenger and append the score pairs
+
+        Returns:
+            Number of pairs written
+        """
+        challenger = self.challenger
+        if challenger is None:
+            return 0
+
+        feature_matrix = np.vstack([chunk[0] for chunk in chunks])
+        production_ml = np.concatenate([chunk[1] for chunk in chunks])
+        production_risk = np.concatenate([chunk[2] for chunk in chunks])
+
+        shadow_ml = challenger.predict_proba(feature_matrix) * 100
+
+        # Rules and anomaly are shared, so only the ML term of the hybrid score changes
+        shadow_risk = production_risk + scoring_config.current.ml_weight * (shadow_ml - production_ml)
+
+        records = np.empty(len(feature_matrix), dtype=SCORE_PAIR_DTYPE)
+        records["timestamp"] = time.time()
+        records["production_ml"] = production_ml
+        records["shadow_ml"] = shadow_ml
+        records["production_risk"] = production_risk
+        records["shadow_risk"] = shadow_risk
+
+        SHADOW_LOG_DIR.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path(challenger.version), "ab") as f:
+            f.write(records.tobytes())
+
+        return len(records)
+
+    @staticmethod
+    def log_path(version: str):
+        model_registry.version_paths(version)  # Validates the name
+        return SHADOW_LOG_DIR / f"{version}.bin"
+
+    def read_log(self, version: str) -> np.ndarray:
+        """All complete score-pair records logged for a challenger version"""
+        path = self.log_path(version)
+        if not path.exists():
+            return np.empty(0, dtype=SCORE_PAIR_DTYPE)
+
+        count = os.path.getsize(path) // SCORE_PAIR_DTYPE.itemsize
+        return np.fromfile(path, dtype=SCORE_PAIR_DTYPE, count=count)
+
+    def summary(self, version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Compare challenger and production scores
+
+        Args:
+            version: Challenger version (default: the current challenger)
+
+        Returns:
+            Agreement and alert-rate deltas over all logged pairs
+        """
+        version = version or self.version
+        report = {
+            "challenger": version,
+            "production": self.scoring_engine.ml_model.version,
+            "active": version is not None and version == self.version,
+            "loading": self.loading_version,
+            "dropped": self.dropped,
+            "count": 0
+        }
+        if version is None:
+            return report
+
+        records = self.read_log(version)
+        if len(records) == 0:
+            return report
+
+        production_ml = records["production_ml"].astype(float)
+        shadow_ml = records["shadow_ml"].astype(float)
+        production_risk = records["production_risk"].astype(float)
+        shadow_risk = records["shadow_risk"].astype(float)
+
+        ml_diff = np.abs(shadow_ml - production_ml)
+        production_alerts = self.scoring_engine.should_generate_alert(production_risk)
+        shadow_alerts = self.scoring_engine.should_generate_alert(shadow_risk)
+        production_levels = [self.scoring_engine._determine_alert_level(score) for score in production_risk]
+        shadow_levels = [self.scoring_engine._determine_alert_level(score) for score in shadow_risk]
+
+        if len(records) > 1 and production_ml.std() > 0 and shadow_ml.std() > 0:
+            ml_correlation = round(float(np.corrcoef(production_ml, shadow_ml)[0, 1]), 4)
+        else:
+            ml_correlation = None
+
+        report.update({
+            "count": int(len(records)),
+            "first_scored_at": float(records["timestamp"].min()),
+            "last_scored_at": float(records["timestamp"].max()),
+            "ml_mean_abs_diff": round(float(ml_diff.mean()), 3),
+            "ml_max_abs_diff": round(float(ml_diff.max()), 3),
+            "ml_correlation": ml_correlation,
+            "ml_label_agreement": round(float(np.mean((production_ml >= 50) == (shadow_ml >= 50))), 4),
+            "alert_agreement": round(float(np.mean(production_alerts == shadow_alerts)), 4),
+            "alert_level_agreement": round(float(np.mean(np.array(production_levels) == np.array(shadow_levels))), 4),
+            "production_alert_rate": round(float(production_alerts.mean()), 4),
+            "shadow_alert_rate": round(float(shadow_alerts.mean()), 4),
+            "alert_rate_delta": round(float(shadow_alerts.mean() - production_alerts.mean()), 4),
+            "new_alerts": int(np.sum(shadow_alerts & ~production_alerts)),
+            "missed_alerts": int(np.sum(production_alerts & ~shadow_alerts))
+        })
+        return report
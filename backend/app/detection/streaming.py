@@ -0,0 +1,180 @@
+"""
+Streaming anomaly detection with Half-Space Trees (Tan, Ting & Liu, 2011)
+"""
+import threading
+from typing import Optional
+import numpy as np
+
+
+class HalfSpaceTrees:
+    """
+    Online anomaly detector over fixed-size feature vectors
+
+    Each tree is a complete binary tree of random axis-aligned splits,
+    stored as flat arrays (node i has children 2i+1 and 2i+2). Every node
+    counts how many events of the current window fell into it (latest
+    mass); at the end of each window the latest masses become the
+    reference masses used for scoring. Scoring and learning each walk
+    depth + 1 nodes in every tree, all trees at once, and memory is
+    fixed at 2 * n_trees * (2^(depth+1) - 1) counters.
+
+    Features are compressed with a signed log1p so that amounts and
+    counts share one scale. The split ranges are taken from the min/max
+    seen during the first window; scores are 0 until one full window has
+    been counted after that.
+    """
+
+    def __init__(
+        self,
+        n_features: int,
+        n_trees: int = 25,
+        depth: int = 10,
+        window_size: int = 250,
+        seed: int = 42
+    ):
+        self.n_features = n_features
+        self.n_trees = n_trees
+        self.depth = depth
+        self.window_size = window_size
+        # Below this reference mass a node is too sparse to refine the score
+        self.size_limit = 0.1 * window_size
+        self.n_nodes = 2 ** (depth + 1) - 1
+        self._rng = np.random.default_rng(seed)
+        self._tree_index = np.arange(n_trees)
+        self._node_offsets = self._tree_index * self.n_nodes
+        self._split_offsets = self._tree_index * (2 ** depth - 1)
+        # Doubling weight of each level, as in the paper's score r * 2^k
+        self._level_weights = 2.0 ** np.arange(depth + 1)
+
+        self.split_features: Optional[np.ndarray] = None  # (n_trees, n_internal)
+        self.split_values: Optional[np.ndarray] = None
+        self.reference_mass = np.zeros((n_trees, self.n_nodes), dtype=np.int32)
+        self.latest_mass = np.zeros((n_trees, self.n_nodes), dtype=np.int32)
+
+        self._low = np.full(n_features, np.inf)
+        self._high = np.full(n_features, -np.inf)
+        self.events_seen = 0
+        self._window_count = 0
+        self.windows_completed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether a reference window has been counted"""
+        return self.windows_completed > 0
+
+    @staticmethod
+    def _transform(feature_vector) -> np.ndarray:
+        x = np.asarray(feature_vector, dtype=float)
+        return np.sign(x) * np.log1p(np.abs(x))
+
+    def _build_trees(self):
+        """Random splits within a work range around each feature's observed span"""
+        low, high = self._low, self._high
+        n_internal = 2 ** self.depth - 1
+
+        self.split_features = np.empty((self.n_trees, n_internal), dtype=np.int32)
+        self.split_values = np.empty((self.n_trees, n_internal), dtype=float)
+
+        for t in range(self.n_trees):
+            # Work range: a random point s in [low, high] +/- the larger distance to either end
+            s = self._rng.uniform(low, high)
+            half_width = np.maximum(np.maximum(s - low, high - s), 1e-9)
+            node_low = np.empty((self.n_nodes, self.n_features))
+            node_high = np.empty((self.n_nodes, self.n_features))
+            node_low[0], node_high[0] = s - half_width, s + half_width
+
+            for node in range(n_internal):
+                feature = self._rng.integers(self.n_features)
+                midpoint = (node_low[node, feature] + node_high[node, feature]) / 2
+                self.split_features[t, node] = feature
+                self.split_values[t, node] = midpoint
+
+                left, right = 2 * node + 1, 2 * node + 2
+                node_low[left], node_high[left] = node_low[node], node_high[node]
+                node_low[right], node_high[right] = node_low[node], node_high[node]
+                node_high[left, feature] = midpoint
+                node_low[right, feature] = midpoint
+
+    def _paths(self, x: np.ndarray) -> np.ndarray:
+        """(depth + 1, n_trees) flat node ids (tree * n_nodes + node) visited in each tree"""
+        paths = np.empty((self.depth + 1, self.n_trees), dtype=np.int64)
+        node = np.zeros(self.n_trees, dtype=np.int64)
+        paths[0] = self._node_offsets
+        for level in range(1, self.depth + 1):
+            split = self._split_offsets + node
+            go_right = x.take(self.split_features.take(split)) > self.split_values.take(split)
+            node = 2 * node + 1 + go_right
+            paths[level] = self._node_offsets + node
+        return paths
+
+    def _score_paths(self, paths: np.ndarray) -> float:
+        """
+        Anomaly score in [0, 1] for precomputed paths
+
+        Each tree's mass score is r * 2^k for the first node on the path
+        whose reference mass r is at most size_limit (or the leaf), k
+        being its depth. Events in regions as dense as the window average
+        score window_size or more; isolated events stop early with little
+        mass. The result is the mean shortfall below window_size.
+        """
+        masses = self.reference_mass.take(paths)
+        sparse = masses <= self.size_limit
+        sparse[-1] = True
+        terminal = sparse.argmax(axis=0)
+        tree_scores = masses[terminal, self._tree_index] * self._level_weights[terminal]
+
+        return float(np.mean(1.0 - np.minimum(tree_scores / self.window_size, 1.0)))
+
+    def score_one(self, feature_vector) -> float:
+        """
+        Anomaly score in [0, 1] (higher = more anomalous)
+
+        Returns:
+            0 until a reference window is available
+        """
+        if not self.is_ready:
+            return 0.0
+        return self._score_paths(self._paths(self._transform(feature_vector)))
+
+    def learn_one(self, feature_vector):
+        """Count one event; rotates the window every window_size events"""
+        x = self._transform(feature_vector)
+
+        with self._lock:
+            self.events_seen += 1
+
+            if self.split_features is None:
+                self._low = np.minimum(self._low, x)
+                self._high = np.maximum(self._high, x)
+                if self.events_seen >= self.window_size:
+                    self._build_trees()
+                return
+
+            self._count(self._paths(x))
+
+    def _count(self, paths: np.ndarray):
+        """Add one event's paths to the latest window (caller holds the lock)"""
+        self.latest_mass.ravel()[paths.ravel()] += 1
+
+        self._window_count += 1
+        if self._window_count >= self.window_size:
+            self.reference_mass, self.latest_mass = self.latest_mass, self.reference_mass
+            self.latest_mass.fill(0)
+            self._window_count = 0
+            self.windows_completed += 1
+
+    def score_and_learn(self, feature_vector) -> float:
+        """Score an event against the current reference, then count it"""
+        if self.split_features is None:
+            self.learn_one(feature_vector)
+            return 0.0
+
+        x = self._transform(feature_vector)
+        paths = self._paths(x)
+        score = self._score_paths(paths) if self.is_ready else 0.0
+
+        with self._lock:
+            self.events_seen += 1
+            self._count(paths)
+        return score
@@ -1,7 +1,10 @@
 """
 Generate comprehensive explanations for alerts
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+from app.detection.ml_model import FEATURE_NAMES
+from app.explainability.templates import DEFAULT_LOCALE, compiled, rule_feature_indices
 
 class Explainer:
     """Generate natural language explanations for alerts"""
@@ -10,7 +13,8 @@ class Explainer:
     def generate_explanation(
         transaction_data: Dict[str, Any],
         scoring_result: Dict[str, Any],
-        features: Dict[str, float]
+        features: Dict[str, float],
+        locale: str = DEFAULT_LOCALE
     ) -> str:
         """
         Generate natural language explanation for an alert
@@ -19,93 +23,196 @@ class Explainer:
             Human-readable explanation string
         """
         
-        alert_level = scoring_result["alert_level"]
-        risk_score = scoring_result["risk_score"]
+        explanation_data = Explainer.build_explanation_data(scoring_result, features)
+        return Explainer.render_explanation(explanation_data, scoring_result, transaction_data, locale)
+    
+    @staticmethod
+    def build_explanation_data(
+        scoring_result: Dict[str, Any],
+        features: Dict[str, float]
+    ) -> Dict[str, Any]:
+        """
+        Build the compact structured explanation stored on an alert
+        
+        Holds only IDs and numbers: triggered rules as [rule_name, severity],
+        the features their templates read as [feature index, value],
+        anomaly findings as [code, args] and the top ML contributions as
+        [feature index, value, signed contribution]. Scores and transaction
+        details are read from the alert and transaction rows at render time.
+        
+        Returns:
+            JSON-serializable dict
+        """
+        
         triggered_rules = scoring_result["triggered_rules"]
+        explanation_data = {
+            "rules": [[rule["rule_name"], rule["severity"]] for rule in triggered_rules]
+        }
         
-        # Start with alert header
-        if alert_level == "CRITICAL":
-            header = "🚨 CRITICAL RISK ALERT"
-        elif alert_level == "HIGH":
-            header = "⚠️  HIGH RISK ALERT"
-        elif alert_level == "MEDIUM":
-            header = "⚡ MEDIUM RISK ALERT"
-        else:
-            header = "ℹ️  LOW RISK ALERT"
+        feature_indices = sorted(set().union(
+            *(rule_feature_indices(rule["rule_name"]) for rule in triggered_rules)
+        ))
+        if feature_indices:
+            explanation_data["features"] = [
+                [index, features.get(FEATURE_NAMES[index], 0)] for index in feature_indices
+            ]
+        
+        # Anomaly section (shown, even if empty, above 30)
+        if scoring_result.get("anomaly_score", 0) > 30:
+            anomaly_explanation = scoring_result.get("anomaly_explanation", {})
+            explanation_data["anomaly"] = [
+                [finding["code"], finding.get("args", {})]
+                for finding in anomaly_explanation.get("z_score_features", []) + anomaly_explanation.get("unusual_patterns", [])
+            ]
+        
+        if scoring_result.get("degraded"):
+            explanation_data["degraded"] = True
+        
+        # ML section (shown above 50)
+        if (scoring_result.get("ml_score") or 0) > 50:
+            top_features = scoring_result.get("ml_explanation", {}).get("top_features", [])[:3]
+            explanation_data["ml"] = [
+                [
+                    FEATURE_NAMES.index(feat["feature"]),
+                    feat["value"],
+                    feat.get("importance", 0) if feat.get("direction") == "increases" else -feat.get("importance", 0)
+                ]
+                for feat in top_features
+            ]
+        
+        return explanation_data
+    
+    @staticmethod
+    def render_explanation(
+        explanation_data: Dict[str, Any],
+        alert: Dict[str, Any],
+        transaction: Dict[str, Any],
+        locale: str = DEFAULT_LOCALE
+    ) -> str:
+        """
+        Render a structured explanation as text
+        
+        Args:
+            explanation_data: Output of build_explanation_data
+            alert: alert_level, risk_score and ml_score
+            transaction: txn_type, amount, account_id and country_code
+            locale: TEMPLATES locale
+        
+        Returns:
+            Human-readable explanation string
+        
+        Raises:
+            ValueError: If the locale has no templates
+        """
+        
+        templates = compiled(locale)
+        text = templates.text
+        alert_level = alert["alert_level"]
         
+        # Start with alert header
         explanation_parts = [
-            header,
-            f"\nRisk Score: {risk_score:.1f}/100",
-            f"\nTransaction: {transaction_data['txn_type'].upper()} ${transaction_data['amount']:.2f}",
-            f"Account: {transaction_data['account_id']}",
+            templates.header.get(alert_level, templates.header["LOW"]),
+            text["risk_score"](risk_score=alert["risk_score"]),
+            text["transaction"](txn_type=transaction["txn_type"].upper(), amount=transaction["amount"]),
+            text["account"](account_id=transaction["account_id"]),
             ""
         ]
         
         # Add rule violations
-        if triggered_rules:
-            explanation_parts.append("\n🔴 Rule Violations:")
-            for rule in triggered_rules:
-                explanation_parts.append(f"  • [{rule['severity']}] {rule['rule_name']}: {rule['description']}")
+        rules = explanation_data.get("rules", [])
+        if rules:
+            values = Explainer._rule_values(explanation_data, transaction)
+            explanation_parts.append(text["rules_heading"]())
+            for rule_name, severity in rules:
+                description = templates.rules[rule_name](**values) if rule_name in templates.rules else ""
+                explanation_parts.append(text["rule"](severity=severity, rule_name=rule_name, description=description))
         
         # Add anomaly details
-        anomaly_score = scoring_result.get("anomaly_score", 0)
-        if anomaly_score > 30:
-            explanation_parts.append("\n🔵 Anomaly Detection:")
-            anomaly_exp = scoring_result.get("anomaly_explanation", {})
-            
-            # Z-score anomalies
-            z_features = anomaly_exp.get("z_score_features", [])
-            for z_feat in z_features:
-                explanation_parts.append(f"  • {z_feat['interpretation']}")
-            
-            # Unusual patterns
-            patterns = anomaly_exp.get("unusual_patterns", [])
-            for pattern in patterns:
-                explanation_parts.append(f"  • {pattern['pattern']}: {pattern['detail']}")
+        if "anomaly" in explanation_data:
+            explanation_parts.append(text["anomaly_heading"]())
+            for code, args in explanation_data["anomaly"]:
+                whose = templates.whose.get(args.get("baseline"), templates.whose["account"])
+                description = templates.anomaly[code](**args, whose=whose, Whose=whose.capitalize())
+                explanation_parts.append(text["anomaly"](description=description))
         
         # Add ML insights
-        ml_score = scoring_result.get("ml_score", 0)
-        if ml_score > 50:
-            explanation_parts.append(f"\n🤖 ML Model Prediction: {ml_score:.1f}% suspicious")
-            ml_exp = scoring_result.get("ml_explanation", {})
-            top_features = ml_exp.get("top_features", [])[:3]
+        if explanation_data.get("degraded"):
+            explanation_parts.append(text["degraded"]())
+        
+        if "ml" in explanation_data:
+            explanation_parts.append(text["ml_heading"](ml_score=alert["ml_score"]))
             
-            if top_features:
-                explanation_parts.append("  Top contributing factors:")
-                for feat in top_features:
-                    val = feat['value']
-                    formatted_val = str(val)
+            if explanation_data["ml"]:
+                explanation_parts.append(text["ml_factors"]())
+                for index, value, contribution in explanation_data["ml"]:
+                    direction = "increases" if contribution > 0 else "decreases"
                     
                     # Format numbers
-                    if isinstance(val, (int, float)):
-                        if val == 0:
-                            if "Anomaly" in feat['feature'] or "Flag" in feat['feature']:
-                                formatted_val = "None detected"
-                            else:
-                                formatted_val = "0 (Baseline)"
-                        elif isinstance(val, float):
-                            formatted_val = f"{val:.2f}"
+                    if value == 0:
+                        # Zero values behaving as safety signals read as normal
+                        formatted_value = templates.zero_labels[index] if direction == "increases" else templates.normal_label
+                    elif isinstance(value, float):
+                        formatted_value = f"{value:.2f}"
+                    else:
+                        formatted_value = str(value)
                     
-                    direction_icon = "🔺" if feat.get('direction') == 'increases' else "🛡️"
-                    direction_text = "Risk Driver" if feat.get('direction') == 'increases' else "Safety Signal (Reduces Risk)"
-                    
-                    # Special handling for "0" values behaving as safety signals
-                    if str(formatted_val) in ["0", "0 (Baseline)", "None detected"] and feat.get('direction') == 'decreases':
-                        formatted_val = "Normal Behavior"
-
-                    explanation_parts.append(f"    - {feat['feature']}: {formatted_val} \n      {direction_icon} {direction_text}")
+                    explanation_parts.append(text["ml_factor"](
+                        feature=FEATURE_NAMES[index],
+                        value=formatted_value,
+                        direction=templates.direction[direction]
+                    ))
         
         # Add recommendation
-        explanation_parts.append("\n📋 Recommendation:")
-        if alert_level in ["CRITICAL", "HIGH"]:
-            explanation_parts.append("  Immediate review required. Consider filing SAR if suspicious activity confirmed.")
-        elif alert_level == "MEDIUM":
-            explanation_parts.append("  Review transaction and customer profile. Monitor for additional suspicious activity.")
-        else:
-            explanation_parts.append("  Log for reference. Standard monitoring procedures apply.")
+        explanation_parts.append(text["recommendation_heading"]())
+        explanation_parts.append(templates.recommendation.get(alert_level, templates.recommendation["LOW"]))
         
         return "\n".join(explanation_parts)
     
+    @staticmethod
+    def _rule_values(explanation_data: Dict[str, Any], transaction: Dict[str, Any]) -> Dict[str, Any]:
+        """Format fields of the rule description templates"""
+        return {
+            "amount": transaction["amount"],
+            "country_code": transaction.get("country_code", "UNKNOWN"),
+            **{FEATURE_NAMES[index]: value for index, value in explanation_data.get("features", [])}
+        }
+    
+    @staticmethod
+    def describe_rules(
+        triggered_rules: List[Dict[str, Any]],
+        explanation_data: Optional[Dict[str, Any]],
+        transaction: Optional[Dict[str, Any]],
+        locale: str = DEFAULT_LOCALE
+    ) -> List[Dict[str, Any]]:
+        """
+        Triggered rules with their descriptions rendered
+        
+        Rules of legacy alerts keep the description stored with them.
+        Otherwise the description is rendered from the rule's template,
+        the transaction and the feature values in the structured
+        explanation, and is None while the explanation is pending.
+        
+        Raises:
+            ValueError: If the locale has no templates
+        """
+        
+        templates = compiled(locale)
+        values = None
+        if explanation_data is not None and transaction is not None:
+            values = Explainer._rule_values(explanation_data, transaction)
+        
+        described = []
+        for rule in triggered_rules:
+            if "description" not in rule:
+                rule_name = rule["rule_name"]
+                description = None
+                if values is not None and rule_name in templates.rules:
+                    description = templates.rules[rule_name](**values)
+                rule = {**rule, "description": description}
+            described.append(rule)
+        
+        return described
+    
     @staticmethod
     def format_top_features(
         ml_explanation: Dict[str, Any],
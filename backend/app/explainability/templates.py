@@ -0,0 +1,123 @@
+"""
+Explanation text templates, compiled once per locale
+
+Alerts store a structured explanation (rule IDs, feature indices and
+contribution values); these templates turn it into text when the alert
+is read. Add a locale by adding a TEMPLATES entry with the same keys and
+format fields. English rule descriptions live with the rules
+(app.detection.rules.RULES).
+"""
+from functools import lru_cache
+from string import Formatter
+from typing import Callable, Dict, FrozenSet, NamedTuple, Tuple
+
+from app.detection.ml_model import FEATURE_NAMES
+from app.detection.rules import RULE_DESCRIPTIONS
+
+DEFAULT_LOCALE = "en"
+
+TEMPLATES = {
+    "en": {
+        "header": {
+            "CRITICAL": "🚨 CRITICAL RISK ALERT",
+            "HIGH": "⚠️  HIGH RISK ALERT",
+            "MEDIUM": "⚡ MEDIUM RISK ALERT",
+            "LOW": "ℹ️  LOW RISK ALERT"
+        },
+        "text": {
+            "risk_score": "\nRisk Score: {risk_score:.1f}/100",
+            "transaction": "\nTransaction: {txn_type} ${amount:.2f}",
+            "account": "Account: {account_id}",
+            "rules_heading": "\n🔴 Rule Violations:",
+            "rule": "  • [{severity}] {rule_name}: {description}",
+            "anomaly_heading": "\n🔵 Anomaly Detection:",
+            "anomaly": "  • {description}",
+            "degraded": "\n⚠️ ML model unavailable: scored on rules and anomaly detection only",
+            "ml_heading": "\n🤖 ML Model Prediction: {ml_score:.1f}% suspicious",
+            "ml_factors": "  Top contributing factors:",
+            "ml_factor": "    - {feature}: {value} \n      {direction}",
+            "recommendation_heading": "\n📋 Recommendation:"
+        },
+        # Defined with the rules themselves
+        "rules": RULE_DESCRIPTIONS,
+        "anomaly": {
+            "AMOUNT_ZSCORE": "Transaction amount significantly deviates from historical average",
+            "HIGH_FREQUENCY": "High transaction frequency: {HourlyTxnCount} transactions in 1 hour (normal: <5)",
+            "NIGHT_ACTIVITY": "Night-time activity: Multiple transactions during night hours ({HourOfDay}:00)",
+            "AMOUNT_ABOVE_BASELINE": "Amount is far above {whose} typical ${amount_baseline:.2f}",
+            "FREQUENCY_ABOVE_BASELINE": "Hourly activity is far above {whose} typical {frequency_baseline:.1f} transactions",
+            "UNUSUAL_NIGHT": "Unusual night-time activity: Only {night_ratio:.0%} of {whose} recent activity is at night",
+            "NEW_COUNTERPARTY": "New counterparty: {Whose} usually reuse counterparties ({novelty_rate:.0%} new)"
+        },
+        "whose": {
+            "account": "this account's",
+            "peer": "peer accounts'"
+        },
+        "feature_values": {
+            "zero": "0 (Baseline)",
+            "zero_flag": "None detected",
+            "normal": "Normal Behavior"
+        },
+        "direction": {
+            "increases": "🔺 Risk Driver",
+            "decreases": "🛡️ Safety Signal (Reduces Risk)"
+        },
+        "recommendation": {
+            "CRITICAL": "  Immediate review required. Consider filing SAR if suspicious activity confirmed.",
+            "HIGH": "  Immediate review required. Consider filing SAR if suspicious activity confirmed.",
+            "MEDIUM": "  Review transaction and customer profile. Monitor for additional suspicious activity.",
+            "LOW": "  Log for reference. Standard monitoring procedures apply."
+        }
+    }
+}
+
+
+class CompiledTemplates(NamedTuple):
+    """One locale's templates as bound format functions"""
+    header: Dict[str, str]
+    text: Dict[str, Callable[..., str]]
+    rules: Dict[str, Callable[..., str]]
+    anomaly: Dict[str, Callable[..., str]]
+    whose: Dict[str, str]
+    zero_labels: Tuple[str, ...]  # Per feature index
+    normal_label: str
+    direction: Dict[str, str]
+    recommendation: Dict[str, str]
+
+
+@lru_cache(maxsize=None)
+def compiled(locale: str = DEFAULT_LOCALE) -> CompiledTemplates:
+    """
+    Compile a locale's templates (cached for the life of the process)
+
+    Raises:
+        ValueError: If the locale has no templates
+    """
+    if locale not in TEMPLATES:
+        raise ValueError(f"Unknown locale: {locale}")
+
+    templates = TEMPLATES[locale]
+    feature_values = templates["feature_values"]
+
+    return CompiledTemplates(
+        header=templates["header"],
+        text={key: template.format for key, template in templates["text"].items()},
+        rules={key: template.format for key, template in templates["rules"].items()},
+        anomaly={key: template.format for key, template in templates["anomaly"].items()},
+        whose=templates["whose"],
+        zero_labels=tuple(
+            feature_values["zero_flag"] if "Anomaly" in name or "Flag" in name else feature_values["zero"]
+            for name in FEATURE_NAMES
+        ),
+        normal_label=feature_values["normal"],
+        direction=templates["direction"],
+        recommendation=templates["recommendation"]
+    )
+
+
+@lru_cache(maxsize=None)
+def rule_feature_indices(rule_name: str) -> FrozenSet[int]:
+    """Indices of the features a rule's description template reads"""
+    template = TEMPLATES[DEFAULT_LOCALE]["rules"].get(rule_name, "")
+    fields = {field for _, field, _, _ in Formatter().parse(template) if field}
+    return frozenset(index for index, name in enumerate(FEATURE_NAMES) if name in fields)
@@ -0,0 +1,186 @@
+"""
+Background explanation generation for alerts
+
+Alerts are written as soon as they are scored, with explanation_status
+PENDING. This worker pool then computes SHAP contributions, builds the
+structured explanation, updates the alert row and notifies WebSocket clients.
+Alerts left PENDING by a full queue or a restart are re-queued by the
+recovery sweep (see recover_pending_explanations in app.api.transactions).
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Callable, Optional, Set, Tuple
+import numpy as np
+
+from app.database import SessionLocal
+from app.models import Alert
+from app.config import EXPLANATION_WORKERS, EXPLANATION_BATCH_SIZE, EXPLANATION_QUEUE_SIZE
+from app.metrics import stage_timer, ERRORS
+
+class ExplanationWorker:
+    """Explain PENDING alerts off the ingest path"""
+
+    def __init__(
+        self,
+        scoring_engine,
+        build_columns: Callable[[Dict[str, Any], Dict[str, float]], Dict[str, Any]]
+    ):
+        """
+        Args:
+            scoring_engine: ScoringEngine used for batched SHAP contributions
+                (under its SHAP circuit breaker)
+            build_columns: Builds the alert column updates (structured
+                explanation, top features) from scoring_result, features
+        """
+        self.scoring_engine = scoring_engine
+        self.build_columns = build_columns
+        self.queue: Optional[asyncio.Queue] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.tasks: List[asyncio.Task] = []
+        # (alert_id, txn_id) of jobs queued or being processed
+        self.queued: Set[Tuple[str, str]] = set()
+
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        if self.queue is not None:
+            return
+
+        self.queue = asyncio.Queue(maxsize=EXPLANATION_QUEUE_SIZE)
+        self.executor = ThreadPoolExecutor(
+            max_workers=EXPLANATION_WORKERS,
+            thread_name_prefix="explainer"
+        )
+        self.tasks = [
+            asyncio.create_task(self._run())
+            for _ in range(EXPLANATION_WORKERS)
+        ]
+
+    def submit(
+        self,
+        alert_id: str,
+        transaction_data: Dict[str, Any],
+        scoring_result: Dict[str, Any],
+        features: Dict[str, float],
+        feature_vector: List[float]
+    ):
+        """
+        Queue an alert for explanation
+
+        Must be called after the alert row is committed. A job already
+        queued for the same alert and transaction is not queued again. If
+        the queue is full the alert stays PENDING and the recovery sweep
+        queues it later; nothing is explained on the event loop.
+        """
+        self.start()
+
+        key = (alert_id, transaction_data["txn_id"])
+        if key in self.queued:
+            return
+
+        job = {
+            "alert_id": alert_id,
+            "transaction_data": transaction_data,
+            "scoring_result": scoring_result,
+            "features": features,
+            "feature_vector": feature_vector
+        }
+
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return
+        self.queued.add(key)
+
+    def free_slots(self) -> int:
+        """Jobs the queue can take before it is full"""
+        self.start()
+        return self.queue.maxsize - self.queue.qsize()
+
+    async def _run(self):
+        """Drain the queue in batches and process them in the thread pool"""
+        from app.api.websocket import manager
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            jobs = [await self.queue.get()]
+            while len(jobs) < EXPLANATION_BATCH_SIZE and not self.queue.empty():
+                jobs.append(self.queue.get_nowait())
+
+            try:
+                updates = await loop.run_in_executor(self.executor, self.process_batch, jobs)
+
+                for alert_id, status in updates:
+                    await manager.broadcast({
+                        "type": "alert_update",
+                        "data": {
+                            "alert_id": alert_id,
+                            "explanation_status": status
+                        }
+                    })
+
+            except Exception as e:
+                ERRORS.inc("explanation")
+                print(f"⚠️ Error in explanation worker: {e}")
+
+            finally:
+                for job in jobs:
+                    self.queued.discard((job["alert_id"], job["transaction_data"]["txn_id"]))
+                    self.queue.task_done()
+
+    def process_batch(self, jobs: List[Dict[str, Any]]) -> List[tuple]:
+        """
+        Explain a batch of alerts and write the results
+
+        Returns:
+            List of (alert_id, explanation_status)
+        """
+
+        # One SHAP call for the whole batch (degraded alerts have no ML score to explain)
+        ml_explanations = [
+            job["scoring_result"]["ml_explanation"] if job["scoring_result"]["degraded"] else None
+            for job in jobs
+        ]
+        rows = [i for i, job in enumerate(jobs) if not job["scoring_result"]["degraded"]]
+        if rows:
+            try:
+                feature_matrix = np.array([jobs[i]["feature_vector"] for i in rows], dtype=float)
+                ml_scores = [jobs[i]["scoring_result"]["ml_score"] for i in rows]
+                for i, ml_explanation in zip(rows, self.scoring_engine.explain_batch(feature_matrix, ml_scores)):
+                    ml_explanations[i] = ml_explanation
+            except Exception as e:
+                print(f"⚠️ Error computing SHAP contributions: {e}")
+
+        updates = []
+        db = SessionLocal()
+        try:
+            for job, ml_explanation in zip(jobs, ml_explanations):
+                try:
+                    if ml_explanation is None:
+                        raise ValueError("No ML explanation")
+
+                    scoring_result = {**job["scoring_result"], "ml_explanation": ml_explanation}
+                    with stage_timer("explanation_text"):
+                        values = self.build_columns(scoring_result, job["features"])
+                    values["explanation_status"] = "READY"
+                except Exception as e:
+                    ERRORS.inc("explanation")
+                    print(f"⚠️ Error explaining alert {job['alert_id']}: {e}")
+                    values = {"explanation_status": "FAILED"}
+
+                # A coalesced alert whose primary transaction changed since
+                # the job was queued has a newer job; drop this one
+                updated = db.query(Alert).filter(
+                    Alert.alert_id == job["alert_id"],
+                    Alert.txn_id == job["transaction_data"]["txn_id"]
+                ).update(values)
+                if updated:
+                    updates.append((job["alert_id"], values["explanation_status"]))
+
+            with stage_timer("explanation_update"):
+                db.commit()
+
+        finally:
+            db.close()
+
+        return updates
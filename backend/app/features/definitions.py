@@ -6,6 +6,8 @@ from typing import Dict, List, Any
 import numpy as np
 from sqlalchemy.orm import Session
 from app.models import Transaction, Account
+from app.detection.peer_groups import peer_baselines
+from app.metrics import stage_timer
 from app.config import (
     WINDOW_1_HOUR, WINDOW_24_HOURS, WINDOW_7_DAYS, WINDOW_30_DAYS,
     NIGHT_START_HOUR, NIGHT_END_HOUR, COUNTRY_RISK_SCORES
@@ -123,16 +125,20 @@ class FeatureDefinitions:
         # 12. StdTxnAmount7d
         features["StdTxnAmount7d"] = np.std(amounts_7d) if len(amounts_7d) > 1 else 0
         
-        # 13. TxnAmountZScore
+        account = db.query(Account).filter(Account.account_id == account_id).first()
+        
+        # 13. TxnAmountZScore (vs the peer group when the account has no spread yet)
         avg_amount = features["AvgTxnAmount7d"]
         std_amount = features["StdTxnAmount7d"]
+        peer_stats = peer_baselines.for_account(account) if account else peer_baselines.for_account_id(account_id)
         if std_amount > 0:
             features["TxnAmountZScore"] = (current_amount - avg_amount) / std_amount
+        elif peer_stats and peer_stats["amount_std"] > 0:
+            features["TxnAmountZScore"] = (current_amount - peer_stats["amount_mean"]) / peer_stats["amount_std"]
         else:
             features["TxnAmountZScore"] = 0
         
         # 14. TxnAmountToIncomeRatio
-        account = db.query(Account).filter(Account.account_id == account_id).first()
         if account and account.monthly_income:
             features["TxnAmountToIncomeRatio"] = current_amount / account.monthly_income
         else:
@@ -173,7 +179,12 @@ class FeatureDefinitions:
             time_diff = (current_timestamp - last_txn.timestamp).total_seconds() / 60
             features["TimeSinceLastTxn"] = time_diff
         else:
-            features["TimeSinceLastTxn"] = 999999  # Very large number for first transaction
+            # First transaction: the peer group's typical gap, if known
+            peer_stats = peer_baselines.for_account_id(account_id)
+            if peer_stats and peer_stats["median_gap_minutes"] > 0:
+                features["TimeSinceLastTxn"] = peer_stats["median_gap_minutes"]
+            else:
+                features["TimeSinceLastTxn"] = 999999  # Very large number for first transaction
         
         # 20. TxnFrequencyAnomaly (simplified - based on hourly count)
         one_hour_ago = current_timestamp - timedelta(seconds=WINDOW_1_HOUR)
@@ -269,11 +280,16 @@ class FeatureDefinitions:
         counterparty_id = transaction_data["counterparty_id"]
         
         # Compute all feature groups
-        time_features = FeatureDefinitions.compute_time_window_features(db, account_id, timestamp)
-        behavioral_features = FeatureDefinitions.compute_behavioral_features(db, account_id, timestamp, amount)
-        temporal_features = FeatureDefinitions.compute_temporal_features(timestamp, db, account_id)
-        geo_features = FeatureDefinitions.compute_geographic_features(country_code, is_international, db, account_id, timestamp)
-        network_features = FeatureDefinitions.compute_network_features(counterparty_id, db, account_id, timestamp)
+        with stage_timer("features_time_window"):
+            time_features = FeatureDefinitions.compute_time_window_features(db, account_id, timestamp)
+        with stage_timer("features_behavioral"):
+            behavioral_features = FeatureDefinitions.compute_behavioral_features(db, account_id, timestamp, amount)
+        with stage_timer("features_temporal"):
+            temporal_features = FeatureDefinitions.compute_temporal_features(timestamp, db, account_id)
+        with stage_timer("features_geographic"):
+            geo_features = FeatureDefinitions.compute_geographic_features(country_code, is_international, db, account_id, timestamp)
+        with stage_timer("features_network"):
+            network_features = FeatureDefinitions.compute_network_features(counterparty_id, db, account_id, timestamp)
         
         # Combine all features
         all_features = {
@@ -285,3 +301,27 @@ class FeatureDefinitions:
         }
         
         return all_features
+    
+    @staticmethod
+    def compute_rule_features(
+        db: Session,
+        transaction_data: Dict[str, Any]
+    ) -> Dict[str, float]:
+        """
+        Compute the cheap subset of features the rules need most
+        
+        Time-window aggregates (one account query) plus the geography
+        flags; used by the rules-only ingest fast path. Rules read any
+        other feature with a neutral default.
+        """
+        
+        timestamp_raw = transaction_data["timestamp"]
+        timestamp = timestamp_raw if isinstance(timestamp_raw, datetime) else datetime.fromisoformat(timestamp_raw)
+        
+        with stage_timer("features_time_window"):
+            features = FeatureDefinitions.compute_time_window_features(db, transaction_data["account_id"], timestamp)
+        
+        features["IsInternational"] = 1 if transaction_data.get("is_international", False) else 0
+        features["CountryRiskScore"] = COUNTRY_RISK_SCORES.get(transaction_data.get("country_code", "US"), 5)
+        
+        return features
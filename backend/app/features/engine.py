@@ -40,6 +40,14 @@ class FeatureEngine:
         
         return features
     
+    def compute_rule_features(
+        self,
+        db: Session,
+        transaction_data: Dict[str, Any]
+    ) -> Dict[str, float]:
+        """Compute only the features needed for a rules-only score"""
+        return self.feature_definitions.compute_rule_features(db, transaction_data)
+    
     def _cache_features(
         self,
         db: Session,
@@ -1,7 +1,8 @@
 """
 Main FastAPI application
 """
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 import asyncio
@@ -9,11 +10,17 @@ import time
 from datetime import datetime
 
 from app.database import init_db, get_db
-from app.api import transactions, alerts, websocket, analytics, copilot
+from app.api import transactions, alerts, websocket, analytics, copilot, admin
 from app.simulator.scenarios import get_scenario
 from app.simulator.generator import TransactionGenerator
 from app.schemas import SimulationRequest, TransactionCreate
 from app.models import Account
+from app.metrics import render_metrics
+from app.config import (
+    ANOMALY_REFIT_INTERVAL, ANOMALY_REFIT_RETRY, PEER_BASELINE_REFRESH_INTERVAL, SCORING_CONFIG_POLL_INTERVAL,
+    INGEST_OVERFLOW_MODE, DEFERRED_RESCORE_INTERVAL, STATS_RECONCILE_INTERVAL,
+    ARCHIVE_RETENTION_DAYS, ARCHIVE_INTERVAL, EXPLANATION_RECOVERY_INTERVAL
+)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -29,6 +36,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Pagination cursor of the list endpoints
 )
 
 # Include routers
@@ -37,6 +45,7 @@ app.include_router(alerts.router)
 app.include_router(analytics.router)
 app.include_router(websocket.router)
 app.include_router(copilot.router)
+app.include_router(admin.router)
 
 # Transaction generator
 txn_generator = TransactionGenerator()
@@ -53,8 +62,42 @@ async def startup_event():
     # Initialize simulation timer
     app.state.last_sim_time = 0
     
+    # Start background explanation workers
+    transactions.explanation_worker.start()
+    transactions.shadow_scorer.start()
+    
+    # Re-queue alerts left PENDING (e.g. by a restart), then keep sweeping
+    asyncio.create_task(explanation_recovery_loop())
+    
+    # Load model artifacts in the background; the first request loads
+    # them itself if it arrives before this finishes
+    asyncio.create_task(warm_up_models())
+    
     # Start background normal traffic
     asyncio.create_task(background_normal_traffic())
+    
+    # Rebuild per-account behavioral baselines from recent history
+    # (holds the ingest slot, so it runs before any transaction is scored)
+    asyncio.create_task(seed_account_baselines())
+    
+    # Pick up edits to the scoring config file
+    asyncio.create_task(scoring_config_watch_loop())
+    
+    # Periodically recompute peer-group baselines for cold-start accounts
+    asyncio.create_task(peer_baseline_loop())
+    
+    # Fit/refit the IsolationForest baseline off the ingest path
+    asyncio.create_task(anomaly_refit_loop())
+    
+    # Fully score transactions that took the overload fast path
+    asyncio.create_task(deferred_rescore_loop())
+    
+    # Load, then periodically reconcile, the in-memory alert statistics
+    asyncio.create_task(stats_reconcile_loop())
+    
+    # Move months past the retention period to the archive
+    if ARCHIVE_RETENTION_DAYS is not None:
+        asyncio.create_task(archive_retention_loop())
 
 @app.get("/")
 async def root():
@@ -70,9 +113,19 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "models": transactions.scoring_engine.load_report(),
+        "ingest": {
+            **transactions.ingest_admission.snapshot(),
+            "overflow_mode": INGEST_OVERFLOW_MODE
+        }
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage latency histograms and counters in Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/simulate")
 async def simulate_scenario(
     request: SimulationRequest,
@@ -135,7 +188,9 @@ async def simulate_transactions(transactions_data: list, duration_seconds: int):
     """
     Simulate transactions over time
     
-    This function runs in the background and submits transactions to the ingestion endpoint
+    This function runs in the background and submits transactions to the ingestion endpoint.
+    A transaction rejected with 429 (INGEST_OVERFLOW_MODE "reject") is
+    retried after the Retry-After delay.
     """
     from app.api.transactions import ingest_transaction
     from app.database import SessionLocal
@@ -146,10 +201,17 @@ async def simulate_transactions(transactions_data: list, duration_seconds: int):
         # Create transaction
         txn = TransactionCreate(**txn_data)
         
-        # Ingest transaction
+        # Ingest transaction (waiting out overload rejections)
         db = SessionLocal()
         try:
-            result = await ingest_transaction(txn, db)
+            while True:
+                try:
+                    result = await ingest_transaction(txn, db)
+                    break
+                except HTTPException as e:
+                    if e.status_code != 429:
+                        raise
+                    await asyncio.sleep(float((e.headers or {}).get("Retry-After", 1)))
             
             # Broadcast to WebSocket clients
             from app.api.websocket import manager
@@ -211,6 +273,140 @@ async def background_normal_traffic():
             print(f"⚠️ Error in background traffic: {e}")
             await asyncio.sleep(30) # Wait longer on error
 
+async def warm_up_models():
+    """Load scoring models in a worker thread and report load times"""
+    try:
+        report = await asyncio.to_thread(transactions.scoring_engine.warm_up)
+        print(f"✅ Models warmed up: {report}")
+    except Exception as e:
+        print(f"⚠️ Error warming up models: {e}")
+
+async def seed_account_baselines():
+    """Replay recent transactions into the account baselines before ingest is admitted"""
+    try:
+        await transactions.seed_baselines()
+    except Exception as e:
+        print(f"⚠️ Error seeding account baselines: {e}")
+
+async def scoring_config_watch_loop():
+    """Apply changes to the scoring config file (weights, thresholds)"""
+    from app.detection.runtime_config import scoring_config
+    
+    while True:
+        try:
+            scoring_config.reload_if_changed()
+        except Exception as e:
+            print(f"⚠️ Error reloading scoring config: {e}")
+        
+        await asyncio.sleep(SCORING_CONFIG_POLL_INTERVAL)
+
+async def peer_baseline_loop():
+    """Recompute peer-group baselines in a worker thread every interval"""
+    from app.database import SessionLocal
+    from app.detection.peer_groups import peer_baselines
+    
+    def refresh():
+        db = SessionLocal()
+        try:
+            groups = peer_baselines.refresh(db)
+            print(f"✅ Peer-group baselines refreshed ({groups} groups)")
+        finally:
+            db.close()
+    
+    while True:
+        try:
+            await asyncio.to_thread(refresh)
+        except Exception as e:
+            print(f"⚠️ Error refreshing peer-group baselines: {e}")
+        
+        await asyncio.sleep(PEER_BASELINE_REFRESH_INTERVAL)
+
+async def anomaly_refit_loop():
+    """
+    Periodically refit the IsolationForest on recent low-risk transactions
+    
+    Runs in a worker thread; the new forest is swapped in when ready.
+    Retries more often until the first successful fit.
+    """
+    detector = transactions.scoring_engine.anomaly_detector
+    
+    if await asyncio.to_thread(detector.ensure_loaded):
+        await asyncio.sleep(ANOMALY_REFIT_INTERVAL)
+    
+    while True:
+        try:
+            await asyncio.to_thread(refit_anomaly_detector)
+        except Exception as e:
+            print(f"⚠️ Error refitting IsolationForest: {e}")
+        
+        await asyncio.sleep(ANOMALY_REFIT_INTERVAL if detector.is_fitted else ANOMALY_REFIT_RETRY)
+
+async def deferred_rescore_loop():
+    """Rescore deferred transactions whenever the ingest worker is idle"""
+    while True:
+        try:
+            while await transactions.rescore_deferred():
+                # Give queued requests a turn between batches
+                await asyncio.sleep(0)
+        except Exception as e:
+            print(f"⚠️ Error rescoring deferred transactions: {e}")
+        
+        await asyncio.sleep(DEFERRED_RESCORE_INTERVAL)
+
+async def explanation_recovery_loop():
+    """Queue PENDING alerts without an explanation job, at startup and every interval"""
+    while True:
+        try:
+            recovered = await transactions.recover_pending_explanations()
+            if recovered:
+                print(f"✅ Re-queued {recovered} pending explanations")
+        except Exception as e:
+            print(f"⚠️ Error recovering pending explanations: {e}")
+        
+        await asyncio.sleep(EXPLANATION_RECOVERY_INTERVAL)
+
+async def stats_reconcile_loop():
+    """Reconcile the in-memory alert statistics with the database in a worker thread"""
+    from app.database import SessionLocal
+    from app.stats import alert_stats
+    
+    def reconcile():
+        db = SessionLocal()
+        try:
+            alert_stats.reconcile(db)
+        finally:
+            db.close()
+    
+    while True:
+        try:
+            await asyncio.to_thread(reconcile)
+        except Exception as e:
+            print(f"⚠️ Error reconciling alert statistics: {e}")
+        
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL)
+
+async def archive_retention_loop():
+    """Apply the retention policy in a worker thread"""
+    from app.archive import apply_retention
+    
+    while True:
+        try:
+            await asyncio.to_thread(apply_retention, ARCHIVE_RETENTION_DAYS)
+        except Exception as e:
+            print(f"⚠️ Error archiving old data: {e}")
+        
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+def refit_anomaly_detector():
+    """Refit the scoring engine's IsolationForest from the database"""
+    from app.database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        transactions.scoring_engine.anomaly_detector.refit_from_history(db)
+    finally:
+        db.close()
+
 def create_sample_accounts():
     """Create sample accounts for testing"""
     from app.database import SessionLocal
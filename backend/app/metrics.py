@@ -0,0 +1,164 @@
+"""
+In-process metrics in Prometheus text format
+
+A minimal counter/histogram implementation (no client library needed):
+recording is a bisect plus a few integer increments under a lock, and
+/metrics renders the current values on request.
+"""
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Seconds; covers sub-millisecond model calls up to slow DB commits
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+def _format_labels(label_names: Sequence[str], label_values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter, optionally labelled"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        if not values and not self.label_names:
+            values = [((), 0)]
+        for label_values, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Bucketed latency histogram, optionally labelled"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last = +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *label_values: str) -> "_Timer":
+        """Context manager that observes the elapsed wall time"""
+        return _Timer(self, label_values)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+
+        for label_values, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _format_labels(self.label_names, label_values, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total:.9g}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "start")
+
+    def __init__(self, histogram: Histogram, label_values: Tuple[str, ...]):
+        self.histogram = histogram
+        self.label_values = label_values
+        self.start: Optional[float] = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(perf_counter() - self.start, *self.label_values)
+        if exc_type is not None:
+            ERRORS.inc(*self.label_values)
+        return False
+
+
+STAGE_LATENCY = Histogram(
+    "aml_stage_latency_seconds",
+    "Latency of each ingest and explanation stage",
+    ["stage"]
+)
+TRANSACTIONS = Counter("aml_transactions_ingested_total", "Transactions ingested")
+ALERTS = Counter("aml_alerts_generated_total", "Alerts generated by level", ["level"])
+ALERTS_COALESCED = Counter("aml_alerts_coalesced_total", "Alerting transactions linked to an open alert instead of a new one")
+ERRORS = Counter("aml_errors_total", "Errors by stage", ["stage"])
+DEGRADED = Counter("aml_degraded_total", "Transactions scored without a stage (circuit open or failed)", ["stage"])
+INGEST_SHED = Counter("aml_ingest_shed_total", "Ingest requests rejected with 429 by admission control", ["reason"])
+INGEST_DEFERRED = Counter("aml_ingest_deferred_total", "Transactions accepted on the rules-only fast path", ["reason"])
+INGEST_RESCORED = Counter("aml_ingest_rescored_total", "Deferred transactions fully rescored")
+
+def reset_metrics():
+    """Zero every registered metric (after a data reset)"""
+    for metric in REGISTRY:
+        metric.reset()
+
+
+REGISTRY = (
+    STAGE_LATENCY, TRANSACTIONS, ALERTS, ALERTS_COALESCED, ERRORS, DEGRADED,
+    INGEST_SHED, INGEST_DEFERRED, INGEST_RESCORED
+)
+
+
+def stage_timer(stage: str) -> _Timer:
+    """Time a pipeline stage: `with stage_timer("rules"): ...`"""
+    return STAGE_LATENCY.time(stage)
+
+
+def render_metrics() -> str:
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,7 +1,8 @@
 """
 SQLAlchemy ORM models
 """
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Index
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -20,7 +21,15 @@ class Transaction(Base):
     country_code = Column(String)
     merchant_category = Column(String)
     is_international = Column(Boolean, default=False)
+    scoring_status = Column(String, default="SCORED", index=True)  # 'SCORED', 'DEFERRED' (NULL = legacy, scored)
     created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        # Keyset pagination of the newest-first transaction list
+        Index("ix_transactions_timestamp_id", "timestamp", "id"),
+        # Ids of archived rows are never reused (new databases only)
+        {"sqlite_autoincrement": True},
+    )
 
 class Alert(Base):
     __tablename__ = "alerts"
@@ -41,11 +50,59 @@ class Alert(Base):
     triggered_rules = Column(Text)
     
     # Explainability (JSON)
-    explanation = Column(Text)
+    explanation = Column(Text)  # Legacy rendered text; new alerts store explanation_data
+    explanation_data = Column(Text)  # Structured explanation, rendered on read
     top_features = Column(Text)
+    explanation_status = Column(String, default="PENDING")  # 'PENDING', 'READY', 'FAILED' (NULL = legacy, ready)
+    model_version = Column(String)  # ML model version that scored the transaction
+    config_version = Column(Integer)  # Scoring config (weights/thresholds) version
+    degraded = Column(Boolean, default=False)  # Scored without the ML stage (circuit open or failed)
+    
+    # Coalescing: alerting transactions of the same account and pattern are
+    # linked to one open alert (NULL on legacy alerts: one transaction)
+    pattern = Column(String)  # Highest-severity triggered rule, or 'MODEL'
+    txn_count = Column(Integer, default=1)
+    txn_ids = Column(Text)  # JSON array of linked transaction IDs
+    last_txn_at = Column(DateTime)  # Timestamp of the latest linked transaction
     
     status = Column(String, default="NEW")  # 'NEW', 'REVIEWED', 'ESCALATED', 'CLEARED'
     created_at = Column(DateTime, default=func.now())
+    
+    # Read-side navigation for the detail endpoints (load with joinedload
+    # to fetch alert, transaction and account profile in one query).
+    # accounts has no FK from alerts: profiles are optional reference data.
+    transaction = relationship("Transaction", viewonly=True)
+    # Normalized copy of triggered_rules, written with the alert
+    rules = relationship("AlertRule", cascade="all, delete-orphan")
+    account = relationship(
+        "Account",
+        primaryjoin="foreign(Alert.account_id) == Account.account_id",
+        viewonly=True
+    )
+    
+    __table_args__ = (
+        # Keyset pagination of the newest-first alert list, unfiltered and
+        # filtered by status or level
+        Index("ix_alerts_created_at_id", "created_at", "id"),
+        Index("ix_alerts_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_alerts_level_created_at_id", "alert_level", "created_at", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
+class AlertRule(Base):
+    """One row per rule an alert triggered, for searching and counting alerts by rule"""
+    __tablename__ = "alert_rules"
+    
+    id = Column(Integer, primary_key=True)
+    alert_id = Column(Integer, ForeignKey("alerts.id"), nullable=False, index=True)
+    rule_name = Column(String, nullable=False)
+    severity = Column(String)
+    created_at = Column(DateTime, default=func.now())  # Copy of the alert's, for rule + time range scans
+    
+    __table_args__ = (
+        Index("ix_alert_rules_rule_created_at", "rule_name", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
 
 class Account(Base):
     __tablename__ = "accounts"
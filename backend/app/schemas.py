@@ -59,6 +59,22 @@ class AlertResponse(AlertBase):
 class AlertUpdate(BaseModel):
     status: Optional[str] = None
 
+class AlertBatchRequest(BaseModel):
+    alert_ids: List[str] = Field(min_length=1)
+
+class AlertFilter(BaseModel):
+    status: Optional[str] = None
+    alert_level: Optional[str] = None
+    rule: Optional[str] = None
+    since: Optional[datetime] = None
+    max_risk_score: Optional[float] = None
+    account_id: Optional[str] = None
+
+class AlertBulkStatusUpdate(BaseModel):
+    status: str
+    alert_ids: Optional[List[str]] = None  # Either alert_ids or filter
+    filter: Optional[AlertFilter] = None
+
 # Account schemas
 class AccountBase(BaseModel):
     account_id: str
@@ -91,3 +107,13 @@ class StatsResponse(BaseModel):
     alerts_by_level: Dict[str, int]
     detection_rate: float
     avg_risk_score: float
+
+# Runtime scoring config update (all fields optional)
+class ScoringConfigUpdate(BaseModel):
+    rule_weight: Optional[float] = None
+    anomaly_weight: Optional[float] = None
+    ml_weight: Optional[float] = None
+    threshold_low: Optional[float] = None
+    threshold_medium: Optional[float] = None
+    threshold_high: Optional[float] = None
+    threshold_critical: Optional[float] = None
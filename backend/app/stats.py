@@ -0,0 +1,125 @@
+"""
+In-memory transaction and alert statistics
+"""
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import Alert, Transaction
+
+ALERT_LEVELS = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+
+class AlertStats:
+    """
+    Counters behind /api/alerts/stats/summary
+
+    Ingest adds to the totals, per-level counts and risk-score sum as it
+    commits, so the summary is read from memory. reconcile() periodically
+    replaces them with aggregates from the database, which corrects any
+    drift from writes that bypass ingest (deletes, manual edits).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total_transactions = 0
+        self.total_alerts = 0
+        self.alerts_by_level: Dict[str, int] = {}
+        self.risk_score_sum = 0.0
+        self.reconciled_at: Optional[datetime] = None
+        # Increments made while a reconcile query runs (None otherwise)
+        self._pending: Optional[dict] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.reconciled_at is not None
+
+    def record_transactions(self, count: int = 1):
+        with self._lock:
+            self.total_transactions += count
+            if self._pending is not None:
+                self._pending["transactions"] += count
+
+    def record_alerts(self, alerts: Iterable[Alert]):
+        """Count committed alerts"""
+        with self._lock:
+            for alert in alerts:
+                self._record(alert.alert_level, alert.risk_score)
+
+    def record_alert_updates(self, updates: Iterable[Tuple[str, float, str, float]]):
+        """
+        Re-count committed alerts whose level or score changed
+
+        Args:
+            updates: (previous alert_level, previous risk_score, alert_level, risk_score)
+        """
+        with self._lock:
+            for previous_level, previous_score, alert_level, risk_score in updates:
+                self._record(previous_level, previous_score, -1)
+                self._record(alert_level, risk_score)
+
+    def _record(self, alert_level: str, risk_score: float, count: int = 1):
+        self._add_alert(alert_level, risk_score, count)
+        if self._pending is not None:
+            self._pending["alerts"].append((alert_level, risk_score, count))
+
+    def _add_alert(self, alert_level: str, risk_score: float, count: int = 1):
+        self.total_alerts += count
+        self.alerts_by_level[alert_level] = self.alerts_by_level.get(alert_level, 0) + count
+        self.risk_score_sum += count * (risk_score or 0)
+
+    def reconcile(self, db: Session):
+        """
+        Reload the counters from the database
+
+        Increments recorded while the aggregate queries run are re-applied
+        on top of their results.
+        """
+        with self._lock:
+            self._pending = {"transactions": 0, "alerts": []}
+
+        try:
+            total_transactions = db.query(func.count(Transaction.id)).scalar() or 0
+            level_rows = db.query(
+                Alert.alert_level, func.count(Alert.id), func.sum(Alert.risk_score)
+            ).group_by(Alert.alert_level).all()
+
+            with self._lock:
+                pending = self._pending
+                self.total_transactions = total_transactions + pending["transactions"]
+                self.alerts_by_level = {level: count for level, count, _ in level_rows}
+                self.total_alerts = sum(self.alerts_by_level.values())
+                self.risk_score_sum = float(sum(risk_sum or 0 for _, _, risk_sum in level_rows))
+                for alert_level, risk_score, count in pending["alerts"]:
+                    self._add_alert(alert_level, risk_score, count)
+                self.reconciled_at = datetime.now()
+
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def reset(self):
+        """Zero the counters (after the tables were emptied)"""
+        with self._lock:
+            self.total_transactions = 0
+            self.total_alerts = 0
+            self.alerts_by_level = {}
+            self.risk_score_sum = 0.0
+            self.reconciled_at = datetime.now()
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "total_transactions": self.total_transactions,
+                "total_alerts": self.total_alerts,
+                "alerts_by_level": {level: self.alerts_by_level.get(level, 0) for level in ALERT_LEVELS},
+                "detection_rate": round(self.total_alerts / max(self.total_transactions, 1) * 100, 2),
+                "avg_risk_score": round(self.risk_score_sum / self.total_alerts, 2) if self.total_alerts else 0
+            }
+
+
+# Shared by ingest, the alerts API and the reconcile loop
+alert_stats = AlertStats()
@@ -12,6 +12,7 @@ import pandas as pd
 import numpy as np
 import pickle
 import os
+from datetime import datetime
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, accuracy_score
 from sklearn.preprocessing import StandardScaler
@@ -172,6 +173,15 @@ def save_artifacts(model, explainer):
         pickle.dump(model, f)
     print(f"\n✅ Model saved to {model_path}")
     
+    # Also register it as a new version; activate it via
+    # POST /api/admin/models/<version>/activate
+    version = datetime.now().strftime("v%Y%m%d%H%M%S")
+    version_dir = os.path.join(models_dir, "registry", version)
+    os.makedirs(version_dir, exist_ok=True)
+    with open(os.path.join(version_dir, "aml_model.pkl"), 'wb') as f:
+        pickle.dump(model, f)
+    print(f"✅ Model registered as version {version}")
+    
     # Save explainer
     if explainer is not None:
         explainer_path = os.path.join(models_dir, "explainer.pkl")